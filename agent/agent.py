@@ -1,23 +1,318 @@
 # Python interface for the TypeScript agent
 # Assumes TypeScript is compiled to JS and run via Node.js
 
+import atexit
+import itertools
 import json
 import subprocess
+import threading
+from collections.abc import Iterable
+from concurrent.futures import Future, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from pathlib import Path
 
+AGENT_SCRIPT = Path(__file__).parent / "agent.js"  # Assume compiled JS
+DEFAULT_TIMEOUT = 10.0
+# Requests in a row a worker may leave unanswered before it is restarted
+DEFAULT_MAX_TIMEOUTS = 3
+
+
+class AgentWorker:
+    """
+    One long-lived ``node agent.js --worker`` process.
+
+    Requests are written to its stdin as JSON lines tagged with an id, and a
+    reader thread matches the JSON lines on stdout back to their futures, so
+    many requests can be in flight on one process. If the process exits, every
+    pending request fails with an error and the worker reports itself dead.
+    """
+
+    def __init__(self, command: list[str]):
+        self.command = command
+        self._ids = itertools.count()
+        self._pending: dict[int, Future] = {}
+        # Requests abandoned since the last response, to spot a hung process
+        self.timeouts = 0
+        self._lock = threading.Lock()
+        # Writes are serialized separately so a full pipe never blocks the reader
+        self._write_lock = threading.Lock()
+        self._process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    @property
+    def alive(self) -> bool:
+        return self._process.poll() is None
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    def submit(self, message: dict) -> Future:
+        """Send one request; the future resolves to the worker's response line."""
+        future = Future()
+        with self._lock:
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+        line = json.dumps({"id": request_id, **message}).encode() + b"\n"
+        try:
+            with self._write_lock:
+                self._process.stdin.write(line)
+                self._process.stdin.flush()
+        except (OSError, ValueError) as e:
+            with self._lock:
+                self._pending.pop(request_id, None)
+            if not future.done():
+                future.set_result({"error": f"agent worker unavailable: {e}"})
+        return future
+
+    def _read(self):
+        for line in self._process.stdout:
+            try:
+                response = json.loads(line)
+            except ValueError:
+                continue
+            with self._lock:
+                future = self._pending.pop(response.get("id"), None)
+                self.timeouts = 0
+            # Responses to requests that already timed out are dropped
+            if future is not None:
+                future.set_result(response)
+
+        self._process.wait()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_result(
+                {"error": f"agent worker exited with code {self._process.returncode}"}
+            )
+
+    def abandon(self, futures: list[Future]) -> int:
+        """
+        Stop waiting for requests that timed out.
+
+        :return: Requests abandoned since the worker last responded
+        """
+        futures = set(futures)
+        with self._lock:
+            self._pending = {i: f for i, f in self._pending.items() if f not in futures}
+            self.timeouts += len(futures)
+            return self.timeouts
+
+    def close(self, timeout: float = 2.0):
+        """Close stdin so the worker exits, killing it if it does not."""
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self._process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+        self._reader.join(timeout)
+
+
+class AgentPool:
+    """
+    Pool of persistent agent workers shared by many callers.
+
+    Node starts once per worker instead of once per task, so a call costs a
+    JSON line each way over a pipe. Each request goes to the live worker with
+    the fewest requests in flight; workers that crash, or leave
+    ``max_timeouts`` requests in a row unanswered, are restarted on the next
+    request or ``health_check``.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        command: list[str] | None = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_timeouts: int = DEFAULT_MAX_TIMEOUTS,
+    ):
+        """
+        :param size: Number of worker processes
+        :param command: Worker command line; defaults to ``node agent.js --worker``
+        :param timeout: Seconds to wait for a response before giving up on it
+        :param max_timeouts: Unanswered requests in a row after which a worker is restarted
+        """
+        if size < 1:
+            raise ValueError(f"size must be at least 1, got {size}")
+        self.size = size
+        self.command = command or ["node", str(AGENT_SCRIPT), "--worker"]
+        self.timeout = timeout
+        self.max_timeouts = max_timeouts
+        self.restarts = 0
+        self._workers: list[AgentWorker | None] = [None] * size
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _worker(self) -> AgentWorker:
+        """Least busy live worker, starting or restarting workers as needed."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("agent pool is closed")
+            for i, worker in enumerate(self._workers):
+                if worker is None or not worker.alive:
+                    if worker is not None:
+                        worker.close()
+                        self.restarts += 1
+                    self._workers[i] = AgentWorker(self.command)
+            return min(self._workers, key=lambda worker: worker.in_flight)
+
+    def _submit(self, task: str, data=None) -> tuple[AgentWorker, Future]:
+        worker = self._worker()
+        return worker, worker.submit({"task": task, "data": data})
+
+    def submit(self, task: str, data=None) -> Future:
+        """Send a task to a worker without waiting for the response."""
+        return self._submit(task, data)[1]
+
+    def _results(
+        self, submitted: list[tuple[AgentWorker, Future]], timeout: float | None
+    ) -> list[dict]:
+        """Wait for responses until one deadline, abandoning the requests still pending."""
+        timeout = self.timeout if timeout is None else timeout
+        wait([future for _, future in submitted], timeout)
+        results = []
+        abandoned: dict[AgentWorker, list[Future]] = {}
+        for worker, future in submitted:
+            if not future.done():
+                abandoned.setdefault(worker, []).append(future)
+                results.append({"error": f"agent timed out after {timeout}s"})
+                continue
+            response = future.result()
+            results.append(
+                {"error": response["error"]} if "error" in response else response["result"]
+            )
+        for worker, futures in abandoned.items():
+            if worker.abandon(futures) >= self.max_timeouts:
+                self._retire(worker)
+        return results
+
+    def _retire(self, worker: AgentWorker):
+        """Stop a worker so the next request starts a fresh one in its place."""
+        worker.close(timeout=0)
+        with self._lock:
+            for i, current in enumerate(self._workers):
+                if current is worker:
+                    self._workers[i] = None
+                    self.restarts += 1
+
+    def call(self, task: str, data=None, timeout: float | None = None) -> dict:
+        """
+        Run one task and wait for its result.
+
+        :return: The agent's response, or ``{"error": ...}``
+        """
+        try:
+            return self._results([self._submit(task, data)], timeout)[0]
+        except (OSError, RuntimeError) as e:
+            return {"error": str(e)}
+
+    def call_many(self, tasks: Iterable, timeout: float | None = None) -> list[dict]:
+        """
+        Run many tasks concurrently across the pool.
+
+        :param tasks: Task strings, or ``(task, data)`` pairs
+        :param timeout: Seconds to wait for all the responses
+        :return: One result per task, in input order
+        """
+        tasks = list(tasks)
+        try:
+            submitted = [
+                self._submit(task) if isinstance(task, str) else self._submit(*task)
+                for task in tasks
+            ]
+        except (OSError, RuntimeError) as e:
+            return [{"error": str(e)}] * len(tasks)
+        return self._results(submitted, timeout)
+
+    def health_check(self, timeout: float = 1.0) -> list[bool]:
+        """
+        Ping every worker, restarting any that crashed or did not answer in time.
+
+        :return: Whether each worker answered
+        """
+        with self._lock:
+            workers = list(self._workers)
+        futures = [
+            worker.submit({"type": "ping"}) if worker is not None and worker.alive else None
+            for worker in workers
+        ]
+        healthy = []
+        for worker, future in zip(workers, futures, strict=True):
+            try:
+                ok = future is not None and future.result(timeout).get("result") == "pong"
+            except FutureTimeoutError:
+                ok = False
+            if not ok and worker is not None:
+                self._retire(worker)
+            healthy.append(ok)
+        self._worker()
+        return healthy
+
+    def close(self):
+        """Stop every worker."""
+        with self._lock:
+            self._closed = True
+            workers, self._workers = self._workers, [None] * self.size
+        for worker in workers:
+            if worker is not None:
+                worker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_pool: AgentPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_agent_pool() -> AgentPool:
+    """Return the process-wide agent pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._closed:
+            _pool = AgentPool()
+        return _pool
+
+
+@atexit.register
+def close_agent_pool():
+    """Stop the shared pool's workers; runs automatically at process exit."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
 
 def call_agent(task: str, data=None):
-    """Call the TypeScript agent via Node.js."""
-    agent_script = Path(__file__).parent / "agent.js"  # Assume compiled JS
-    if not agent_script.exists():
+    """Call the TypeScript agent via a persistent Node.js worker."""
+    if not AGENT_SCRIPT.exists():
         return {"error": "Agent script not found"}
+    return get_agent_pool().call(task, data)
+
+
+def call_agent_many(tasks: Iterable, timeout: float | None = None) -> list:
+    """
+    Call the TypeScript agent for many tasks concurrently.
 
-    cmd = ["node", str(agent_script), json.dumps({"task": task, "data": data})]
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-        if result.returncode == 0:
-            return json.loads(result.stdout.strip())
-        else:
-            return {"error": result.stderr.strip()}
-    except Exception as e:
-        return {"error": str(e)}
+    :param tasks: Task strings, or ``(task, data)`` pairs
+    :param timeout: Seconds to wait for all the responses
+    :return: One result per task, in input order
+    """
+    tasks = list(tasks)
+    if not AGENT_SCRIPT.exists():
+        return [{"error": "Agent script not found"}] * len(tasks)
+    return get_agent_pool().call_many(tasks, timeout)
@@ -1,4 +1,14 @@
 // Simple TypeScript agent for handling requests
+//
+// One task per process:  node agent.js '{"task": "..."}'
+// Long-lived worker:     node agent.js --worker
+//
+// A worker reads newline-delimited JSON requests from stdin, {"id", "task", "data"}
+// or {"id", "type": "ping"}, and writes one JSON line per request to stdout,
+// {"id", "result"} or {"id", "error"}. Requests run concurrently and are answered
+// in completion order, so stdout carries nothing but responses; logs go to stderr.
+
+import * as readline from "readline";
 
 interface Request {
     task: string;
@@ -10,9 +20,14 @@ interface Response {
     success: boolean;
 }
 
+interface WorkerRequest extends Partial<Request> {
+    id: number;
+    type?: "task" | "ping";
+}
+
 class Agent {
     async handleRequest(req: Request): Promise<Response> {
-        console.log(`Processing task: ${req.task}`);
+        console.error(`Processing task: ${req.task}`);
         // Simulate processing
         await new Promise(resolve => setTimeout(resolve, 100));
         return {
@@ -22,4 +37,50 @@ class Agent {
     }
 }
 
-export default Agent;
\ No newline at end of file
+function runWorker(agent: Agent): void {
+    const send = (message: object) => process.stdout.write(JSON.stringify(message) + "\n");
+    const lines = readline.createInterface({ input: process.stdin });
+
+    lines.on("line", async (line: string) => {
+        if (!line.trim()) {
+            return;
+        }
+        let req: WorkerRequest;
+        try {
+            req = JSON.parse(line);
+        } catch (e) {
+            send({ id: null, error: `invalid request: ${e}` });
+            return;
+        }
+        if (req.type === "ping") {
+            send({ id: req.id, result: "pong" });
+            return;
+        }
+        try {
+            send({ id: req.id, result: await agent.handleRequest({ task: req.task ?? "", data: req.data }) });
+        } catch (e) {
+            send({ id: req.id, error: String(e) });
+        }
+    });
+    // The parent closing stdin is the signal to exit
+    lines.on("close", () => process.exit(0));
+}
+
+async function main(argv: string[]): Promise<void> {
+    const agent = new Agent();
+    if (argv[0] === "--worker") {
+        runWorker(agent);
+        return;
+    }
+    const response = await agent.handleRequest(JSON.parse(argv[0] ?? "{}"));
+    process.stdout.write(JSON.stringify(response) + "\n");
+}
+
+if (require.main === module) {
+    main(process.argv.slice(2)).catch(e => {
+        console.error(String(e));
+        process.exit(1);
+    });
+}
+
+export default Agent;
@@ -4,44 +4,122 @@ import os
 import sys
 from pathlib import Path
 
-import yaml
 from dotenv import load_dotenv
 
-try:
-    import wandb
-except ImportError:
-    wandb = None
-
 load_dotenv()
 sys.path.insert(0, str(Path(__file__).parent))
 
-from ml.router import AdaptiveModelSelector  # noqa: E402
+
+# Subcommands import what they need when they run, so `status` and `models`
+# start without loading numpy, the provider SDKs or the router
+def _load_config() -> dict:
+    import yaml
+
+    config_path = Path(__file__).parent / "config" / "benchmark.yaml"
+    with open(config_path) as f:
+        return yaml.safe_load(f)
 
 
 def benchmark(args):
     required_keys = ["NVIDIA_API_KEY", "OPENAI_API_KEY", "ANTHROPIC_API_KEY", "GOOGLE_API_KEY"]
     missing = [k for k in required_keys if not os.getenv(k)]
-    if missing:
+    if missing and not args.replay:
         print(f"missing api keys: {', '.join(missing)}")
         return
+    if args.workers > 1 and (args.record or args.replay):
+        print("--workers cannot be combined with --record or --replay")
+        return
 
-    from tests.integration.benchmark import AdvancedModelBenchmark
+    from ml.cache import ResponseCache
+    from ml.cassette import CASSETTE_PROVIDERS, Cassette, use_cassette
+    from ml.clients import configure_clients
+    from ml.ratelimit import configure_rate_limits
+    from tests.integration.benchmark import API_KEY_ENV_VARS, AdvancedModelBenchmark
 
-    config_path = Path(__file__).parent / "config" / "benchmark.yaml"
-    with open(config_path) as f:
-        config = yaml.safe_load(f)
+    config = _load_config()
 
     models = config["models"]
+    if args.replay:
+        # Anything a cassette cannot answer would be sent to the live provider
+        skipped = [m["name"] for m in models if m["type"] not in CASSETTE_PROVIDERS]
+        if skipped:
+            print(f"not covered by cassettes, skipping: {', '.join(skipped)}")
+        models = [m for m in models if m["type"] in CASSETTE_PROVIDERS]
+        if not models:
+            print("no models to replay")
+            return
+        for model in models:
+            # Replayed requests are matched without credentials, but the SDKs insist on a key
+            key = API_KEY_ENV_VARS[model["type"]]
+            if not os.getenv(key):
+                os.environ[key] = "replay"
 
     try:
-        benchmark = AdvancedModelBenchmark(models)
-        results = benchmark.run_benchmark()
+        configure_clients(**config.get("clients", {}))
+        configure_rate_limits(config.get("rate_limits"), config.get("retry"))
+        cache = None
+        if args.cache != "bypass":
+            cache_config = config.get("cache", {})
+            ttl_hours = cache_config.get("ttl_hours")
+            cache = ResponseCache(
+                directory=cache_config.get("directory", "reports/cache"),
+                max_bytes=int(cache_config.get("max_size_mb", 100) * 2**20),
+                ttl=ttl_hours * 3600 if ttl_hours is not None else None,
+            )
+        cassette = None
+        if args.replay:
+            cassette = Cassette.load(args.replay)
+            use_cassette(cassette, "replay", latency_scale=args.latency_scale)
+        elif args.record:
+            cassette = Cassette(args.record)
+            use_cassette(cassette, "record")
+        confidence = config.get("confidence", {})
+        early_stopping = config.get("early_stopping", {})
+        benchmark = AdvancedModelBenchmark(
+            models,
+            concurrency=config.get("concurrency"),
+            cache=cache,
+            cache_mode=args.cache,
+            repetitions=args.repetitions or config.get("repetitions", 1),
+            warmup=config.get("warmup", 0),
+            confidence=confidence.get("level", 0.95),
+            resamples=confidence.get("resamples", 2000),
+        )
+        results = benchmark.run_benchmark(
+            concurrent=args.concurrent,
+            stream=args.stream,
+            workers=args.workers,
+            early_stopping=args.early_stop or early_stopping.get("enabled", False),
+            min_repetitions=early_stopping.get("min_repetitions", 2),
+        )
+        if args.record:
+            cassette.save()
+            print(f"recorded {len(cassette.interactions)} interactions to {args.record}")
+        if cache is not None:
+            stats = cache.stats()
+            print(f"cache: {stats['hits']} hits, {stats['misses']} misses")
         print("benchmark results:")
         for r in results:
             print(f"{r.model_name}: {r.avg_response_time:.2f}s, {r.task_success_rate:.1f}% success")
+            if r.response_time_ci_low is not None:
+                print(
+                    f"  {r.total_queries} requests, "
+                    f"ci [{r.response_time_ci_low:.0f}, {r.response_time_ci_high:.0f}]ms, "
+                    f"[{r.success_rate_ci_low:.1f}, {r.success_rate_ci_high:.1f}]% success"
+                )
+            if r.avg_time_to_first_token is not None:
+                print(
+                    f"  ttft {r.avg_time_to_first_token:.0f}ms, "
+                    f"p99 itl {r.p99_inter_token_latency:.1f}ms, "
+                    f"{r.output_tokens_per_second:.1f} tok/s"
+                )
         print("completed. check reports/")
 
-        if wandb and config.get("wandb", {}).get("enabled", False):
+        if config.get("wandb", {}).get("enabled", False):
+            try:
+                import wandb
+            except ImportError:
+                return
             wandb.init(project=config["wandb"]["project"])
             for r in results:
                 wandb.log(
@@ -57,9 +135,19 @@ def benchmark(args):
 
 
 def compare(args):
-    selector = AdaptiveModelSelector()
+    from ml.router import AdaptiveModelSelector
+    from ml.scoring import LatencySLOScorer
+
+    selector = AdaptiveModelSelector(policy=args.policy)
     try:
-        rec = selector.select_optimal_model(args.task, args.complexity)
+        scorer = None
+        if args.max_latency_ms is not None:
+            scorer = LatencySLOScorer(
+                args.max_latency_ms,
+                percentile=args.percentile,
+                mode="exclude" if args.exclude_slow else "penalize",
+            )
+        rec = selector.select_optimal_model(args.task, args.complexity, scorer=scorer)
         print(f"recommended: {rec}")
         print(f"{args.model1}: ~2.1s, 85% success")
         print(f"{args.model2}: ~1.8s, 92% success")
@@ -67,10 +155,105 @@ def compare(args):
         print(f"failed: {e}")
 
 
+def serve(args):
+    from ml.router import AdaptiveModelSelector
+    from ml.service import RouterService
+
+    service = RouterService(
+        AdaptiveModelSelector(policy=args.policy), host=args.host, port=args.port
+    )
+    print(f"routing with the {args.policy} policy on http://{args.host}:{args.port}")
+    service.run()
+
+
+def export(args):
+    from ml.archive import DEFAULT_ARCHIVE_DIR, export_history
+    from ml.storage import DEFAULT_DB_PATH
+
+    directory = args.output or DEFAULT_ARCHIVE_DIR
+    try:
+        exported = export_history(args.db or DEFAULT_DB_PATH, directory)
+    except Exception as e:
+        print(f"failed: {e}")
+        return
+    for table, count in exported.items():
+        print(f"{table}: {count} new rows")
+    print(f"archived to {directory}")
+
+
+def compact(args):
+    from ml.rollups import RetentionPolicy, compact_history
+    from ml.storage import DEFAULT_ARCHIVE_DIR, DEFAULT_DB_PATH
+
+    try:
+        policy = RetentionPolicy(**_load_config().get("retention", {}))
+        result = compact_history(
+            args.db or DEFAULT_DB_PATH, policy, archive_dir=args.archive or DEFAULT_ARCHIVE_DIR
+        )
+    except Exception as e:
+        print(f"failed: {e}")
+        return
+    print(f"rolled up {result.pop('rolled_up')} new rows")
+    unarchived = result.pop("unarchived", 0)
+    for level, count in result.items():
+        print(f"{level}: deleted {count} expired rows")
+    if unarchived:
+        print(f"raw: kept {unarchived} expired rows that are not archived yet, run export first")
+
+
+def load(args):
+    from ml.clients import configure_clients
+    from ml.ratelimit import configure_rate_limits
+    from tests.integration.loadgen import LoadGenerator, Stage, chat_request
+
+    config = _load_config()
+
+    model = next((m for m in config["models"] if m["name"] == args.model), None)
+    if model is None:
+        print(f"unknown model: {args.model}")
+        return
+    if args.base_url:
+        model = {**model, "base_url": args.base_url}
+
+    schedule = []
+    if args.ramp_up > 0:
+        schedule.append(Stage(args.ramp_up, rate=0, end_rate=args.rate))
+    schedule.append(Stage(args.duration, rate=args.rate))
+
+    try:
+        configure_clients(**config.get("clients", {}))
+        configure_rate_limits(config.get("rate_limits"), config.get("retry"))
+        report = LoadGenerator(
+            chat_request(model, max_tokens=args.max_tokens, adaptive=args.adaptive),
+            schedule,
+            arrival=args.arrival,
+            max_concurrency=args.max_concurrency,
+            window=args.window,
+        ).run()
+    except Exception as e:
+        print(f"failed: {e}")
+        return
+
+    print(
+        f"sent {report.sent} ({report.offered_rate:.1f}/s), ok {report.completed} "
+        f"({report.throughput:.1f}/s), 429 {report.rate_limited}, errors {report.errors}"
+    )
+    latency = report.latency.summary()
+    if latency["count"]:
+        print(
+            f"latency p50 {latency['p50']:.0f}ms, p90 {latency['p90']:.0f}ms, "
+            f"p99 {latency['p99']:.0f}ms, max {latency['max']:.0f}ms"
+        )
+    for window in report.timeline():
+        p99 = f"{window['p99_latency']:.0f}ms" if window["p99_latency"] is not None else "-"
+        print(
+            f"  t={window['start']:.0f}s {window['throughput']:.1f}/s ok, "
+            f"{window['rate_limited']} 429, {window['errors']} errors, p99 {p99}"
+        )
+
+
 def models(args):
-    config_path = Path(__file__).parent / "config" / "benchmark.yaml"
-    with open(config_path) as f:
-        config = yaml.safe_load(f)
+    config = _load_config()
 
     for model in config["models"]:
         name = model["name"]
@@ -99,7 +282,43 @@ def main():
     parser = argparse.ArgumentParser(description="ai benchmark cli")
     subparsers = parser.add_subparsers(dest="command")
 
-    subparsers.add_parser("benchmark")
+    benchmark_p = subparsers.add_parser("benchmark")
+    benchmark_p.add_argument(
+        "--concurrent", action="store_true", help="send all requests at once per provider limits"
+    )
+    benchmark_p.add_argument(
+        "--stream", action="store_true", help="stream responses to measure ttft and token rates"
+    )
+    benchmark_p.add_argument(
+        "--cache",
+        choices=["replay", "record", "bypass"],
+        default="bypass",
+        help="replay cached responses, record fresh ones, or bypass the response cache",
+    )
+    benchmark_p.add_argument(
+        "--repetitions", type=int, help="requests per model and scenario (default from config)"
+    )
+    benchmark_p.add_argument(
+        "--early-stop",
+        action="store_true",
+        help="stop repeating once the models' latency confidence intervals separate",
+    )
+    benchmark_p.add_argument(
+        "--workers", type=int, default=1, help="shard requests across this many processes"
+    )
+    cassette_group = benchmark_p.add_mutually_exclusive_group()
+    cassette_group.add_argument(
+        "--record", metavar="PATH", help="record provider HTTP traffic to a cassette file"
+    )
+    cassette_group.add_argument(
+        "--replay", metavar="PATH", help="serve provider requests from a cassette, offline"
+    )
+    benchmark_p.add_argument(
+        "--latency-scale",
+        type=float,
+        default=1.0,
+        help="multiply recorded latencies when replaying, 0 for instant",
+    )
     compare_p = subparsers.add_parser("compare")
     compare_p.add_argument("model1")
     compare_p.add_argument("model2")
@@ -107,6 +326,55 @@ def main():
     compare_p.add_argument(
         "--complexity", choices=["low", "medium", "high", "extreme"], default="medium"
     )
+    compare_p.add_argument(
+        "--max-latency-ms", type=float, help="latency slo, e.g. 2000 for p99 under 2s"
+    )
+    compare_p.add_argument(
+        "--percentile", type=float, choices=[50, 90, 99, 99.9], default=99, help="slo percentile"
+    )
+    compare_p.add_argument(
+        "--exclude-slow", action="store_true", help="exclude models over the slo, not penalize"
+    )
+    compare_p.add_argument(
+        "--policy",
+        choices=["score", "bandit", "task"],
+        default="score",
+        help="route by benchmark scores, the bandit learned from live outcomes, "
+        "or outcomes of similar past tasks",
+    )
+    serve_p = subparsers.add_parser("serve")
+    serve_p.add_argument("--host", default="127.0.0.1", help="interface to listen on")
+    serve_p.add_argument("--port", type=int, default=8000)
+    serve_p.add_argument("--policy", choices=["score", "bandit", "task"], default="score")
+    export_p = subparsers.add_parser("export")
+    export_p.add_argument(
+        "--db", help="performance database (default reports/model_performance.db)"
+    )
+    export_p.add_argument(
+        "--output", help="archive directory for the parquet files (default reports/archive)"
+    )
+    compact_p = subparsers.add_parser("compact")
+    compact_p.add_argument(
+        "--db", help="performance database (default reports/model_performance.db)"
+    )
+    compact_p.add_argument(
+        "--archive",
+        help="archive directory raw rows must be exported to before deletion "
+        "(default reports/archive)",
+    )
+    load_p = subparsers.add_parser("load")
+    load_p.add_argument("model", help="model name from config/benchmark.yaml")
+    load_p.add_argument("--rate", type=float, default=1.0, help="target requests per second")
+    load_p.add_argument("--duration", type=float, default=30.0, help="seconds at the target rate")
+    load_p.add_argument("--ramp-up", type=float, default=0.0, help="seconds to ramp from zero")
+    load_p.add_argument("--arrival", choices=["poisson", "constant"], default="poisson")
+    load_p.add_argument("--max-concurrency", type=int, default=32, help="max requests in flight")
+    load_p.add_argument("--window", type=float, default=5.0, help="report window in seconds")
+    load_p.add_argument("--max-tokens", type=int, default=200)
+    load_p.add_argument("--base-url", help="override the endpoint, e.g. a local mock server")
+    load_p.add_argument(
+        "--adaptive", action="store_true", help="pace and retry through the shared rate limiter"
+    )
     subparsers.add_parser("models")
     subparsers.add_parser("status")
 
@@ -119,6 +387,14 @@ def main():
         benchmark(args)
     elif args.command == "compare":
         compare(args)
+    elif args.command == "serve":
+        serve(args)
+    elif args.command == "export":
+        export(args)
+    elif args.command == "compact":
+        compact(args)
+    elif args.command == "load":
+        load(args)
     elif args.command == "models":
         models(args)
     elif args.command == "status":
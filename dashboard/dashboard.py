@@ -1,22 +1,309 @@
 import sqlite3
+import sys
+import threading
+from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
 
+# `streamlit run dashboard/dashboard.py` only puts dashboard/ on the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from ml.rollups import (  # noqa: E402
+    DEFAULT_MAX_POINTS,
+    choose_resolution,
+    history_bounds,
+    load_trends,
+)
+
+# Metrics summarized per model in the model_aggregates table
+AGGREGATED_METRICS = [
+    "total_queries",
+    "avg_response_time",
+    "median_response_time",
+    "avg_token_generation_rate",
+    "task_success_rate",
+    "error_rate",
+    "total_execution_time",
+    "avg_time_to_first_token",
+    "p50_inter_token_latency",
+    "p90_inter_token_latency",
+    "p99_inter_token_latency",
+    "output_tokens_per_second",
+    "p90_response_time",
+    "p99_response_time",
+    "p999_response_time",
+    "max_response_time",
+]
+
+# Percentile columns of model_histograms, merged over every recorded request
+TAIL_PERCENTILES = {"p50": "p50", "p90": "p90", "p99": "p99", "p999": "p99.9", "max": "max"}
+
+# Metrics plotted over time; each model's trend loads at most DEFAULT_MAX_POINTS points
+TREND_METRICS = ["avg_response_time", "task_success_rate"]
+
+
+def lttb_indices(x, y, threshold):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps out of a series
+
+    The first and last points are always kept. The points between them are
+    split into ``threshold - 2`` buckets, and each bucket keeps the point that
+    forms the largest triangle with the point kept before it and the mean of
+    the next bucket, so peaks and dips survive downsampling.
+
+    :param x: Increasing x values as floats
+    :param y: y values, without NaNs
+    :param threshold: Number of points to keep
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[end : edges[i + 2]].mean()
+            next_y = y[end : edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        areas = np.abs(
+            (x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        kept[i + 1] = a
+    return kept
+
 
 class AIModelPerformanceDashboard:
     def __init__(self, db_path="../reports/model_performance.db"):
-        self.conn = sqlite3.connect(db_path)
+        # A pure reader: once the benchmark has switched the file to WAL mode,
+        # dashboard queries never block its writes (or wait on them). Reruns and
+        # sessions share one dashboard, so the connection crosses threads
+        self.conn = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False)
+        self.conn.execute("PRAGMA query_only = ON")
+        self._lock = threading.Lock()
+        # Raw trend rows read so far, the rowid cursor they extend from, and the
+        # (since, until) timestamps they cover besides rows past the cursor
+        self.history = pd.DataFrame(columns=["id", "timestamp", "model_name", *TREND_METRICS])
+        self._history_cursor = 0
+        self._history_range = None
+        self._history_deleted_before = None
+        self._data_key = None
+        self._trend_key = None
         self.load_performance_data()
 
+    def _current_data_key(self):
+        """Changes whenever rows are added or compaction deletes old ones"""
+        (last_id,) = self.conn.execute("SELECT MAX(id) FROM performance_metrics").fetchone()
+        return last_id, self._rollup_state("raw_deleted_before")
+
     def load_performance_data(self):
-        """Load performance metrics from SQLite database"""
-        self.df = pd.read_sql_query(
-            "SELECT * FROM performance_metrics ORDER BY timestamp", self.conn
+        """Reload the summaries if performance_metrics changed since the last call
+
+        Every query aggregates in SQL and reads only per-model summary tables,
+        and the results are kept until the table's last rowid changes, so a
+        Streamlit rerun without new benchmark rows costs one indexed lookup.
+        """
+        with self._lock:
+            key = self._current_data_key()
+            if key == self._data_key:
+                return
+            self.load_model_aggregates()
+            self.load_tail_latency()
+            self._data_key = key
+
+    def refresh_history(self, since=None, until=None):
+        """Bring the raw trend rows between ``since`` and ``until`` up to date
+
+        Rows added since the last call are appended by following the rowid
+        cursor. Older rows are only read when the range reaches beyond what was
+        read before, and then only those inside it.
+
+        :param since: ISO timestamp to start at; defaults to the oldest stored row
+        :param until: ISO timestamp to end at; defaults to the newest stored row
+        """
+        with self._lock:
+            self._refresh_history(since, until)
+
+    def _refresh_history(self, since, until):
+        columns = f"id, timestamp, model_name, {', '.join(TREND_METRICS)}"
+        history = self.history
+        if self._history_covers(since, until):
+            new_rows = pd.read_sql_query(
+                f"SELECT {columns} FROM performance_metrics WHERE id > ? ORDER BY id",
+                self.conn,
+                params=(self._history_cursor,),
+            )
+        else:
+            (last_id,) = self.conn.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM performance_metrics"
+            ).fetchone()
+            # Only the bounds given, so the timestamp index can serve them
+            bounds = [("timestamp >= ?", since), ("timestamp <= ?", until)]
+            bounds = [(condition, value) for condition, value in bounds if value is not None]
+            new_rows = pd.read_sql_query(
+                f"SELECT {columns} FROM performance_metrics WHERE "
+                + " AND ".join(["id <= ?", *(condition for condition, _ in bounds)])
+                + " ORDER BY id",
+                self.conn,
+                params=(last_id, *(value for _, value in bounds)),
+            )
+            history = history.iloc[:0]
+            self._history_cursor = last_id
+            self._history_range = (since, until)
+        if not new_rows.empty:
+            new_rows["timestamp"] = pd.to_datetime(new_rows["timestamp"], format="ISO8601")
+            history = new_rows if history.empty else pd.concat([history, new_rows])
+            self._history_cursor = max(self._history_cursor, int(new_rows["id"].iloc[-1]))
+
+        # Compaction deleted raw rows older than this; drop them here too
+        deleted_before = self._rollup_state("raw_deleted_before")
+        if deleted_before is not None and deleted_before != self._history_deleted_before:
+            history = history[history["timestamp"] >= pd.Timestamp(deleted_before)]
+            self._history_deleted_before = deleted_before
+        self.history = history.reset_index(drop=True)
+
+    def _history_covers(self, since, until):
+        """Whether the rows read so far include every row between ``since`` and ``until``"""
+        if self._history_range is None:
+            return False
+        covered_since, covered_until = self._history_range
+        return (covered_since is None or (since is not None and since >= covered_since)) and (
+            covered_until is None or (until is not None and until <= covered_until)
+        )
+
+    def load_model_aggregates(self):
+        """Load per-model summary statistics maintained alongside each insert"""
+        try:
+            aggregates = pd.read_sql_query("SELECT * FROM model_aggregates", self.conn)
+        except pd.errors.DatabaseError:
+            # Databases written before model_aggregates existed: the same sums, grouped in SQL
+            columns = {
+                row[1] for row in self.conn.execute("PRAGMA table_info(performance_metrics)")
+            }
+            aggregates = pd.read_sql_query(
+                " UNION ALL ".join(
+                    f"SELECT model_name, '{metric}' AS metric, COUNT({metric}) AS count, "
+                    f"TOTAL({metric}) AS sum, TOTAL({metric} * {metric}) AS sum_sq, "
+                    f"MIN({metric}) AS min, MAX({metric}) AS max FROM performance_metrics "
+                    f"WHERE {metric} IS NOT NULL GROUP BY model_name"
+                    for metric in AGGREGATED_METRICS
+                    if metric in columns
+                ),
+                self.conn,
+            )
+
+        aggregates["mean"] = aggregates["sum"] / aggregates["count"]
+        aggregates["std"] = np.sqrt(
+            (aggregates["sum_sq"] / aggregates["count"] - aggregates["mean"] ** 2).clip(lower=0)
         )
-        self.df["timestamp"] = pd.to_datetime(self.df["timestamp"])
+        self.aggregates = aggregates
+
+        # One row per model: "<metric>" holds the mean, "<metric>_std" the spread
+        means = aggregates.pivot(index="model_name", columns="metric", values="mean")
+        stds = aggregates.pivot(index="model_name", columns="metric", values="std")
+        means = means.reindex(columns=AGGREGATED_METRICS)
+        stds = stds.reindex(columns=AGGREGATED_METRICS).add_suffix("_std")
+        self.summary = means.join(stds).rename_axis(columns=None).reset_index()
+
+    def load_tail_latency(self):
+        """Load per-model response time percentiles from the merged latency histograms"""
+        try:
+            self.tail_latency = pd.read_sql_query(
+                f"SELECT model_name, {', '.join(TAIL_PERCENTILES)} FROM model_histograms",
+                self.conn,
+            )
+        except pd.errors.DatabaseError:
+            # Databases written before latency histograms existed
+            self.tail_latency = pd.DataFrame(columns=["model_name", *TAIL_PERCENTILES])
+
+    def _rollup_state(self, name, default=None):
+        try:
+            row = self.conn.execute(
+                "SELECT value FROM rollup_state WHERE name = ?", (name,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            # Databases never compacted
+            return default
+        return default if row is None else row[0]
+
+    def load_historical_trends(self, start=None, end=None):
+        """Load TREND_METRICS over time from raw rows or the coarsest rollup that fits
+
+        Results, downsampled per model and metric in ``trend_series``, are kept
+        until new rows arrive or the range changes. The level is chosen, and
+        ranges with more raw rows than a chart shows are averaged per bucket,
+        by ``ml.rollups`` exactly as for ``AdaptiveModelSelector.performance_trends``.
+
+        :param start: ISO timestamp to start at; defaults to the oldest stored data
+        :param end: ISO timestamp to end at; defaults to the newest stored data
+        """
+        with self._lock:
+            key = (self._current_data_key(), start, end)
+            if key == self._trend_key:
+                return
+            level, trends = self._load_trends(start, end)
+            series = self._downsample(trends)
+            # Published together, so concurrent reruns never see a half-loaded trend
+            self.trends, self.trend_series, self.trend_level = trends, series, level
+            self._trend_key = key
+
+    def _load_trends(self, start, end):
+        """The level read and one row per timestamp and model for [start, end]"""
+        first, last = history_bounds(self.conn)
+        range_start = start or first
+        range_end = end or last
+        if not range_start or not range_end:
+            return "raw", pd.DataFrame(columns=["timestamp", "model_name", *TREND_METRICS])
+
+        level = choose_resolution(self.conn, range_start, range_end, DEFAULT_MAX_POINTS)
+        if level == "raw":
+            # Served from the incrementally refreshed history, read only for this range
+            self._refresh_history(start, end)
+            history = self.history
+            in_range = (history["timestamp"] >= pd.Timestamp(range_start)) & (
+                history["timestamp"] <= pd.Timestamp(range_end)
+            )
+            trends = history.loc[in_range].drop(columns="id")
+            if not trends["timestamp"].is_monotonic_increasing:
+                trends = trends.sort_values("timestamp", kind="stable")
+            return level, trends
+
+        level, rows = load_trends(
+            self.conn, TREND_METRICS, range_start, range_end, DEFAULT_MAX_POINTS
+        )
+        trends = pd.DataFrame(rows, columns=["bucket_start", "model_name", *TREND_METRICS]).rename(
+            columns={"bucket_start": "timestamp"}
+        )
+        trends["timestamp"] = pd.to_datetime(trends["timestamp"], format="ISO8601")
+        return level, trends
+
+    @staticmethod
+    def _downsample(trends):
+        """Per metric, each model's (timestamps, values) cut to DEFAULT_MAX_POINTS by LTTB"""
+        series = {metric: [] for metric in TREND_METRICS}
+        # One pass splits the rows by model
+        for model, model_data in trends.groupby("model_name", sort=False):
+            for metric in TREND_METRICS:
+                points = model_data[["timestamp", metric]].dropna()
+                if points.empty:
+                    continue
+                times = points["timestamp"]
+                seconds = (times - times.iloc[0]).dt.total_seconds().to_numpy()
+                keep = lttb_indices(seconds, points[metric].to_numpy(float), DEFAULT_MAX_POINTS)
+                series[metric].append((model, times.iloc[keep], points[metric].iloc[keep]))
+        return series
+
+    def _overall_mean(self, metric):
+        """Mean of a metric across every stored run, from the per-model sums"""
+        rows = self.aggregates[self.aggregates["metric"] == metric]
+        return rows["sum"].sum() / rows["count"].sum() if rows["count"].sum() else 0.0
 
     def render_overview_section(self):
         """Create overview section with key performance insights"""
@@ -25,13 +312,15 @@ class AIModelPerformanceDashboard:
         col1, col2, col3 = st.columns(3)
 
         with col1:
-            st.metric("Total Models Tracked", len(self.df["model_name"].unique()))
+            st.metric("Total Models Tracked", len(self.summary))
 
         with col2:
-            st.metric("Average Task Success Rate", f"{self.df['task_success_rate'].mean():.2f}%")
+            st.metric(
+                "Average Task Success Rate", f"{self._overall_mean('task_success_rate'):.2f}%"
+            )
 
         with col3:
-            st.metric("Median Response Time", f"{self.df['avg_response_time'].median():.2f} ms")
+            st.metric("Average Response Time", f"{self._overall_mean('avg_response_time'):.2f} ms")
 
     def render_model_comparison(self):
         """Create comparative visualizations across models"""
@@ -39,9 +328,10 @@ class AIModelPerformanceDashboard:
 
         # Response Time Comparison
         fig_response_time = px.bar(
-            self.df,
+            self.summary,
             x="model_name",
             y="avg_response_time",
+            error_y="avg_response_time_std",
             title="Average Response Time by Model",
             labels={"avg_response_time": "Response Time (ms)"},
         )
@@ -49,33 +339,47 @@ class AIModelPerformanceDashboard:
 
         # Token Generation Rate
         fig_token_rate = px.bar(
-            self.df,
+            self.summary,
             x="model_name",
             y="avg_token_generation_rate",
+            error_y="avg_token_generation_rate_std",
             title="Token Generation Rate by Model",
             labels={"avg_token_generation_rate": "Tokens per Second"},
         )
         st.plotly_chart(fig_token_rate)
 
-    def render_historical_trends(self):
-        """Show performance trends over time"""
-        st.header("Historical Trends")
+        # Tail latency from the merged histograms
+        if not self.tail_latency.empty:
+            tail = self.tail_latency.rename(columns=TAIL_PERCENTILES).melt(
+                id_vars="model_name", var_name="percentile", value_name="response_time"
+            )
+            fig_tail = px.bar(
+                tail,
+                x="model_name",
+                y="response_time",
+                color="percentile",
+                barmode="group",
+                title="Response Time Percentiles by Model",
+                labels={"response_time": "Response Time (ms)"},
+            )
+            st.plotly_chart(fig_tail)
+
+    def render_historical_trends(self, start=None, end=None):
+        """Show performance trends over time
 
-        # Time series for each model
-        models = self.df["model_name"].unique()
+        Long ranges are drawn from minute, hour or day rollups, so the number
+        of points loaded stays bounded however much history is stored.
+        """
+        st.header("Historical Trends")
+        self.load_historical_trends(start, end)
+        if self.trend_level != "raw":
+            st.caption(f"Per-{self.trend_level} averages")
 
-        for metric in ["avg_response_time", "task_success_rate"]:
+        # Time series for each model, downsampled to what a chart can show
+        for metric in TREND_METRICS:
             fig = go.Figure()
-            for model in models:
-                model_data = self.df[self.df["model_name"] == model]
-                fig.add_trace(
-                    go.Scatter(
-                        x=model_data["timestamp"],
-                        y=model_data[metric],
-                        mode="lines+markers",
-                        name=model,
-                    )
-                )
+            for model, times, values in self.trend_series[metric]:
+                fig.add_trace(go.Scatter(x=times, y=values, mode="lines+markers", name=model))
 
             fig.update_layout(
                 title=f'{metric.replace("_", " ").title()} Over Time',
@@ -89,9 +393,10 @@ class AIModelPerformanceDashboard:
         st.header("Error Analysis")
 
         fig_error_rate = px.bar(
-            self.df,
+            self.summary,
             x="model_name",
             y="error_rate",
+            error_y="error_rate_std",
             title="Error Rate by Model",
             labels={"error_rate": "Error Rate (%)"},
         )
@@ -105,8 +410,16 @@ class AIModelPerformanceDashboard:
         self.render_error_analysis()
 
 
+@st.cache_resource
+def get_dashboard(db_path="../reports/model_performance.db"):
+    """One dashboard per database, shared by every session and rerun"""
+    return AIModelPerformanceDashboard(db_path)
+
+
 def main():
-    dashboard = AIModelPerformanceDashboard()
+    dashboard = get_dashboard()
+    # Fetches nothing unless the benchmark wrote rows since the last rerun
+    dashboard.load_performance_data()
     dashboard.run()
 
 
@@ -0,0 +1,178 @@
+import json
+import os
+import sqlite3
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from ml.storage import DEFAULT_ARCHIVE_DIR, DEFAULT_DB_PATH, open_database
+
+# Archived tables and the SQL expression giving each row's local-time partition date.
+# Samples of requests that failed before starting take their run's date.
+ARCHIVED_TABLES = {
+    "performance_metrics": "substr(timestamp, 1, 10)",
+    "request_samples": """COALESCE(
+        date(started_at, 'unixepoch', 'localtime'),
+        (SELECT substr(p.timestamp, 1, 10) FROM performance_metrics p
+         WHERE p.run_id = request_samples.run_id LIMIT 1)
+    )""",
+}
+
+# Rows fetched from SQLite per batch while exporting
+EXPORT_BATCH_ROWS = 100_000
+# Rows per Parquet row group; each group's min/max statistics let readers skip it
+ROW_GROUP_ROWS = 65_536
+
+_MANIFEST = "_manifest.json"
+_ARROW_TYPES = {"INTEGER": pa.int64(), "REAL": pa.float64(), "TEXT": pa.string()}
+_PARTITIONING = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+
+
+def _arrow_schema(conn: sqlite3.Connection, table: str) -> pa.Schema:
+    """Arrow schema from the table's declared column types; BLOB columns are left out."""
+    return pa.schema(
+        (name, _ARROW_TYPES[declared.upper()])
+        for _, name, declared, *_ in conn.execute(f"PRAGMA table_info({table})")
+        if declared.upper() in _ARROW_TYPES
+    )
+
+
+def read_manifest(directory: str = DEFAULT_ARCHIVE_DIR) -> dict[str, int]:
+    """Highest row id already exported, per table."""
+    try:
+        with open(os.path.join(directory, _MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_partition(path: str, new_rows: pa.Table, last_id: int):
+    """
+    Merge newly exported rows into a partition's single Parquet file.
+
+    Rows above ``last_id`` already in the file come from an export that
+    crashed before updating the manifest, and are replaced rather than duplicated.
+    """
+    if os.path.exists(path):
+        existing = pq.read_table(path, memory_map=True)
+        existing = existing.filter(pc.field("id") <= last_id)
+        new_rows = pa.concat_tables([existing, new_rows], promote_options="default")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Renaming over the old file means readers never see half a partition
+    tmp_path = f"{path}.tmp"
+    pq.write_table(new_rows, tmp_path, row_group_size=ROW_GROUP_ROWS, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def export_history(
+    db_path: str = DEFAULT_DB_PATH, directory: str = DEFAULT_ARCHIVE_DIR
+) -> dict[str, int]:
+    """
+    Copy rows added since the last export into date-partitioned Parquet files.
+
+    Each table is laid out as ``<directory>/<table>/date=YYYY-MM-DD/data.parquet``.
+    Every export rewrites only the partitions that received new rows, merging
+    them into one file per day, so repeated exports never leave a trail of
+    small files. ``_manifest.json`` records the highest id exported per table.
+
+    :param db_path: SQLite performance database
+    :param directory: Archive root
+    :return: Number of rows exported per table
+    """
+    manifest = read_manifest(directory)
+    exported = {}
+    conn = open_database(db_path)
+    try:
+        for table, date_expression in ARCHIVED_TABLES.items():
+            if not conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).fetchone():
+                continue
+            schema = _arrow_schema(conn, table)
+            last_id = manifest.get(table, 0)
+            cursor = conn.execute(
+                f"SELECT {date_expression}, {', '.join(schema.names)} FROM {table} "
+                "WHERE id > ? ORDER BY id",
+                (last_id,),
+            )
+
+            partitions: dict[str, list[pa.Table]] = {}
+            count = 0
+            while rows := cursor.fetchmany(EXPORT_BATCH_ROWS):
+                dates, *columns = zip(*rows, strict=True)
+                batch = pa.table(
+                    [
+                        pa.array(column, type=field.type)
+                        for column, field in zip(columns, schema, strict=True)
+                    ],
+                    schema=schema,
+                )
+                dates = pa.array(dates, type=pa.string())
+                for day in pc.unique(dates).to_pylist():
+                    partitions.setdefault(day, []).append(batch.filter(pc.equal(dates, day)))
+                count += len(rows)
+                manifest[table] = rows[-1][schema.names.index("id") + 1]
+
+            for day, tables in partitions.items():
+                _write_partition(
+                    os.path.join(directory, table, f"date={day}", "data.parquet"),
+                    pa.concat_tables(tables),
+                    last_id,
+                )
+            exported[table] = count
+    finally:
+        conn.close()
+
+    # Written last: rows exported before a crash are replaced by the next export
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f"{_MANIFEST}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(directory, _MANIFEST))
+    return exported
+
+
+def load_history(
+    table: str = "performance_metrics",
+    columns: list[str] | None = None,
+    since: str | date | None = None,
+    until: str | date | None = None,
+    filter: ds.Expression | None = None,
+    directory: str = DEFAULT_ARCHIVE_DIR,
+) -> pa.Table:
+    """
+    Read archived rows, touching only the files and columns a query needs.
+
+    Partitions outside ``since``..``until`` are never opened, only the
+    requested columns are decoded, and ``filter`` is checked against row group
+    statistics before any rows are read. Files are memory-mapped, so the
+    result shares pages with the OS cache instead of copying them; call
+    ``to_pandas()`` on it for a DataFrame.
+
+    :param table: Archived table name
+    :param columns: Columns to load, ``date`` included; all columns by default
+    :param since: First day to include, as a date or ``YYYY-MM-DD``
+    :param until: Last day to include
+    :param filter: Additional row filter, e.g. ``ds.field("model_name") == "gpt-4o"``
+    :param directory: Archive root
+    :return: Matching rows
+    """
+    dataset = ds.dataset(
+        os.path.join(directory, table),
+        format="parquet",
+        partitioning=_PARTITIONING,
+        filesystem=pafs.LocalFileSystem(use_mmap=True),
+    )
+    conditions = [] if filter is None else [filter]
+    if since is not None:
+        conditions.append(ds.field("date") >= str(since))
+    if until is not None:
+        conditions.append(ds.field("date") <= str(until))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return dataset.to_table(columns=columns, filter=expression)
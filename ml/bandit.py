@@ -0,0 +1,235 @@
+import math
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+
+import numpy as np
+
+from ml.storage import open_database
+
+# Log-latency prior for models without observations: a broad guess around one second
+PRIOR_LATENCY_MS = 1000.0
+PRIOR_LOG_LATENCY_VARIANCE = 1.0
+
+
+class BanditRouter:
+    """
+    Thompson sampling router that learns from live request outcomes.
+
+    Each model keeps a Beta posterior over its success rate and a Normal
+    posterior over its mean log latency. A routing decision draws one sample
+    from every posterior and picks the model with the most expected successes
+    per second of latency, so traffic concentrates on the fastest reliable
+    model while uncertain models still get explored.
+
+    Observations lose weight with a ``half_life`` in seconds, so the router
+    follows the fastest model *now* rather than averaged over all time. State
+    is checkpointed to the ``bandit_state`` table and restored on start.
+    All methods are safe to call from many threads.
+    """
+
+    def __init__(
+        self,
+        models: list[str],
+        db_path: str | None = "reports/model_performance.db",
+        half_life: float | None = 300.0,
+        checkpoint_interval: int = 100,
+        seed: int | None = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        :param models: Model names to route between
+        :param db_path: SQLite database for checkpoints; ``None`` keeps state in memory only
+        :param half_life: Seconds after which an observation counts half; ``None`` never forgets
+        :param checkpoint_interval: Outcomes recorded between automatic checkpoints
+        :param seed: Random seed for reproducible routing
+        :param clock: Wall-clock time source, in seconds
+        """
+        if half_life is not None and half_life <= 0:
+            raise ValueError(f"half_life must be positive, got {half_life}")
+        self.models = list(models)
+        self.db_path = db_path
+        self.half_life = half_life
+        self.checkpoint_interval = checkpoint_interval
+        self.clock = clock
+
+        self._index = {model: i for i, model in enumerate(self.models)}
+        n = len(self.models)
+        # Discounted success and failure counts
+        self._successes = np.zeros(n)
+        self._failures = np.zeros(n)
+        # Discounted weight, sum and sum of squares of log latencies
+        self._weights = np.zeros(n)
+        self._log_sum = np.zeros(n)
+        self._log_sum_sq = np.zeros(n)
+        self._decayed_at = clock()
+
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._since_checkpoint = 0
+
+        if db_path is not None:
+            self.restore()
+
+    def _decay(self, now: float):
+        """Discount every observation for the time passed since the last decay."""
+        if self.half_life is not None and now > self._decayed_at:
+            factor = 0.5 ** ((now - self._decayed_at) / self.half_life)
+            for stats in (
+                self._successes,
+                self._failures,
+                self._weights,
+                self._log_sum,
+                self._log_sum_sq,
+            ):
+                stats *= factor
+        self._decayed_at = max(self._decayed_at, now)
+
+    def record_outcome(self, model: str, success: bool, latency_ms: float | None = None):
+        """
+        Feed back the result of a real request.
+
+        :param model: Model that served the request
+        :param success: Whether the request succeeded
+        :param latency_ms: End-to-end response time, if measured
+        """
+        i = self._index.get(model)
+        if i is None:
+            raise ValueError(f"Unknown model: {model}")
+        with self._lock:
+            self._decay(self.clock())
+            if success:
+                self._successes[i] += 1
+            else:
+                self._failures[i] += 1
+            if latency_ms is not None and latency_ms > 0:
+                log_latency = math.log(latency_ms)
+                self._weights[i] += 1
+                self._log_sum[i] += log_latency
+                self._log_sum_sq[i] += log_latency * log_latency
+            self._since_checkpoint += 1
+            checkpoint = self.db_path is not None and (
+                self._since_checkpoint >= self.checkpoint_interval
+            )
+            if checkpoint:
+                self._since_checkpoint = 0
+        if checkpoint:
+            self.checkpoint()
+
+    def sample_scores(self, n: int = 1) -> np.ndarray:
+        """
+        Draw ``n`` independent Thompson samples of every model's score.
+
+        The score is the log of sampled success rate over sampled latency.
+
+        :return: Array of shape (n, models)
+        """
+        shape = (n, len(self.models))
+        with self._lock:
+            self._decay(self.clock())
+            weights = self._weights
+            # Posterior of the mean log latency: the prior counts as one observation
+            with np.errstate(invalid="ignore", divide="ignore"):
+                observed_mean = np.where(weights > 0, self._log_sum / weights, 0.0)
+                observed_var = self._log_sum_sq / weights - observed_mean**2
+            mean = (math.log(PRIOR_LATENCY_MS) + weights * observed_mean) / (1 + weights)
+            variance = np.where(
+                weights > 1, np.maximum(observed_var, 0.0), PRIOR_LOG_LATENCY_VARIANCE
+            )
+            success_rate = self._rng.beta(1 + self._successes, 1 + self._failures, size=shape)
+            log_latency = self._rng.normal(mean, np.sqrt(variance / (1 + weights)), size=shape)
+
+        return np.log(success_rate) - log_latency
+
+    def select(self) -> str:
+        """Pick a model for one request."""
+        return self.models[int(self.sample_scores(1)[0].argmax())]
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Posterior means per model: success rate and typical latency in milliseconds."""
+        with self._lock:
+            self._decay(self.clock())
+            stats = {}
+            for model, i in self._index.items():
+                weight = self._weights[i]
+                stats[model] = {
+                    "success_rate": (1 + self._successes[i])
+                    / (2 + self._successes[i] + self._failures[i]),
+                    "latency_ms": math.exp(self._log_sum[i] / weight) if weight else None,
+                    "observations": float(self._successes[i] + self._failures[i]),
+                }
+            return stats
+
+    def _ensure_table(self, conn: sqlite3.Connection):
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS bandit_state (
+            model_name TEXT PRIMARY KEY,
+            successes REAL NOT NULL,
+            failures REAL NOT NULL,
+            latency_weight REAL NOT NULL,
+            log_latency_sum REAL NOT NULL,
+            log_latency_sum_sq REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """)
+
+    def checkpoint(self):
+        """Write every model's posterior to the ``bandit_state`` table in one transaction."""
+        if self.db_path is None:
+            return
+        with self._lock:
+            rows = [
+                (
+                    model,
+                    float(self._successes[i]),
+                    float(self._failures[i]),
+                    float(self._weights[i]),
+                    float(self._log_sum[i]),
+                    float(self._log_sum_sq[i]),
+                    self._decayed_at,
+                )
+                for model, i in self._index.items()
+            ]
+        with self._db_lock:
+            try:
+                conn = open_database(self.db_path)
+                try:
+                    with conn:
+                        self._ensure_table(conn)
+                        conn.executemany(
+                            "INSERT OR REPLACE INTO bandit_state VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            rows,
+                        )
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"Error checkpointing bandit state: {e}")
+
+    def restore(self):
+        """Load checkpointed posteriors, decayed for the time since they were written."""
+        try:
+            conn = open_database(self.db_path)
+            try:
+                rows = conn.execute("SELECT * FROM bandit_state").fetchall()
+            finally:
+                conn.close()
+        except sqlite3.OperationalError:
+            return
+
+        now = self.clock()
+        with self._lock:
+            for model, successes, failures, weight, log_sum, log_sum_sq, updated_at in rows:
+                i = self._index.get(model)
+                if i is None:
+                    continue
+                factor = 1.0
+                if self.half_life is not None and now > updated_at:
+                    factor = 0.5 ** ((now - updated_at) / self.half_life)
+                self._successes[i] = successes * factor
+                self._failures[i] = failures * factor
+                self._weights[i] = weight * factor
+                self._log_sum[i] = log_sum * factor
+                self._log_sum_sq[i] = log_sum_sq * factor
+            self._decayed_at = now
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any
+
+# replay serves stored responses (calling the provider and storing on a miss),
+# record always calls the provider and refreshes the entry, bypass ignores the cache
+CACHE_MODES = ("replay", "record", "bypass")
+
+
+class ResponseCache:
+    """
+    On-disk, content-addressed cache of provider responses.
+
+    Entries are JSON files named by the SHA-256 of their request parameters
+    (model, prompt, max_tokens, temperature, ...), so identical requests share
+    an entry no matter which run made them. Reads refresh an entry's mtime;
+    when the cache grows past ``max_bytes`` the least recently used entries
+    are evicted. Entries older than ``ttl`` seconds count as misses.
+    """
+
+    def __init__(
+        self,
+        directory: str = "reports/cache",
+        max_bytes: int = 100 * 2**20,
+        ttl: float | None = 7 * 24 * 3600,
+    ):
+        """
+        :param directory: Root directory of the cache files
+        :param max_bytes: Total size the cache is trimmed back to after a write
+        :param ttl: Maximum entry age in seconds; ``None`` keeps entries until evicted
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._size = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(params: dict[str, Any]) -> str:
+        """Content address of a request: hash of its canonical JSON form."""
+        canonical = json.dumps(params, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, params: dict[str, Any]) -> dict[str, Any] | None:
+        """
+        Look up a stored response.
+
+        :param params: Request parameters the response was stored under
+        :return: The stored response, or ``None`` on a miss or expired entry
+        """
+        path = self._path(self.key(params))
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            entry = None
+        except (OSError, ValueError) as e:
+            print(f"Error reading cache entry {path}: {e}")
+            entry = None
+
+        if entry is not None and self.ttl is not None:
+            if time.time() - entry.get("created_at", 0) > self.ttl:
+                self._remove(path)
+                entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        try:
+            # Reads count as use for LRU eviction
+            os.utime(path)
+        except OSError:
+            pass
+        return entry["response"]
+
+    def put(self, params: dict[str, Any], response: dict[str, Any]):
+        """
+        Store a response, evicting least recently used entries if over size.
+
+        :param params: Request parameters to store the response under
+        :param response: JSON-serializable response data
+        """
+        path = self._path(self.key(params))
+        data = json.dumps({"params": params, "created_at": time.time(), "response": response})
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            # Write then rename so concurrent readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing cache entry {path}: {e}")
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data) - previous
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._size <= self.max_bytes:
+                break
+            if self._remove(path):
+                self._size -= size
+                self.evictions += 1
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def clear(self):
+        """Delete every entry."""
+        with self._lock:
+            for _, _, path in self._entries():
+                self._remove(path)
+            self._size = 0
+
+    def stats(self) -> dict[str, int]:
+        """Hit, miss and eviction counters for reporting."""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
@@ -0,0 +1,254 @@
+import base64
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections.abc import Iterator
+
+import httpx
+
+from ml.clients import set_transport
+
+CASSETTE_MODES = ("record", "replay")
+
+# Provider types whose SDKs send requests through the shared HTTP transport; the
+# google SDK talks gRPC, so its requests are never recorded or replayed
+CASSETTE_PROVIDERS = ("openai", "deepseek", "anthropic")
+
+# Hop-by-hop headers that describe the original connection, not the response
+_SKIPPED_HEADERS = {"connection", "keep-alive", "transfer-encoding"}
+
+
+def _request_key(request: httpx.Request) -> str:
+    """Match requests by method, URL and body; credentials and other headers are ignored."""
+    body = hashlib.sha256(request.read()).hexdigest()
+    return f"{request.method} {request.url} {body}"
+
+
+def _encode(data: bytes) -> str | dict[str, str]:
+    try:
+        return data.decode()
+    except UnicodeDecodeError:
+        return {"b64": base64.b64encode(data).decode()}
+
+
+def _decode(data: str | dict[str, str]) -> bytes:
+    if isinstance(data, dict):
+        return base64.b64decode(data["b64"])
+    return data.encode()
+
+
+class Cassette:
+    """
+    Recorded provider HTTP interactions, saved as JSON lines (gzipped for ``.gz`` paths).
+
+    Each interaction keeps the request key, the response status and headers,
+    when the headers arrived and every body chunk with its arrival offset in
+    seconds from the start of the request. Streaming responses therefore
+    replay with their original time to first token and inter-token gaps.
+    """
+
+    def __init__(self, path: str | None = None):
+        """
+        :param path: File the cassette is loaded from and saved to
+        """
+        self.path = path
+        self.interactions: list[dict] = []
+        self._cursors: dict[str, int] = {}
+        self._index: dict[str, list[dict]] | None = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _open(path: str, mode: str):
+        return gzip.open(path, mode + "t") if path.endswith(".gz") else open(path, mode)
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        """Read a saved cassette."""
+        cassette = cls(path)
+        with cls._open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    cassette.interactions.append(json.loads(line))
+        return cassette
+
+    def save(self, path: str | None = None):
+        """Write every recorded interaction, one JSON object per line."""
+        path = path or self.path
+        if path is None:
+            raise ValueError("No cassette path given")
+        with self._lock:
+            lines = [json.dumps(i, separators=(",", ":")) for i in self.interactions]
+        with self._open(path, "w") as f:
+            for line in lines:
+                f.write(line + "\n")
+
+    def add(self, interaction: dict):
+        with self._lock:
+            self.interactions.append(interaction)
+            self._index = None
+
+    def next_match(self, key: str) -> dict | None:
+        """
+        Next recorded interaction for a request key.
+
+        Identical requests replay their recordings in order and start over once
+        all have been used, so a run can repeat a scenario more often than it
+        was recorded.
+        """
+        with self._lock:
+            if self._index is None:
+                self._index = {}
+                for interaction in self.interactions:
+                    self._index.setdefault(interaction["key"], []).append(interaction)
+            matches = self._index.get(key)
+            if not matches:
+                return None
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+            return matches[cursor % len(matches)]
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, on_complete):
+        self._stream = stream
+        self._on_complete = on_complete
+        self._chunks: list[tuple[float, bytes]] = []
+        self._completed = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._stream:
+            self._chunks.append((time.perf_counter(), chunk))
+            yield chunk
+        self._complete()
+
+    def _complete(self):
+        if not self._completed:
+            self._completed = True
+            self._on_complete(self._chunks)
+
+    def close(self):
+        self._stream.close()
+        self._complete()
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """Passes requests to a real transport and records each interaction into a cassette."""
+
+    def __init__(self, cassette: Cassette, transport: httpx.BaseTransport | None = None):
+        """
+        :param cassette: Cassette the interactions are added to
+        :param transport: Transport that sends the requests; a plain ``httpx.HTTPTransport`` by default
+        """
+        self.cassette = cassette
+        self.transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = _request_key(request)
+        start = time.perf_counter()
+        response = self.transport.handle_request(request)
+        headers_at = time.perf_counter() - start
+
+        def on_complete(chunks: list[tuple[float, bytes]]):
+            self.cassette.add(
+                {
+                    "key": key,
+                    "status": response.status_code,
+                    "headers": [
+                        [name, value]
+                        for name, value in response.headers.multi_items()
+                        if name.lower() not in _SKIPPED_HEADERS
+                    ],
+                    "headers_at": round(headers_at, 6),
+                    "chunks": [[round(at - start, 6), _encode(data)] for at, data in chunks],
+                }
+            )
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(response.stream, on_complete),
+            extensions=response.extensions,
+        )
+
+    def close(self):
+        self.transport.close()
+
+
+class _ReplayStream(httpx.SyncByteStream):
+    def __init__(self, chunks: list, start: float, latency_scale: float):
+        self._chunks = chunks
+        self._start = start
+        self._latency_scale = latency_scale
+
+    def __iter__(self) -> Iterator[bytes]:
+        for offset, data in self._chunks:
+            delay = self._start + offset * self._latency_scale - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            yield _decode(data)
+
+
+class ReplayTransport(httpx.BaseTransport):
+    """
+    Answers requests from a cassette without touching the network.
+
+    Headers and body chunks arrive at their recorded offsets multiplied by
+    ``latency_scale``. The waits happen in the calling thread, so concurrent
+    requests overlap as they did when recorded. Requests with no recording
+    get a 404 so the SDK fails them without retrying.
+    """
+
+    def __init__(self, cassette: Cassette, latency_scale: float = 1.0):
+        """
+        :param cassette: Recorded interactions to serve
+        :param latency_scale: Multiplier on recorded timings; ``0`` replays instantly
+        """
+        if latency_scale < 0:
+            raise ValueError(f"latency_scale must be non-negative, got {latency_scale}")
+        self.cassette = cassette
+        self.latency_scale = latency_scale
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        interaction = self.cassette.next_match(_request_key(request))
+        if interaction is None:
+            message = f"No recorded interaction for {request.method} {request.url}"
+            return httpx.Response(404, json={"error": {"message": message}}, request=request)
+
+        delay = start + interaction["headers_at"] * self.latency_scale - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        return httpx.Response(
+            status_code=interaction["status"],
+            headers=interaction["headers"],
+            stream=_ReplayStream(interaction["chunks"], start, self.latency_scale),
+            request=request,
+        )
+
+
+def use_cassette(cassette: Cassette, mode: str = "replay", latency_scale: float = 1.0):
+    """
+    Route every process-wide provider client through a cassette.
+
+    Applies to clients created afterwards, e.g. by a new ``AdvancedModelBenchmark``.
+    Only ``CASSETTE_PROVIDERS`` are covered; requests of other provider types
+    still go to the network.
+
+    :param cassette: Cassette to record into or replay from
+    :param mode: ``record`` or ``replay``
+    :param latency_scale: Multiplier on recorded timings when replaying
+    """
+    if mode not in CASSETTE_MODES:
+        raise ValueError(f"mode must be one of {CASSETTE_MODES}, got {mode!r}")
+    if mode == "record":
+        set_transport(lambda transport: RecordingTransport(cassette, transport))
+    else:
+        replay = ReplayTransport(cassette, latency_scale)
+        set_transport(lambda _: replay)
+
+
+def eject_cassette():
+    """Return process-wide clients to the network."""
+    set_transport(None)
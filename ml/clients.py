@@ -0,0 +1,210 @@
+import atexit
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import anthropic
+import google.generativeai as palm
+import httpx
+import openai
+
+# SDK behind each provider type; types sharing an SDK share clients per endpoint
+PROVIDER_SDKS = {
+    "openai": "openai",
+    "deepseek": "openai",
+    "anthropic": "anthropic",
+    "google": "google",
+}
+
+# Connection pool settings; the SDK defaults drop idle connections after 5s
+DEFAULT_POOL_OPTIONS = {
+    "max_connections": 32,
+    "max_keepalive_connections": 16,
+    "keepalive_expiry": 60.0,
+    "warmup": 0,
+}
+
+
+class ClientRegistry:
+    """
+    Provider SDK clients shared across benchmarks, tests and selectors.
+
+    Clients are keyed by ``(sdk, base_url, api_key)``, so every model on the
+    same endpoint and account reuses one client and its keep-alive HTTP
+    connection pool instead of paying connection and TLS setup per instance.
+
+    The google SDK is configured process-wide by ``palm.configure``, so there
+    is a single google client: it always uses the SDK's default endpoint, and
+    asking for it with a different API key than it was created with raises
+    ``ValueError`` rather than silently sharing one key. Separate registries
+    share that global configuration too.
+    """
+
+    def __init__(self, **options):
+        """
+        :param options: Pool settings overriding ``DEFAULT_POOL_OPTIONS``:
+            ``max_connections`` and ``max_keepalive_connections`` size each
+            endpoint's pool, ``keepalive_expiry`` is how long idle connections
+            stay open in seconds, and ``warmup`` is how many connections to
+            open when a client is created
+        """
+        self.options = dict(DEFAULT_POOL_OPTIONS)
+        self.transport_wrapper: Callable[[httpx.BaseTransport], httpx.BaseTransport] | None = None
+        self._clients: dict[tuple, tuple[Any, httpx.Client | None]] = {}
+        self._variants: dict[tuple, Any] = {}
+        self._google_api_key: str | None = None
+        self._lock = threading.Lock()
+        self.configure(**options)
+
+    def configure(self, **options):
+        """Update pool settings; they apply to clients created afterwards."""
+        unknown = set(options) - set(DEFAULT_POOL_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown client options: {sorted(unknown)}")
+        self.options.update(options)
+
+    def set_transport(self, wrapper: Callable[[httpx.BaseTransport], httpx.BaseTransport] | None):
+        """
+        Wrap the HTTP transport of every client created from now on.
+
+        Existing clients are closed so the next ``get`` builds them with the
+        wrapped transport. ``None`` restores plain network transports.
+
+        :param wrapper: Takes the pooled ``httpx.HTTPTransport`` and returns the
+            transport to use, e.g. a cassette recorder around it
+        """
+        self.close()
+        self.transport_wrapper = wrapper
+
+    def get(
+        self,
+        provider: str,
+        base_url: str | None = None,
+        api_key: str | None = None,
+        max_retries: int | None = None,
+    ):
+        """
+        Return the shared client for an endpoint, creating it on first use.
+
+        :param provider: Model type, e.g. ``openai``, ``deepseek``, ``anthropic``, ``google``
+        :param base_url: API endpoint; ``None`` uses the SDK default
+        :param api_key: Credential for the endpoint
+        :param max_retries: Override the SDK's own retry count, e.g. ``0`` when the
+            caller retries through ``ml.ratelimit``; the variant shares the
+            endpoint's connection pool
+        :return: SDK client (the configured ``google.generativeai`` module for google)
+        :raises ValueError: For an unknown provider, a google ``base_url``, or a
+            google ``api_key`` other than the one the google client was created with
+        """
+        if provider not in PROVIDER_SDKS:
+            raise ValueError(f"Unknown provider type: {provider}")
+        sdk = PROVIDER_SDKS[provider]
+        if sdk == "google" and base_url is not None:
+            raise ValueError(f"google clients use the SDK's default endpoint, got {base_url}")
+        # One google client: its SDK holds a single process-wide configuration
+        key = (sdk, None, None) if sdk == "google" else (sdk, base_url, api_key)
+
+        with self._lock:
+            entry = self._clients.get(key)
+            created = entry is None
+            if created:
+                entry = self._clients[key] = self._create(sdk, base_url, api_key)
+            elif sdk == "google" and api_key != self._google_api_key:
+                raise ValueError("The google client is already configured with another API key")
+
+        client, http_client = entry
+        if created and http_client is not None and self.options["warmup"]:
+            self._warmup(http_client, client.base_url, self.options["warmup"])
+        if max_retries is None or http_client is None:
+            return client
+
+        with self._lock:
+            variant = self._variants.get((*key, max_retries))
+            if variant is None:
+                variant = self._variants[(*key, max_retries)] = client.with_options(
+                    max_retries=max_retries
+                )
+        return variant
+
+    def _create(self, sdk: str, base_url: str | None, api_key: str | None):
+        if sdk == "google":
+            # The google SDK is configured globally and manages its own channel
+            palm.configure(api_key=api_key)
+            self._google_api_key = api_key
+            return palm, None
+
+        limits = httpx.Limits(
+            max_connections=self.options["max_connections"],
+            max_keepalive_connections=self.options["max_keepalive_connections"],
+            keepalive_expiry=self.options["keepalive_expiry"],
+        )
+        transport = {}
+        if self.transport_wrapper is not None:
+            transport["transport"] = self.transport_wrapper(httpx.HTTPTransport(limits=limits))
+        if sdk == "openai":
+            http_client = openai.DefaultHttpxClient(limits=limits, **transport)
+            client = openai.OpenAI(base_url=base_url, api_key=api_key, http_client=http_client)
+        else:
+            http_client = anthropic.DefaultHttpxClient(limits=limits, **transport)
+            client = anthropic.Anthropic(
+                base_url=base_url, api_key=api_key, http_client=http_client
+            )
+        return client, http_client
+
+    @staticmethod
+    def _warmup(http_client: httpx.Client, url, connections: int):
+        """Open ``connections`` pooled connections with concurrent HEAD requests."""
+
+        def head(_):
+            try:
+                http_client.head(str(url))
+            except httpx.HTTPError as e:
+                print(f"Error warming up connection to {url}: {e}")
+
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            list(executor.map(head, range(connections)))
+
+    def close(self):
+        """Close every pooled connection and forget the clients."""
+        with self._lock:
+            entries = list(self._clients.values())
+            self._clients.clear()
+            self._variants.clear()
+        for _, http_client in entries:
+            if http_client is not None:
+                http_client.close()
+
+
+_registry = ClientRegistry()
+
+
+def get_client(
+    provider: str,
+    base_url: str | None = None,
+    api_key: str | None = None,
+    max_retries: int | None = None,
+):
+    """Return the process-wide shared client; see ``ClientRegistry.get``."""
+    return _registry.get(provider, base_url=base_url, api_key=api_key, max_retries=max_retries)
+
+
+def configure_clients(**options):
+    """Set pool options for process-wide clients created from now on."""
+    _registry.configure(**options)
+
+
+def client_options() -> dict[str, Any]:
+    """Pool options of the process-wide registry, e.g. to set up a worker process alike."""
+    return dict(_registry.options)
+
+
+def set_transport(wrapper: Callable[[httpx.BaseTransport], httpx.BaseTransport] | None):
+    """Wrap the transport of process-wide clients; see ``ClientRegistry.set_transport``."""
+    _registry.set_transport(wrapper)
+
+
+@atexit.register
+def close_clients():
+    """Close the process-wide connection pools; runs automatically at process exit."""
+    _registry.close()
@@ -0,0 +1,185 @@
+import math
+import struct
+import zlib
+from collections.abc import Iterable
+
+import numpy as np
+
+# Percentiles reported for every histogram
+SUMMARY_PERCENTILES = {"p50": 50, "p90": 90, "p99": 99, "p999": 99.9}
+
+# Smallest distinguishable value; zero and negative samples land in its bucket
+MIN_TRACKABLE_VALUE = 1e-9
+
+# version, relative accuracy, count, sum, min, max, bucket count
+_HEADER = struct.Struct("<BdQdddI")
+_FORMAT_VERSION = 1
+
+
+class LatencyHistogram:
+    """
+    Compact, mergeable latency histogram with bounded relative error.
+
+    Values land in logarithmic buckets whose bounds grow by a constant
+    factor, so any reported percentile is within ``relative_accuracy`` of
+    the true sample value regardless of magnitude, as with HDR histograms.
+    Only non-empty buckets are stored; two histograms with the same accuracy
+    merge exactly by adding bucket counts.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        """
+        :param relative_accuracy: Maximum relative error of reported percentiles
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"relative_accuracy must be in (0, 1), got {relative_accuracy}")
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets: dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def mean(self) -> float | None:
+        return self.sum / self.count if self.count else None
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index: int) -> float:
+        # Midpoint of the bucket (gamma^(i-1), gamma^i] in relative terms
+        return 2 * self._gamma**index / (self._gamma + 1)
+
+    def record(self, value: float, count: int = 1):
+        """Add ``count`` occurrences of ``value``."""
+        index = self._index(max(value, MIN_TRACKABLE_VALUE))
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+        self.sum += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def record_many(self, values: Iterable[float]):
+        """Add every value in ``values``."""
+        values = np.fromiter(values, dtype=float)
+        if not values.size:
+            return
+        logs = np.log(np.maximum(values, MIN_TRACKABLE_VALUE))
+        indices = np.ceil(logs / self._log_gamma).astype(np.int64)
+        for index, count in zip(*np.unique(indices, return_counts=True), strict=True):
+            self.buckets[int(index)] = self.buckets.get(int(index), 0) + int(count)
+        self.count += int(values.size)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        """Add ``other``'s samples to this histogram in place and return it."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge histograms with different relative accuracy")
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @classmethod
+    def merged(cls, histograms: Iterable["LatencyHistogram"]) -> "LatencyHistogram | None":
+        """Combine histograms into a new one; ``None`` when there are none."""
+        result = None
+        for histogram in histograms:
+            if result is None:
+                result = cls(histogram.relative_accuracy)
+            result.merge(histogram)
+        return result
+
+    def percentiles(self, percentiles: Iterable[float]) -> list[float | None]:
+        """
+        Estimate several percentiles in one pass over the buckets.
+
+        :param percentiles: Percentiles between 0 and 100
+        :return: Estimated values, ``None`` for every percentile when empty
+        """
+        percentiles = list(percentiles)
+        if not self.count:
+            return [None] * len(percentiles)
+
+        indices = sorted(self.buckets)
+        cumulative = np.cumsum([self.buckets[index] for index in indices])
+        results = []
+        for percentile in percentiles:
+            if percentile >= 100:
+                results.append(self.max)
+                continue
+            rank = max(1, math.ceil(percentile / 100 * self.count))
+            index = indices[int(np.searchsorted(cumulative, rank))]
+            results.append(min(max(self._value(index), self.min), self.max))
+        return results
+
+    def percentile(self, percentile: float) -> float | None:
+        """Estimate a single percentile between 0 and 100."""
+        return self.percentiles([percentile])[0]
+
+    def summary(self) -> dict[str, float | None]:
+        """Sample count, mean, the ``SUMMARY_PERCENTILES`` and max."""
+        values = self.percentiles(SUMMARY_PERCENTILES.values())
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            **dict(zip(SUMMARY_PERCENTILES, values, strict=True)),
+            "max": self.max if self.count else None,
+        }
+
+    def to_bytes(self) -> bytes:
+        """Serialize to a compact blob suitable for a SQLite column."""
+        indices = np.array(sorted(self.buckets), dtype=np.int64)
+        counts = np.array([self.buckets[index] for index in indices], dtype=np.int64)
+        header = _HEADER.pack(
+            _FORMAT_VERSION,
+            self.relative_accuracy,
+            self.count,
+            self.sum,
+            self.min,
+            self.max,
+            len(indices),
+        )
+        # Delta-encoded indices compress well since occupied buckets cluster
+        body = np.diff(indices, prepend=0).tobytes() + counts.tobytes()
+        return header + zlib.compress(body)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "LatencyHistogram":
+        """Rebuild a histogram serialized with ``to_bytes``."""
+        version, accuracy, count, total, low, high, size = _HEADER.unpack_from(data)
+        if version != _FORMAT_VERSION:
+            raise ValueError(f"Unsupported histogram format version {version}")
+        body = np.frombuffer(zlib.decompress(data[_HEADER.size :]), dtype=np.int64)
+        indices = np.cumsum(body[:size])
+
+        histogram = cls(accuracy)
+        histogram.buckets = dict(zip(indices.tolist(), body[size:].tolist(), strict=True))
+        histogram.count = count
+        histogram.sum = total
+        histogram.min = low
+        histogram.max = high
+        return histogram
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, LatencyHistogram):
+            return NotImplemented
+        return (
+            self.relative_accuracy == other.relative_accuracy
+            and self.buckets == other.buckets
+            and self.count == other.count
+            and math.isclose(self.sum, other.sum)
+            and self.min == other.min
+            and self.max == other.max
+        )
+
+    def __repr__(self) -> str:
+        return f"LatencyHistogram(count={self.count}, buckets={len(self.buckets)})"
@@ -0,0 +1,194 @@
+import atexit
+import json
+import os
+import threading
+from collections import deque
+from collections.abc import Callable
+
+FSYNC_POLICIES = ("never", "flush", "always")
+
+
+class BufferedLogSink:
+    """
+    Append-only JSON-lines writer that keeps file I/O off the caller's path.
+
+    Records go into an in-memory ring buffer and a background thread writes
+    them out once ``flush_size`` records are pending or ``flush_interval``
+    seconds have passed, whichever comes first. When the buffer is full the
+    oldest pending record is overwritten and counted in ``dropped``.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        capacity: int = 100_000,
+        flush_size: int = 1000,
+        flush_interval: float = 1.0,
+        fsync: str = "never",
+    ):
+        """
+        :param path: JSON-lines file to append to
+        :param capacity: Maximum number of pending buffer entries
+        :param flush_size: Pending entries that trigger an early flush
+        :param flush_interval: Maximum seconds an entry waits before being written
+        :param fsync: ``never`` leaves durability to the OS, ``flush`` fsyncs after
+            every background flush, ``always`` writes and fsyncs on every call
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+
+        self.path = path
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+
+        self._buffer = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+        self._thread.start()
+
+    @property
+    def closed(self) -> bool:
+        """Whether ``close`` has been called."""
+        return self._closed
+
+    def write(self, record: dict):
+        """Queue a single record to be written as one JSON line."""
+        self._append(record)
+
+    def write_batch(self, render: Callable[[], str], count: int):
+        """
+        Queue many records as one buffer entry.
+
+        :param render: Called on the flush thread; returns the serialized lines
+        :param count: Number of records ``render`` produces, for accounting
+        """
+        self._append((render, count))
+
+    def _append(self, entry):
+        with self._lock:
+            if self._closed:
+                raise ValueError(f"log sink for {self.path} is closed")
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += self._entry_count(self._buffer[0])
+            self._buffer.append(entry)
+            pending = len(self._buffer)
+
+        if self.fsync == "always":
+            self.flush()
+        elif pending >= self.flush_size:
+            self._wakeup.set()
+
+    @staticmethod
+    def _entry_count(entry) -> int:
+        return entry[1] if isinstance(entry, tuple) else 1
+
+    def flush(self):
+        """Write every pending record now, from the calling thread."""
+        # Holding the I/O lock across drain and write keeps flushes from
+        # concurrent threads in buffer order
+        with self._io_lock:
+            with self._lock:
+                entries = list(self._buffer)
+                self._buffer.clear()
+            if not entries:
+                return
+
+            chunks = []
+            count = failed = 0
+            for entry in entries:
+                # A record that cannot be serialized is dropped on its own; raising
+                # here would stop the flush thread and every later write with it
+                try:
+                    if isinstance(entry, tuple):
+                        chunks.append(entry[0]())
+                    else:
+                        chunks.append(json.dumps(entry) + "\n")
+                except Exception as e:
+                    print(f"Error serializing log record for {self.path}: {e}")
+                    failed += self._entry_count(entry)
+                else:
+                    count += self._entry_count(entry)
+            if failed:
+                with self._lock:
+                    self.dropped += failed
+            if not chunks:
+                return
+
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a") as f:
+                    f.write("".join(chunks))
+                    if self.fsync != "never":
+                        f.flush()
+                        os.fsync(f.fileno())
+            except OSError as e:
+                print(f"Error writing log {self.path}: {e}")
+                with self._lock:
+                    self.dropped += count
+                return
+
+            self.written += count
+            self.flushes += 1
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """Flush pending records and stop the background thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
+
+    def stats(self) -> dict[str, int]:
+        """Counters for monitoring the sink."""
+        return {
+            "pending": len(self._buffer),
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+        }
+
+
+_sinks: dict[str, BufferedLogSink] = {}
+_sinks_lock = threading.Lock()
+
+
+def get_log_sink(path: str, **options) -> BufferedLogSink:
+    """
+    Return the process-wide sink for ``path``, creating it on first use.
+
+    :param path: JSON-lines file; relative paths resolve against the current directory
+    :param options: ``BufferedLogSink`` options, applied only when the sink is created
+    :return: Shared sink for the file
+    """
+    path = os.path.abspath(path)
+    with _sinks_lock:
+        sink = _sinks.get(path)
+        if sink is None or sink.closed:
+            sink = _sinks[path] = BufferedLogSink(path, **options)
+        return sink
+
+
+@atexit.register
+def close_log_sinks():
+    """Flush and close every shared sink; runs automatically at process exit."""
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+        _sinks.clear()
+    for sink in sinks:
+        sink.close()
@@ -0,0 +1,294 @@
+import random
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+# Starting client-side request rate (requests per second) per provider type
+DEFAULT_RATE_LIMITS = {
+    "openai": {"rate": 10.0},
+    "anthropic": {"rate": 5.0},
+    "google": {"rate": 5.0},
+    "deepseek": {"rate": 5.0},
+}
+
+# Statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose refill rate adapts to the provider's real ceiling.
+
+    Rates follow AIMD: every success adds ``increase / rate`` requests per
+    second (about ``increase`` per second of sustained traffic), and a 429
+    multiplies the rate by ``decrease``. 429s arriving within ``cooldown``
+    seconds of a decrease are responses to the old rate and do not shrink it
+    again. A Retry-After hint pauses the whole bucket until it passes.
+    """
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: float | None = None,
+        min_rate: float = 0.1,
+        max_rate: float | None = None,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        cooldown: float = 1.0,
+    ):
+        """
+        :param rate: Initial requests per second
+        :param burst: Bucket capacity; defaults to one second's worth at ``rate``
+        :param min_rate: Floor for multiplicative decreases
+        :param max_rate: Ceiling for additive increases; unbounded when ``None``
+        :param increase: Requests per second added per second of successes
+        :param decrease: Factor applied to the rate on a 429
+        :param cooldown: Seconds after a decrease during which further 429s are ignored
+        """
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        if not 0 < decrease < 1:
+            raise ValueError(f"decrease must be in (0, 1), got {decrease}")
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+
+        self.successes = 0
+        self.rate_limited = 0
+
+        self._tokens = self.capacity
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._decreased_at = -float("inf")
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> float:
+        return self.burst if self.burst is not None else max(self.rate, 1.0)
+
+    @property
+    def throttled(self) -> bool:
+        """Whether the provider asked us to back off and that time has not passed yet."""
+        return time.monotonic() < self._paused_until
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def acquire(self) -> float:
+        """
+        Block until a request may be sent.
+
+        :return: Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def on_success(self):
+        """Record a successful request; additive increase."""
+        with self._lock:
+            self.successes += 1
+            rate = self.rate + self.increase / self.rate
+            self.rate = min(rate, self.max_rate) if self.max_rate is not None else rate
+
+    def on_rate_limited(self, retry_after: float | None = None):
+        """
+        Record a 429; multiplicative decrease and an optional pause.
+
+        :param retry_after: Seconds the provider asked us to wait, if any
+        """
+        with self._lock:
+            self.rate_limited += 1
+            now = time.monotonic()
+            if now - self._decreased_at >= self.cooldown:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._decreased_at = now
+                # Drop any burst saved up at the old rate
+                self._refill(now)
+                self._tokens = min(self._tokens, 1.0)
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+    def stats(self) -> dict[str, float]:
+        """Counters and current rate for monitoring."""
+        return {
+            "rate": self.rate,
+            "successes": self.successes,
+            "rate_limited": self.rate_limited,
+            "throttled": self.throttled,
+        }
+
+
+@dataclass
+class RetryPolicy:
+    """Jittered exponential backoff for retryable provider errors."""
+
+    max_retries: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        """
+        Seconds to wait before retry number ``attempt + 1``.
+
+        Full jitter: uniform between zero and the exponential backoff, so
+        clients that failed together do not retry together. A Retry-After
+        hint from the provider is a lower bound.
+        """
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        return max(backoff, retry_after or 0.0)
+
+
+def status_code(error: Exception) -> int | None:
+    """HTTP status of a provider SDK error, if it carries one."""
+    code = getattr(error, "status_code", None)
+    if code is None:
+        # google.api_core errors (Gemini) carry the status as ``code``; OpenAI's ``code`` is a string
+        code = getattr(error, "code", None)
+    return code if isinstance(code, int) and not isinstance(code, bool) else None
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """Whether a provider SDK error is a 429 / rate limit rejection."""
+    if status_code(error) == 429:
+        return True
+    return "rate limit" in str(error).lower()
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether retrying the request could succeed."""
+    # Errors come from the SDKs, so they are loaded by now; routing never pays for them
+    import anthropic
+    import openai
+
+    if isinstance(error, openai.APIConnectionError | anthropic.APIConnectionError):
+        return True
+    return status_code(error) in RETRYABLE_STATUS_CODES or is_rate_limited(error)
+
+
+def retry_after(error: Exception) -> float | None:
+    """Seconds the provider asked us to wait, from Retry-After style headers."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            value = headers["retry-after"]
+            try:
+                return float(value)
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def call_with_retry(
+    fn: Callable[[], T],
+    limiter: AdaptiveRateLimiter | None = None,
+    policy: RetryPolicy | None = None,
+) -> T:
+    """
+    Call ``fn`` through a rate limiter, retrying retryable errors.
+
+    :param fn: Sends one request; SDK-level retries should be disabled
+    :param limiter: Limiter to acquire from and feed outcomes back to
+    :param policy: Backoff settings; defaults to the process-wide policy
+    :return: Result of the first successful call
+    :raises Exception: The last error, once retries are exhausted or the
+        error is not retryable
+    """
+    policy = policy or _retry_policy
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            result = fn()
+        except Exception as e:
+            wait = retry_after(e)
+            if limiter is not None and is_rate_limited(e):
+                limiter.on_rate_limited(wait)
+            if attempt >= policy.max_retries or not is_retryable(e):
+                raise
+            time.sleep(policy.delay(attempt, wait))
+            attempt += 1
+            continue
+        if limiter is not None:
+            limiter.on_success()
+        return result
+
+
+_limiters: dict[str, AdaptiveRateLimiter] = {}
+_limit_options: dict[str, dict[str, Any]] = {k: dict(v) for k, v in DEFAULT_RATE_LIMITS.items()}
+_retry_policy = RetryPolicy()
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> AdaptiveRateLimiter:
+    """
+    Return the process-wide limiter for a provider type, creating it on first use.
+
+    :param provider: Model type, e.g. ``openai``, ``deepseek``, ``anthropic``, ``google``
+    :return: Limiter shared by every caller in the process
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            limiter = _limiters[provider] = AdaptiveRateLimiter(**_limit_options.get(provider, {}))
+        return limiter
+
+
+def configure_rate_limits(
+    rate_limits: dict[str, dict[str, Any]] | None = None, retry: dict[str, Any] | None = None
+):
+    """
+    Set limiter options per provider type and the retry policy.
+
+    Limiters are recreated with the new options on next use.
+
+    :param rate_limits: Provider type to ``AdaptiveRateLimiter`` options
+    :param retry: ``RetryPolicy`` options
+    """
+    global _retry_policy
+    with _limiters_lock:
+        for provider, options in (rate_limits or {}).items():
+            _limit_options[provider] = {**_limit_options.get(provider, {}), **options}
+            _limiters.pop(provider, None)
+        if retry is not None:
+            _retry_policy = RetryPolicy(**retry)
+
+
+def rate_limit_options() -> dict[str, dict[str, Any]]:
+    """Limiter options per provider type, as passed to ``configure_rate_limits``."""
+    with _limiters_lock:
+        return {provider: dict(options) for provider, options in _limit_options.items()}
+
+
+def get_retry_policy() -> RetryPolicy:
+    """The process-wide retry policy."""
+    return _retry_policy
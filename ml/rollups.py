@@ -0,0 +1,431 @@
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from ml.histogram import LatencyHistogram
+from ml.storage import DEFAULT_ARCHIVE_DIR, DEFAULT_DB_PATH, migrate, open_database
+
+# Rollup resolutions from finest to coarsest: bucket width in seconds, and how an
+# ISO timestamp is cut down to its bucket start, always "YYYY-MM-DDTHH:MM"
+RESOLUTIONS = {
+    "minute": (60, 16, ""),
+    "hour": (3600, 13, ":00"),
+    "day": (86400, 10, "T00:00"),
+}
+
+# Levels a trend can be read from, finest first
+TREND_LEVELS = ("raw", *RESOLUTIONS)
+
+# performance_metrics columns summarized in metric_rollups
+ROLLUP_METRICS = [
+    "total_queries",
+    "avg_response_time",
+    "median_response_time",
+    "avg_token_generation_rate",
+    "task_success_rate",
+    "error_rate",
+    "total_execution_time",
+    "avg_time_to_first_token",
+    "p50_inter_token_latency",
+    "p90_inter_token_latency",
+    "p99_inter_token_latency",
+    "output_tokens_per_second",
+    "p90_response_time",
+    "p99_response_time",
+    "p999_response_time",
+    "max_response_time",
+]
+
+# Most points per model a trend query returns
+DEFAULT_MAX_POINTS = 500
+
+
+@dataclass
+class RetentionPolicy:
+    """Days each level of history is kept; None keeps it forever."""
+
+    raw_days: float | None = 7
+    minute_days: float | None = 30
+    hour_days: float | None = 365
+    day_days: float | None = None
+
+    def cutoff(self, level: str, now: datetime) -> str | None:
+        """Start of the oldest bucket (or raw timestamp) of ``level`` that is kept."""
+        days = getattr(self, f"{level}_days")
+        if days is None:
+            return None
+        cutoff = (now - timedelta(days=days)).isoformat()
+        return cutoff if level == "raw" else bucket_start(cutoff, level)
+
+
+def bucket_start(timestamp: str, resolution: str) -> str:
+    """Start of the ``resolution`` bucket holding an ISO timestamp."""
+    _, length, suffix = RESOLUTIONS[resolution]
+    return timestamp[:length] + suffix
+
+
+def _bucket_sql(column: str, resolution: str) -> str:
+    """SQL expression for ``bucket_start`` of a timestamp column."""
+    _, length, suffix = RESOLUTIONS[resolution]
+    return f"substr({column}, 1, {length}) || '{suffix}'"
+
+
+def _state(conn: sqlite3.Connection, name: str, default=None):
+    row = conn.execute("SELECT value FROM rollup_state WHERE name = ?", (name,)).fetchone()
+    return default if row is None else row[0]
+
+
+def _set_state(conn: sqlite3.Connection, name: str, value):
+    conn.execute("INSERT OR REPLACE INTO rollup_state (name, value) VALUES (?, ?)", (name, value))
+
+
+def _roll_up(conn: sqlite3.Connection) -> int:
+    """Add performance_metrics rows not rolled up yet to every resolution's buckets."""
+    rolled_up_id = _state(conn, "rolled_up_id", 0)
+    (last_id, count) = conn.execute(
+        "SELECT MAX(id), COUNT(*) FROM performance_metrics WHERE id > ?", (rolled_up_id,)
+    ).fetchone()
+    if not count:
+        return 0
+
+    for resolution in RESOLUTIONS:
+        for metric in ROLLUP_METRICS:
+            conn.execute(
+                f"""
+            INSERT INTO metric_rollups
+                (resolution, bucket_start, model_name, metric, count, sum, sum_sq, min, max)
+            SELECT ?, {_bucket_sql("timestamp", resolution)}, model_name, ?, COUNT({metric}),
+                TOTAL({metric}), TOTAL({metric} * {metric}), MIN({metric}), MAX({metric})
+            FROM performance_metrics
+            WHERE id > ? AND id <= ? AND {metric} IS NOT NULL
+            GROUP BY 2, 3
+            ON CONFLICT (resolution, bucket_start, model_name, metric) DO UPDATE SET
+                count = count + excluded.count,
+                sum = sum + excluded.sum,
+                sum_sq = sum_sq + excluded.sum_sq,
+                min = MIN(min, excluded.min),
+                max = MAX(max, excluded.max)
+            """,
+                (resolution, metric, rolled_up_id, last_id),
+            )
+
+    # Histograms are merged here rather than in SQL, one sketch per bucket and model
+    buckets: dict[tuple[str, str, str], LatencyHistogram] = {}
+    for timestamp, model_name, blob in conn.execute(
+        """
+        SELECT p.timestamp, p.model_name, h.histogram
+        FROM latency_histograms h JOIN performance_metrics p ON p.id = h.metrics_id
+        WHERE h.metrics_id > ? AND h.metrics_id <= ?
+        """,
+        (rolled_up_id, last_id),
+    ).fetchall():
+        histogram = LatencyHistogram.from_bytes(blob)
+        for resolution in RESOLUTIONS:
+            key = (resolution, bucket_start(timestamp, resolution), model_name)
+            if key in buckets:
+                buckets[key].merge(histogram)
+            else:
+                buckets[key] = LatencyHistogram.merged([histogram])
+
+    for (resolution, start, model_name), histogram in buckets.items():
+        row = conn.execute(
+            "SELECT histogram FROM latency_rollups "
+            "WHERE resolution = ? AND bucket_start = ? AND model_name = ?",
+            (resolution, start, model_name),
+        ).fetchone()
+        if row is not None:
+            histogram.merge(LatencyHistogram.from_bytes(row[0]))
+        summary = histogram.summary()
+        conn.execute(
+            """
+        INSERT OR REPLACE INTO latency_rollups
+            (resolution, bucket_start, model_name, histogram, count, p50, p90, p99, max)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+            (
+                resolution,
+                start,
+                model_name,
+                histogram.to_bytes(),
+                summary["count"],
+                summary["p50"],
+                summary["p90"],
+                summary["p99"],
+                summary["max"],
+            ),
+        )
+
+    _set_state(conn, "rolled_up_id", last_id)
+    return count
+
+
+def _apply_retention(
+    conn: sqlite3.Connection,
+    policy: RetentionPolicy,
+    now: datetime,
+    archived: dict[str, int] | None,
+) -> dict[str, int]:
+    """
+    Delete rolled-up raw rows and rollup buckets older than the policy keeps.
+
+    :param archived: Highest id exported per table; raw rows above it are kept.
+        ``None`` deletes raw rows whether or not they were exported
+    """
+    deleted = {}
+    last_id = _state(conn, "rolled_up_id", 0)
+    samples_id = None
+    if archived is not None:
+        last_id = min(last_id, archived.get("performance_metrics", 0))
+        samples_id = archived.get("request_samples", 0)
+
+    cutoff = policy.cutoff("raw", now)
+    if cutoff is not None:
+        expired = "FROM performance_metrics WHERE timestamp < ? AND id <= ?"
+        conn.execute(
+            f"DELETE FROM latency_histograms WHERE metrics_id IN (SELECT id {expired})",
+            (cutoff, last_id),
+        )
+        if samples_id is None:
+            conn.execute(
+                f"DELETE FROM request_samples WHERE run_id IN (SELECT run_id {expired})",
+                (cutoff, last_id),
+            )
+        else:
+            conn.execute(
+                f"DELETE FROM request_samples WHERE run_id IN (SELECT run_id {expired}) "
+                "AND id <= ?",
+                (cutoff, last_id, samples_id),
+            )
+        deleted["raw"] = conn.execute(f"DELETE {expired}", (cutoff, last_id)).rowcount
+        # Expired rows held back until an export copies them to the archive
+        (deleted["unarchived"],) = conn.execute(
+            "SELECT COUNT(*) FROM performance_metrics WHERE timestamp < ?", (cutoff,)
+        ).fetchone()
+
+    for resolution in RESOLUTIONS:
+        cutoff = policy.cutoff(resolution, now)
+        if cutoff is None:
+            continue
+        conn.execute(
+            "DELETE FROM latency_rollups WHERE resolution = ? AND bucket_start < ?",
+            (resolution, cutoff),
+        )
+        deleted[resolution] = conn.execute(
+            "DELETE FROM metric_rollups WHERE resolution = ? AND bucket_start < ?",
+            (resolution, cutoff),
+        ).rowcount
+
+    # Readers skip a level for ranges starting before its data was deleted
+    for level in TREND_LEVELS:
+        cutoff = policy.cutoff(level, now)
+        if cutoff is not None and cutoff > _state(conn, f"{level}_deleted_before", ""):
+            _set_state(conn, f"{level}_deleted_before", cutoff)
+    return deleted
+
+
+def compact_history(
+    db_path: str = DEFAULT_DB_PATH,
+    policy: RetentionPolicy | None = None,
+    now: datetime | None = None,
+    archive_dir: str | None = DEFAULT_ARCHIVE_DIR,
+) -> dict[str, int]:
+    """
+    Roll new benchmark rows into minute, hour and day buckets, then apply retention.
+
+    Each bucket keeps the count, sum, sum of squares, min and max of every
+    metric per model, plus a merged response time histogram, so buckets merge
+    exactly and any coarser view can be rebuilt from finer ones. Rolling up is
+    incremental; raw rows are only deleted once they have been rolled up and,
+    per the archive's ``_manifest.json``, exported by ``ml.archive``, so run
+    ``export_history`` first. The whole job runs in one transaction.
+
+    :param db_path: SQLite performance database
+    :param policy: How long each level is kept; defaults to ``RetentionPolicy()``
+    :param now: Reference time for retention, for tests
+    :param archive_dir: Parquet archive raw rows must reach before deletion;
+        ``None`` deletes them without checking
+    :return: ``rolled_up`` raw rows, rows deleted per level, and ``unarchived``
+        expired raw rows kept because they were not exported yet
+    """
+    policy = policy or RetentionPolicy()
+    now = now or datetime.now()
+    archived = None
+    if archive_dir is not None:
+        # Imported here so trend readers do not load pyarrow
+        from ml.archive import read_manifest
+
+        archived = read_manifest(archive_dir)
+    conn = open_database(db_path)
+    try:
+        migrate(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = {"rolled_up": _roll_up(conn)}
+            result.update(_apply_retention(conn, policy, now, archived))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    finally:
+        conn.close()
+    return result
+
+
+def _has_rollups(conn: sqlite3.Connection) -> bool:
+    return (
+        conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'rollup_state'").fetchone()
+        is not None
+    )
+
+
+def history_bounds(conn: sqlite3.Connection) -> tuple[str | None, str | None]:
+    """Earliest and latest timestamp in raw rows or day buckets, read from indexes."""
+    # Separate subqueries: SQLite only answers a lone MIN or MAX from an index
+    bounds = [
+        conn.execute(
+            "SELECT (SELECT MIN(timestamp) FROM performance_metrics), "
+            "(SELECT MAX(timestamp) FROM performance_metrics)"
+        )
+    ]
+    if _has_rollups(conn):
+        bounds.append(
+            conn.execute(
+                "SELECT (SELECT MIN(bucket_start) FROM metric_rollups WHERE resolution = 'day'), "
+                "(SELECT MAX(bucket_start) FROM metric_rollups WHERE resolution = 'day')"
+            )
+        )
+    firsts, lasts = zip(*(cursor.fetchone() for cursor in bounds), strict=True)
+    firsts = [t for t in firsts if t is not None]
+    lasts = [t for t in lasts if t is not None]
+    return min(firsts, default=None), max(lasts, default=None)
+
+
+def choose_resolution(
+    conn: sqlite3.Connection, start: str, end: str, max_points: int = DEFAULT_MAX_POINTS
+) -> str:
+    """
+    Pick the level a trend over ``[start, end]`` is read from.
+
+    That is the finest level which still holds the whole range, having not
+    been deleted by retention, and returns at most ``max_points`` rows or
+    buckets, so a query costs about the same for an hour as for a year.
+    Databases never compacted have every raw row, bucketed on the fly.
+
+    :return: ``raw`` or a key of ``RESOLUTIONS``
+    """
+    compacted = _has_rollups(conn)
+    span = (datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds()
+    for level in TREND_LEVELS:
+        deleted_before = _state(conn, f"{level}_deleted_before") if compacted else None
+        if deleted_before is not None and start < deleted_before:
+            continue
+        if level == "raw":
+            # Counting stops after max_points + 1 index entries
+            (rows,) = conn.execute(
+                "SELECT COUNT(*) FROM (SELECT 1 FROM performance_metrics "
+                "WHERE timestamp >= ? AND timestamp <= ? LIMIT ?)",
+                (start, end, max_points + 1),
+            ).fetchone()
+            if rows <= max_points:
+                return level
+        elif span / RESOLUTIONS[level][0] <= max_points:
+            return level
+    return TREND_LEVELS[-1]
+
+
+def load_trends(
+    conn: sqlite3.Connection,
+    metrics: list[str],
+    start: str | None = None,
+    end: str | None = None,
+    max_points: int = DEFAULT_MAX_POINTS,
+) -> tuple[str, list[dict]]:
+    """
+    Per-model history of metrics over a time range, at the level ``choose_resolution`` picks.
+
+    Rollup buckets are combined with raw rows added since the last
+    compaction, so trends include the latest runs. On a database never
+    compacted, buckets are averaged from the raw rows alone.
+
+    :param conn: Open database connection
+    :param metrics: Columns of ``ROLLUP_METRICS`` to load
+    :param start: ISO timestamp to start at; defaults to the oldest stored data
+    :param end: ISO timestamp to end at; defaults to the newest stored data
+    :param max_points: Most rows or buckets the chosen level may return
+    :return: The level read, and one row per model and timestamp or bucket with
+        ``bucket_start``, ``model_name`` and each metric's mean, in time order
+    """
+    unknown = set(metrics) - set(ROLLUP_METRICS)
+    if unknown:
+        raise ValueError(f"metrics must be in ROLLUP_METRICS, got {sorted(unknown)}")
+    first, last = history_bounds(conn)
+    start = start or first
+    end = end or last
+    if start is None or end is None:
+        return "raw", []
+
+    level = choose_resolution(conn, start, end, max_points)
+    if level == "raw":
+        cursor = conn.execute(
+            f"SELECT timestamp, model_name, {', '.join(metrics)} FROM performance_metrics "
+            "WHERE timestamp >= ? AND timestamp <= ? ORDER BY timestamp, model_name",
+            (start, end),
+        )
+        return level, [
+            {
+                "bucket_start": row[0],
+                "model_name": row[1],
+                **dict(zip(metrics, row[2:], strict=True)),
+            }
+            for row in cursor
+        ]
+
+    # Metric names are checked against ROLLUP_METRICS above, so they are safe to inline.
+    # Raw rows are grouped once for all metrics, then split into one row per metric;
+    # SQLite 3.35+ materializes a CTE used more than once; older ones rerun it per metric
+    compacted = _has_rollups(conn)
+    recent = ", ".join(
+        f"COUNT({metric}) AS {metric}_count, TOTAL({metric}) AS {metric}_sum" for metric in metrics
+    )
+    sources = [
+        f"SELECT bucket_start, model_name, '{metric}' AS metric, {metric}_count AS count, "
+        f"{metric}_sum AS sum FROM recent"
+        for metric in metrics
+    ]
+    if compacted:
+        metric_names = ", ".join(f"'{metric}'" for metric in metrics)
+        sources.append(
+            "SELECT bucket_start, model_name, metric, count, sum FROM metric_rollups "
+            "WHERE resolution = :resolution AND bucket_start >= :bucket_from "
+            f"AND bucket_start <= :end AND metric IN ({metric_names})"
+        )
+    cursor = conn.execute(
+        f"""
+        WITH recent AS (
+            SELECT {_bucket_sql("timestamp", level)} AS bucket_start, model_name, {recent}
+            FROM performance_metrics
+            WHERE id > :rolled_up_id AND timestamp >= :start AND timestamp <= :end
+            GROUP BY 1, 2
+        )
+        SELECT bucket_start, model_name, metric, TOTAL(sum) / SUM(count)
+        FROM ({" UNION ALL ".join(sources)})
+        WHERE count > 0
+        GROUP BY bucket_start, model_name, metric
+        ORDER BY bucket_start, model_name
+        """,
+        {
+            "resolution": level,
+            "bucket_from": bucket_start(start, level),
+            "start": start,
+            "end": end,
+            "rolled_up_id": _state(conn, "rolled_up_id", 0) if compacted else 0,
+        },
+    )
+    rows: dict[tuple[str, str], dict] = {}
+    for start_, model_name, metric, mean in cursor:
+        row = rows.setdefault(
+            (start_, model_name),
+            {"bucket_start": start_, "model_name": model_name, **dict.fromkeys(metrics)},
+        )
+        row[metric] = mean
+    return level, list(rows.values())
@@ -1,12 +1,78 @@
 import json
-import os
 import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import Iterable
 from datetime import datetime
+from functools import partial
+from itertools import repeat
+from typing import TYPE_CHECKING
 
 import numpy as np
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.io as pio
+
+from ml.bandit import BanditRouter
+from ml.histogram import LatencyHistogram
+from ml.logsink import BufferedLogSink, get_log_sink
+from ml.ratelimit import get_rate_limiter
+from ml.rollups import DEFAULT_MAX_POINTS, load_trends
+from ml.scoring import LATENCY_PERCENTILE_COLUMNS, SCORE_METRIC_DEFAULTS, CompositeScorer
+from ml.storage import open_database
+
+# pandas, plotly and scikit-learn are only needed for reports and the task policy;
+# they are imported where used so routing processes start quickly
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from ml.taskindex import TaskIndex
+
+
+def _render_selection_batch(
+    timestamp: str,
+    selected_models: list[str],
+    task_descriptions: list[str],
+    task_complexities: list[str],
+    selection_prefix: str,
+) -> str:
+    """
+    Serialize a batch of selections as the JSON lines ``_log_model_selection`` writes.
+
+    The selection id of each entry is ``selection_prefix-index``.
+    """
+    return "".join(
+        json.dumps(
+            {
+                "timestamp": timestamp,
+                "selected_model": model,
+                "task_description": description,
+                "task_complexity": complexity,
+                "selection_id": f"{selection_prefix}-{i}",
+            }
+        )
+        + "\n"
+        for i, (model, description, complexity) in enumerate(
+            zip(selected_models, task_descriptions, task_complexities, strict=True)
+        )
+    )
+
+
+# Column of a single run's metrics row holding each model_histograms percentile
+_RUN_PERCENTILE_COLUMNS = {
+    "p50": "median_response_time",
+    "p90": "p90_response_time",
+    "p99": "p99_response_time",
+    "p999": "p999_response_time",
+    "max": "max_response_time",
+}
+
+
+# Routing policies: argmax of the benchmark score, Thompson sampling on live outcomes,
+# or the outcomes of similar past tasks
+ROUTING_POLICIES = ("score", "bandit", "task")
+
+
+def _default(value, default):
+    return default if value is None else value
 
 
 class AdaptiveModelSelector:
@@ -16,13 +82,34 @@ class AdaptiveModelSelector:
     and historical performance.
     """
 
-    def __init__(self, performance_db_path="reports/model_performance.db"):
+    def __init__(
+        self,
+        performance_db_path="reports/model_performance.db",
+        snapshot_ttl=1.0,
+        selection_log_path="logs/model_selection.jsonl",
+        scorer=None,
+        policy="score",
+    ):
         """
         Initialize the adaptive model selector with performance database.
 
         :param performance_db_path: Path to SQLite performance tracking database
+        :param snapshot_ttl: Seconds a cached metrics snapshot is trusted before
+            the database is checked for changes
+        :param selection_log_path: JSON-lines file model selections are appended to
+        :param scorer: Scoring strategy from ``ml.scoring``; defaults to ``CompositeScorer``
+        :param policy: ``score`` picks the best benchmark score; ``bandit`` routes by
+            Thompson sampling over outcomes fed back through ``record_outcome``;
+            ``task`` routes by the outcomes of the most similar past task descriptions,
+            falling back to the benchmark score for tasks unlike any seen before
         """
+        if policy not in ROUTING_POLICIES:
+            raise ValueError(f"policy must be one of {ROUTING_POLICIES}, got {policy!r}")
+        self.policy = policy
         self.performance_db_path = performance_db_path
+        self.snapshot_ttl = snapshot_ttl
+        self.selection_log_path = selection_log_path
+        self.scorer = scorer or CompositeScorer()
         self.models = [
             "gpt-4o",
             "deepseek-r1",
@@ -30,17 +117,40 @@ class AdaptiveModelSelector:
             "gemini-2.0-flash-exp",
         ]
 
+        # Provider type of each model, for consulting the shared rate limiters
+        self.model_providers = {
+            "gpt-4o": "openai",
+            "deepseek-r1": "deepseek",
+            "claude-3-5-sonnet-20241022": "anthropic",
+            "gemini-2.0-flash-exp": "google",
+        }
+
         # Task complexity mapping
         self.task_complexity_weights = {"low": 0.2, "medium": 0.5, "high": 0.8, "extreme": 1.0}
 
-    def _load_historical_performance(self) -> pd.DataFrame:
+        # Cached "latest metrics per model" snapshot used on the routing path
+        self._conn = None
+        self._snapshot = None
+        self._snapshot_version = None
+        self._snapshot_checked_at = 0.0
+        self._db_lock = threading.Lock()
+        self._selection_log = None
+        self._bandit = None
+        self._bandit_lock = threading.Lock()
+        self._task_index = None
+        # Selection log ids of each thread's latest routing call
+        self._last_selection = threading.local()
+
+    def _load_historical_performance(self) -> "pd.DataFrame":
         """
         Load historical performance metrics from SQLite database.
 
         :return: DataFrame with performance metrics
         """
+        import pandas as pd
+
         try:
-            conn = sqlite3.connect(self.performance_db_path)
+            conn = open_database(self.performance_db_path)
             df = pd.read_sql_query("SELECT * FROM performance_metrics", conn)
             conn.close()
             return df
@@ -48,6 +158,225 @@ class AdaptiveModelSelector:
             print(f"Error loading performance data: {e}")
             return pd.DataFrame()
 
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Return the selector's long-lived read connection.
+
+        ``PRAGMA data_version`` only reports commits made by other connections
+        since this one was opened, so change detection needs a persistent handle.
+        """
+        if self._conn is None:
+            self._conn = open_database(self.performance_db_path, check_same_thread=False)
+        return self._conn
+
+    def _load_latest_performance(self, conn: sqlite3.Connection) -> dict[str, dict[str, float]]:
+        """
+        Load the most recent metrics row for each model.
+
+        Reads the ``model_latest`` summary maintained by the benchmark writer,
+        falling back to a grouped scan of ``performance_metrics`` for databases
+        that predate it. Each model also gets the ``LATENCY_PERCENTILE_COLUMNS``
+        of its all-time ``model_histograms`` entry; databases without histograms
+        fall back to the latest run's own percentiles.
+
+        :param conn: Open database connection
+        :return: Mapping of model name to its latest metrics
+        """
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        try:
+            cursor.execute("SELECT * FROM model_latest")
+        except sqlite3.OperationalError:
+            cursor.execute("""
+                SELECT * FROM performance_metrics
+                WHERE rowid IN (SELECT MAX(rowid) FROM performance_metrics GROUP BY model_name)
+            """)
+        latest = {row["model_name"]: dict(row) for row in cursor}
+
+        percentiles = list(LATENCY_PERCENTILE_COLUMNS.values())
+        try:
+            cursor.execute(f"SELECT model_name, {', '.join(percentiles)} FROM model_histograms")
+            for row in cursor:
+                if row["model_name"] in latest:
+                    latest[row["model_name"]].update((c, row[c]) for c in percentiles)
+        except sqlite3.OperationalError:
+            for metrics in latest.values():
+                for column, run_column in _RUN_PERCENTILE_COLUMNS.items():
+                    metrics[column] = metrics.get(run_column)
+        return latest
+
+    def _load_model_aggregates(self) -> dict[str, dict[str, float]]:
+        """
+        Load per-model means of every tracked metric.
+
+        Reads the ``model_aggregates`` summary, so the cost depends on the
+        number of models rather than the length of the benchmark history.
+
+        :return: Mapping of model name to ``{metric: mean}``
+        """
+        aggregates = {}
+        try:
+            with self._db_lock:
+                rows = (
+                    self._connection()
+                    .execute(
+                        "SELECT model_name, metric, sum / count FROM model_aggregates WHERE count > 0"
+                    )
+                    .fetchall()
+                )
+            for model_name, metric, mean in rows:
+                aggregates.setdefault(model_name, {})[metric] = mean
+        except sqlite3.OperationalError:
+            historical_data = self._load_historical_performance()
+            if not historical_data.empty:
+                means = historical_data.groupby("model_name").mean(numeric_only=True)
+                aggregates = means.to_dict(orient="index")
+        return aggregates
+
+    def _load_latency_histograms(self) -> dict[str, LatencyHistogram]:
+        """
+        Load each model's response time histogram, merged over every run.
+
+        :return: Mapping of model name to its histogram; empty for databases
+            written before histograms were recorded
+        """
+        try:
+            with self._db_lock:
+                rows = (
+                    self._connection()
+                    .execute("SELECT model_name, histogram FROM model_histograms")
+                    .fetchall()
+                )
+        except sqlite3.OperationalError:
+            return {}
+        return {model_name: LatencyHistogram.from_bytes(blob) for model_name, blob in rows}
+
+    def _latest_performance_snapshot(self) -> dict[str, dict[str, float]]:
+        """
+        Return the cached latest-metrics snapshot, refreshing it when stale.
+
+        Within ``snapshot_ttl`` seconds the snapshot is returned as is. After
+        that the database's data version is checked and the snapshot is only
+        reloaded if another connection has committed changes.
+
+        :return: Mapping of model name to its latest metrics
+        """
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._snapshot_checked_at < self.snapshot_ttl:
+            return self._snapshot
+
+        with self._db_lock:
+            if self._snapshot is not None and now - self._snapshot_checked_at < self.snapshot_ttl:
+                return self._snapshot
+            try:
+                conn = self._connection()
+                version = conn.execute("PRAGMA data_version").fetchone()[0]
+                if self._snapshot is None or version != self._snapshot_version:
+                    self._snapshot = self._load_latest_performance(conn)
+                    self._snapshot_version = version
+            except sqlite3.Error as e:
+                print(f"Error loading performance data: {e}")
+                self._snapshot = {}
+                self._snapshot_version = None
+            self._snapshot_checked_at = now
+            return self._snapshot
+
+    def invalidate_snapshot(self):
+        """Drop the cached metrics snapshot so the next lookup reloads it."""
+        with self._db_lock:
+            self._snapshot = None
+            self._snapshot_version = None
+
+    def performance_trends(
+        self,
+        metrics: Iterable[str] = ("avg_response_time", "task_success_rate"),
+        start: str | None = None,
+        end: str | None = None,
+        max_points: int = DEFAULT_MAX_POINTS,
+    ) -> tuple[str, list[dict]]:
+        """
+        Load per-model metric history over a time range.
+
+        Reads raw rows for short ranges and the coarsest minute, hour or day
+        rollups needed for longer ones (see ``ml.rollups.load_trends``), so the
+        cost depends on ``max_points`` rather than on how much history is stored.
+
+        :param metrics: performance_metrics columns to load
+        :param start: ISO timestamp to start at; defaults to the oldest stored data
+        :param end: ISO timestamp to end at; defaults to the newest stored data
+        :param max_points: Most rows or buckets to read
+        :return: The level read and one row per model and point in time
+        """
+        try:
+            with self._db_lock:
+                return load_trends(self._connection(), list(metrics), start, end, max_points)
+        except sqlite3.Error as e:
+            print(f"Error loading performance trends: {e}")
+            return "raw", []
+
+    @property
+    def bandit(self) -> BanditRouter:
+        """Online router learning from ``record_outcome``, restored from its checkpoint."""
+        if self._bandit is None:
+            with self._bandit_lock:
+                if self._bandit is None:
+                    self._bandit = BanditRouter(self.models, db_path=self.performance_db_path)
+        return self._bandit
+
+    @property
+    def task_index(self) -> "TaskIndex":
+        """Outcomes of past tasks by description, loaded from ``task_outcomes`` on first use."""
+        if self._task_index is None:
+            with self._bandit_lock:
+                if self._task_index is None:
+                    from ml.taskindex import TaskIndex
+
+                    self._task_index = TaskIndex(self.models, db_path=self.performance_db_path)
+        return self._task_index
+
+    @property
+    def last_selection_ids(self) -> list[str]:
+        """Selection log ids of this thread's latest logged routing call, in task order."""
+        prefix, count = getattr(self._last_selection, "ids", (None, 0))
+        if prefix is None:
+            return []
+        return [prefix] if count is None else [f"{prefix}-{i}" for i in range(count)]
+
+    def record_outcome(
+        self,
+        model: str,
+        success: bool,
+        latency_ms: float | None = None,
+        task_description: str | None = None,
+        selection_id: str | None = None,
+    ):
+        """
+        Feed back the result of a request sent to a selected model.
+
+        :param model: Model that served the request
+        :param success: Whether the request succeeded
+        :param latency_ms: End-to-end response time, if measured
+        :param task_description: Description the task was routed with; adds the
+            outcome to the task index used by the ``task`` policy
+        :param selection_id: Id of the selection log entry, from ``last_selection_ids``
+        """
+        self.bandit.record_outcome(model, success, latency_ms)
+        if task_description is not None:
+            self.task_index.add(task_description, model, success, latency_ms, selection_id)
+
+    def close(self):
+        """Close the selector's database connection and save the online routing state."""
+        if self._bandit is not None:
+            self._bandit.checkpoint()
+        if self._task_index is not None:
+            self._task_index.close()
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._snapshot = None
+            self._snapshot_version = None
+
     def _calculate_model_score(
         self, model_metrics: dict[str, float], task_complexity: str
     ) -> float:
@@ -76,79 +405,240 @@ class AdaptiveModelSelector:
 
         return composite_score
 
-    def select_optimal_model(self, task_description: str, task_complexity: str = "medium") -> str:
+    def _metrics_matrix(
+        self,
+        latest_metrics: dict[str, dict[str, float]],
+        metrics: dict[str, float] = SCORE_METRIC_DEFAULTS,
+    ) -> np.ndarray:
+        """
+        Arrange the score inputs of every model into a (models, metrics) array.
+
+        :param latest_metrics: Mapping of model name to its latest metrics
+        :param metrics: Metric names, in column order, with defaults for missing values
+        :return: Metrics matrix in ``self.models`` order
+        """
+        rows = []
+        for model in self.models:
+            model_metrics = latest_metrics.get(model, {})
+            # Stored NULLs (e.g. percentiles of older runs) count as missing
+            rows.append([_default(model_metrics.get(k), v) for k, v in metrics.items()])
+        return np.array(rows, dtype=float)
+
+    def _avoid_throttled(self, scores: np.ndarray) -> np.ndarray:
+        """
+        Rule out models whose provider is backing off after a 429.
+
+        Uses the process-wide limiters from ``ml.ratelimit``, so routing sees
+        the same Retry-After pauses as the benchmark and CLI. If every provider
+        is paused the scores are left alone.
+
+        :param scores: Array of shape (tasks, models), modified in place
+        :return: The same array
+        """
+        throttled = np.fromiter(
+            (
+                provider is not None and get_rate_limiter(provider).throttled
+                for provider in map(self.model_providers.get, self.models)
+            ),
+            dtype=bool,
+            count=len(self.models),
+        )
+        if throttled.any() and not throttled.all():
+            scores[:, throttled] = -np.inf
+        return scores
+
+    def _apply_task_scores(self, scores: np.ndarray, task_descriptions: list[str]):
+        """
+        Replace the scores of tasks that resemble past tasks with their task index scores.
+
+        :param scores: Array of shape (tasks, models), modified in place
+        :param task_descriptions: Description of each task
+        """
+        task_scores, known = self.task_index.scores(task_descriptions)
+        scores[known] = task_scores[known]
+
+    def select_optimal_models(self, tasks: list[dict[str, str]], scorer=None) -> list[str]:
+        """
+        Select the most appropriate model for many tasks in one pass.
+
+        Scores every (task, model) pair as a single matrix operation and logs
+        all decisions with one write.
+
+        :param tasks: Task dicts with a ``description`` and optional ``complexity``
+        :param scorer: Scoring strategy for this call, e.g. a ``LatencySLOScorer``
+            carrying the caller's deadline; defaults to ``self.scorer``
+        :return: Recommended model name for each task, in input order
+        """
+        if not tasks:
+            return []
+
+        # map() keeps the per-task loops in C, which dominates at batch sizes
+        complexities = list(map(dict.get, tasks, repeat("complexity"), repeat("medium")))
+        # Copied now, so a task missing its description fails here rather than on the
+        # log's flush thread, and later changes to the task dicts are not logged
+        task_descriptions = [task["description"] for task in tasks]
+
+        if self.policy == "bandit":
+            # One independent posterior sample per task spreads the batch like live traffic
+            scores = self._avoid_throttled(self.bandit.sample_scores(len(tasks)))
+        else:
+            latest_metrics = self._latest_performance_snapshot()
+
+            if not latest_metrics and self.policy == "score":
+                # Fallback to random selection if no historical data
+                self._last_selection.ids = (None, 0)
+                return np.random.choice(self.models, size=len(tasks)).tolist()
+
+            if latest_metrics:
+                weight_of = {c: self.task_complexity_weights.get(c, 0.5) for c in set(complexities)}
+                complexity_weights = np.fromiter(
+                    map(weight_of.__getitem__, complexities), dtype=float, count=len(complexities)
+                )
+
+                scorer = scorer or self.scorer
+                scores = scorer.scores(
+                    self._metrics_matrix(latest_metrics, scorer.metrics), complexity_weights
+                )
+            else:
+                # Without benchmark history, tasks unlike any past task are routed at random
+                scores = np.random.random((len(tasks), len(self.models)))
+            if self.policy == "task":
+                self._apply_task_scores(scores, task_descriptions)
+            scores = self._avoid_throttled(scores)
+        recommended_models = np.array(self.models, dtype=object)[scores.argmax(axis=1)].tolist()
+
+        self._log_model_selections(recommended_models, task_descriptions, complexities)
+
+        return recommended_models
+
+    def select_optimal_model(
+        self, task_description: str, task_complexity: str = "medium", scorer=None
+    ) -> str:
         """
         Select the most appropriate model for a given task.
 
         :param task_description: Natural language description of the task
         :param task_complexity: Complexity level of the task
+        :param scorer: Scoring strategy for this call, e.g. a ``LatencySLOScorer``
+            carrying the caller's deadline; defaults to ``self.scorer``
         :return: Recommended model name
         """
-        historical_data = self._load_historical_performance()
-
-        if historical_data.empty:
-            # Fallback to random selection if no historical data
-            return np.random.choice(self.models)
-
-        # Calculate scores for each model
-        model_scores = {}
-        for model in self.models:
-            model_metrics = (
-                historical_data[historical_data["model_name"] == model].iloc[-1].to_dict()
-            )
-            model_scores[model] = self._calculate_model_score(model_metrics, task_complexity)
-
-        # Select model with highest score
-        recommended_model = max(model_scores, key=model_scores.get)
+        if self.policy == "bandit":
+            scores = self._avoid_throttled(self.bandit.sample_scores(1))
+        else:
+            latest_metrics = self._latest_performance_snapshot()
+
+            if not latest_metrics and self.policy == "score":
+                # Fallback to random selection if no historical data
+                self._last_selection.ids = (None, 0)
+                return np.random.choice(self.models)
+
+            if latest_metrics:
+                # Score every model for this one task and pick the highest
+                scorer = scorer or self.scorer
+                complexity_weight = self.task_complexity_weights.get(task_complexity, 0.5)
+                scores = scorer.scores(
+                    self._metrics_matrix(latest_metrics, scorer.metrics),
+                    np.array([complexity_weight]),
+                )
+            else:
+                scores = np.random.random((1, len(self.models)))
+            if self.policy == "task":
+                self._apply_task_scores(scores, [task_description])
+            scores = self._avoid_throttled(scores)
+        recommended_model = self.models[int(scores[0].argmax())]
 
         # Log model selection
         self._log_model_selection(recommended_model, task_description, task_complexity)
 
         return recommended_model
 
+    @property
+    def selection_log(self) -> BufferedLogSink:
+        """Buffered sink for the model selection log, shared per file."""
+        if self._selection_log is None or self._selection_log.closed:
+            self._selection_log = get_log_sink(self.selection_log_path)
+        return self._selection_log
+
     def _log_model_selection(
         self, selected_model: str, task_description: str, task_complexity: str
     ):
         """
         Log model selection details for future analysis.
 
+        The entry is buffered and written by the sink's background thread.
+
         :param selected_model: Name of the selected model
         :param task_description: Task description
         :param task_complexity: Task complexity level
         """
+        selection_id = uuid.uuid4().hex
+        self._last_selection.ids = (selection_id, None)
         log_entry = {
             "timestamp": datetime.now().isoformat(),
             "selected_model": selected_model,
             "task_description": task_description,
             "task_complexity": task_complexity,
+            "selection_id": selection_id,
         }
 
-        # Ensure logs directory exists
-        os.makedirs("logs", exist_ok=True)
+        self.selection_log.write(log_entry)
 
-        # Append to model selection log
-        log_file = "logs/model_selection.jsonl"
-        with open(log_file, "a") as f:
-            f.write(json.dumps(log_entry) + "\n")
+    def _log_model_selections(
+        self,
+        selected_models: list[str],
+        task_descriptions: list[str],
+        task_complexities: list[str],
+    ):
+        """
+        Log a batch of model selections with a single write.
+
+        The batch is one buffer entry; it is serialized to JSON lines on the
+        sink's background thread.
+
+        :param selected_models: Selected model for each task
+        :param task_descriptions: Description of each task
+        :param task_complexities: Complexity level of each task
+        """
+        # Entries of a batch share one random prefix and are told apart by index
+        selection_prefix = uuid.uuid4().hex
+        self._last_selection.ids = (selection_prefix, len(selected_models))
+        render = partial(
+            _render_selection_batch,
+            datetime.now().isoformat(),
+            selected_models,
+            task_descriptions,
+            task_complexities,
+            selection_prefix,
+        )
+        self.selection_log.write_batch(render, len(selected_models))
+
+    def flush_selection_log(self):
+        """Write any buffered model selections now."""
+        self.selection_log.flush()
 
     def visualize_model_performance(self):
         """
         Create interactive visualizations of model performance.
         Generates HTML reports in the reports directory.
         """
-        historical_data = self._load_historical_performance()
+        import plotly.graph_objects as go
+        import plotly.io as pio
+
+        aggregates = self._load_model_aggregates()
 
-        if historical_data.empty:
+        if not aggregates:
             print("No performance data available for visualization.")
             return
 
         # Response Time Comparison
         fig_response_time = go.Figure()
         for model in self.models:
-            model_data = historical_data[historical_data["model_name"] == model]
             fig_response_time.add_trace(
                 go.Bar(
-                    x=[model], y=[model_data["avg_response_time"].mean()], name="Avg Response Time"
+                    x=[model],
+                    y=[aggregates.get(model, {}).get("avg_response_time")],
+                    name="Avg Response Time",
                 )
             )
         fig_response_time.update_layout(
@@ -159,11 +649,10 @@ class AdaptiveModelSelector:
         # Token Generation Rate
         fig_token_rate = go.Figure()
         for model in self.models:
-            model_data = historical_data[historical_data["model_name"] == model]
             fig_token_rate.add_trace(
                 go.Bar(
                     x=[model],
-                    y=[model_data["avg_token_generation_rate"].mean()],
+                    y=[aggregates.get(model, {}).get("avg_token_generation_rate")],
                     name="Avg Token Generation Rate",
                 )
             )
@@ -172,6 +661,23 @@ class AdaptiveModelSelector:
         )
         pio.write_html(fig_token_rate, file="reports/token_generation_rate.html")
 
+        # Response time percentiles over every recorded request
+        histograms = self._load_latency_histograms()
+        if histograms:
+            fig_tail = go.Figure()
+            for label, percentile in (("p50", 50), ("p90", 90), ("p99", 99), ("p99.9", 99.9)):
+                fig_tail.add_trace(
+                    go.Bar(
+                        x=list(histograms),
+                        y=[histogram.percentile(percentile) for histogram in histograms.values()],
+                        name=label,
+                    )
+                )
+            fig_tail.update_layout(
+                title="Response Time Percentiles", yaxis_title="Response Time (ms)"
+            )
+            pio.write_html(fig_tail, file="reports/model_tail_latency.html")
+
 
 def main():
     """
@@ -0,0 +1,140 @@
+import numpy as np
+
+# Score inputs, in matrix column order, with the defaults _calculate_model_score
+# assumes when a model has no recorded value
+SCORE_METRIC_DEFAULTS = {
+    "avg_response_time": 1000,
+    "avg_token_generation_rate": 50,
+    "task_success_rate": 50,
+    "error_rate": 10,
+}
+
+# model_histograms column for each supported latency percentile, computed over every
+# recorded request of the model rather than the few requests of its latest run
+LATENCY_PERCENTILE_COLUMNS = {
+    50: "p50",
+    90: "p90",
+    99: "p99",
+    99.9: "p999",
+    100: "max",
+}
+
+SLO_MODES = ("penalize", "exclude")
+
+
+class CompositeScorer:
+    """
+    Weighted blend of latency, throughput, success rate and error rate.
+
+    Scorers turn a (models, metrics) matrix, built from the columns named in
+    ``metrics``, into a (tasks, models) array of scores; the selector picks
+    the highest score for each task.
+    """
+
+    #: Metric columns the scorer reads, in matrix order, with their defaults
+    metrics = SCORE_METRIC_DEFAULTS
+
+    def latency_scores(self, metrics_matrix: np.ndarray) -> np.ndarray:
+        """
+        Latency component of the score for each model.
+
+        :param metrics_matrix: Array of shape (models, len(metrics))
+        :return: Array of shape (models,)
+        """
+        return 1 / metrics_matrix[:, 0]
+
+    def base_scores(self, metrics_matrix: np.ndarray) -> np.ndarray:
+        """
+        Task-independent score of each model.
+
+        :param metrics_matrix: Array of shape (models, len(metrics))
+        :return: Array of shape (models,)
+        """
+        token_rate, success_rate, error_rate = metrics_matrix[:, 1:4].T
+        return (
+            (0.3 * self.latency_scores(metrics_matrix))
+            + (0.3 * (token_rate / 100))
+            + (0.2 * (success_rate / 100))
+            + (0.2 * (1 - error_rate / 100))
+        )
+
+    def scores(self, metrics_matrix: np.ndarray, complexity_weights: np.ndarray) -> np.ndarray:
+        """
+        Score every model for every task.
+
+        :param metrics_matrix: Array of shape (models, len(metrics))
+        :param complexity_weights: Array of shape (tasks,) of complexity weights
+        :return: Array of shape (tasks, models); ``-inf`` marks excluded models
+        """
+        return np.outer(complexity_weights, self.base_scores(metrics_matrix))
+
+
+class LatencySLOScorer(CompositeScorer):
+    """
+    Composite scoring against a tail latency objective, e.g. p99 < 2000ms.
+
+    The observed percentile comes from each model's response time histogram
+    merged over every run (``model_histograms``). Within the deadline, the
+    latency component is the fraction of the deadline left as headroom, so
+    latency carries real weight instead of the near-zero
+    ``1 / avg_response_time``. Models over the deadline are either scaled
+    down by ``(deadline / observed) ** sharpness`` or excluded.
+    If every model misses the deadline, the one with the lowest observed tail
+    wins. Models with no recorded percentile are treated as meeting the
+    objective with no headroom.
+    """
+
+    def __init__(
+        self,
+        deadline_ms: float,
+        percentile: float = 99,
+        mode: str = "penalize",
+        sharpness: float = 2.0,
+    ):
+        """
+        :param deadline_ms: Latency objective in milliseconds
+        :param percentile: Percentile the objective applies to, one of
+            ``LATENCY_PERCENTILE_COLUMNS``
+        :param mode: ``penalize`` scales down models over the deadline,
+            ``exclude`` never selects them while any model meets it
+        :param sharpness: Exponent of the penalty in ``penalize`` mode
+        """
+        if percentile not in LATENCY_PERCENTILE_COLUMNS:
+            raise ValueError(
+                f"percentile must be one of {list(LATENCY_PERCENTILE_COLUMNS)}, got {percentile}"
+            )
+        if mode not in SLO_MODES:
+            raise ValueError(f"mode must be one of {SLO_MODES}, got {mode!r}")
+        if deadline_ms <= 0:
+            raise ValueError(f"deadline_ms must be positive, got {deadline_ms}")
+
+        self.deadline_ms = deadline_ms
+        self.percentile = percentile
+        self.mode = mode
+        self.sharpness = sharpness
+        self.metrics = {**SCORE_METRIC_DEFAULTS, LATENCY_PERCENTILE_COLUMNS[percentile]: np.nan}
+
+    def _observed(self, metrics_matrix: np.ndarray) -> np.ndarray:
+        return metrics_matrix[:, len(SCORE_METRIC_DEFAULTS)]
+
+    def latency_scores(self, metrics_matrix: np.ndarray) -> np.ndarray:
+        observed = self._observed(metrics_matrix)
+        headroom = 1 - observed / self.deadline_ms
+        return np.clip(np.nan_to_num(headroom, nan=0.0), 0, 1)
+
+    def scores(self, metrics_matrix: np.ndarray, complexity_weights: np.ndarray) -> np.ndarray:
+        observed = self._observed(metrics_matrix)
+        violating = observed > self.deadline_ms
+
+        if violating.all():
+            # Nobody meets the objective: least bad tail first
+            return np.outer(complexity_weights, -observed)
+
+        base = self.base_scores(metrics_matrix)
+        if self.mode == "exclude":
+            base = np.where(violating, -np.inf, base)
+        else:
+            factor = np.ones_like(base)
+            factor[violating] = (self.deadline_ms / observed[violating]) ** self.sharpness
+            base = base * factor
+        return np.outer(complexity_weights, base)
@@ -0,0 +1,312 @@
+import asyncio
+import json
+import threading
+import time
+from collections import Counter
+from http import HTTPStatus
+
+from ml.histogram import SUMMARY_PERCENTILES, LatencyHistogram
+from ml.scoring import LatencySLOScorer
+
+# Largest request body accepted, and most tasks routed by one batch request
+MAX_BODY_BYTES = 16 * 2**20
+MAX_BATCH_TASKS = 100_000
+
+
+class RequestError(Exception):
+    """A malformed request, answered with a 4xx status."""
+
+    def __init__(self, message: str, status: HTTPStatus = HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+
+class RouterService:
+    """
+    Persistent HTTP/JSON front end for an ``AdaptiveModelSelector``.
+
+    A single asyncio event loop serves HTTP/1.1 with keep-alive, so a client
+    pays for connection setup and for loading the selector's metrics snapshot,
+    bandit state and task index once, not per decision. Routing itself is
+    synchronous NumPy work on warm in-memory state and runs on the loop.
+
+    Endpoints:
+
+    * ``POST /route``: ``{"task", "complexity"?, "max_latency_ms"?, "percentile"?}``
+      returns ``{"model", "selection_id"}``
+    * ``POST /route/batch``: ``{"tasks": [{"description", "complexity"?}], ...}``
+      returns ``{"models", "selection_ids"}``
+    * ``POST /outcome``: ``{"model", "success", "latency_ms"?, "task_description"?,
+      "selection_id"?}`` feeds ``record_outcome``
+    * ``GET /metrics``: Prometheus text format counters and decision latency
+    * ``GET /health``
+    """
+
+    def __init__(self, selector, host: str = "127.0.0.1", port: int = 8000):
+        """
+        :param selector: ``AdaptiveModelSelector`` making the decisions
+        :param host: Interface to listen on
+        :param port: TCP port; 0 picks a free one
+        """
+        self.selector = selector
+        self.host = host
+        self.port = port
+        self.started_at = time.time()
+        self.request_counts = Counter()
+        self.selection_counts = Counter()
+        self.decision_latency = LatencyHistogram()
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._stopped = None
+        self._routes = {
+            ("POST", "/route"): self._route,
+            ("POST", "/route/batch"): self._route_batch,
+            ("POST", "/outcome"): self._outcome,
+            ("GET", "/metrics"): self._metrics,
+            ("GET", "/health"): self._health,
+        }
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def warm_up(self):
+        """Load the state routing decisions read, before the first request needs it."""
+        self.selector._latest_performance_snapshot()
+        if self.selector.policy == "bandit":
+            self.selector.bandit.stats()
+        elif self.selector.policy == "task":
+            self.selector.task_index.scores([])
+
+    async def _serve(self, started: threading.Event | None = None):
+        self.warm_up()
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        if started is not None:
+            started.set()
+        async with self._server:
+            await self._stopped.wait()
+
+    def run(self):
+        """Serve in the foreground until interrupted."""
+        try:
+            asyncio.run(self._serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.selector.close()
+
+    def start(self) -> "RouterService":
+        """Serve from a background thread; returns once the port is bound."""
+        started = threading.Event()
+        self._thread = threading.Thread(
+            target=asyncio.run, args=(self._serve(started),), daemon=True
+        )
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        """Stop a service started with ``start`` and wait for its thread."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, HTTPStatus.BAD_REQUEST, {"error": "bad request"})
+                    break
+
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(
+                        writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "body too large"}
+                    )
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" and (
+                    version != "HTTP/1.0" or connection == "keep-alive"
+                )
+                status, payload = self._dispatch(method, target.split("?", 1)[0], body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # Idle keep-alive connections are cancelled when the service stops
+            pass
+        finally:
+            writer.close()
+
+    def _dispatch(self, method: str, path: str, body: bytes) -> tuple[HTTPStatus, dict | str]:
+        handler = self._routes.get((method, path))
+        try:
+            if handler is None:
+                if any(route_path == path for _, route_path in self._routes):
+                    raise RequestError("method not allowed", HTTPStatus.METHOD_NOT_ALLOWED)
+                raise RequestError("not found", HTTPStatus.NOT_FOUND)
+            status, payload = HTTPStatus.OK, handler(body)
+        except RequestError as e:
+            status, payload = e.status, {"error": str(e)}
+        except Exception as e:
+            print(f"Error handling {method} {path}: {e}")
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}
+        self.request_counts[path if handler else "other", status.value] += 1
+        return status, payload
+
+    async def _respond(
+        self,
+        writer: asyncio.StreamWriter,
+        status: HTTPStatus,
+        payload: dict | str,
+        keep_alive: bool = False,
+    ):
+        if isinstance(payload, str):
+            content_type, data = "text/plain; version=0.0.4", payload.encode()
+        else:
+            content_type, data = "application/json", json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+            + data
+        )
+        await writer.drain()
+
+    @staticmethod
+    def _json(body: bytes) -> dict:
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError as e:
+            raise RequestError(f"invalid json: {e}") from e
+        if not isinstance(payload, dict):
+            raise RequestError("expected a json object")
+        return payload
+
+    @staticmethod
+    def _scorer(payload: dict) -> LatencySLOScorer | None:
+        """Per-request latency SLO, as ``cli.py compare --max-latency-ms`` takes."""
+        max_latency_ms = payload.get("max_latency_ms")
+        if max_latency_ms is None:
+            return None
+        try:
+            return LatencySLOScorer(
+                float(max_latency_ms),
+                percentile=float(payload.get("percentile", 99)),
+                mode="exclude" if payload.get("exclude_slow") else "penalize",
+            )
+        except (TypeError, ValueError) as e:
+            raise RequestError(str(e)) from e
+
+    def _route(self, body: bytes) -> dict:
+        payload = self._json(body)
+        task = payload.get("task")
+        if not isinstance(task, str):
+            raise RequestError("'task' must be a string")
+        scorer = self._scorer(payload)
+
+        start = time.perf_counter()
+        model = self.selector.select_optimal_model(
+            task, payload.get("complexity", "medium"), scorer=scorer
+        )
+        self.decision_latency.record((time.perf_counter() - start) * 1000)
+        self.selection_counts[model] += 1
+        selection_ids = self.selector.last_selection_ids
+        return {"model": model, "selection_id": selection_ids[0] if selection_ids else None}
+
+    def _route_batch(self, body: bytes) -> dict:
+        payload = self._json(body)
+        tasks = payload.get("tasks")
+        if not isinstance(tasks, list) or len(tasks) > MAX_BATCH_TASKS:
+            raise RequestError(f"'tasks' must be a list of at most {MAX_BATCH_TASKS} tasks")
+        if not all(isinstance(t, dict) and isinstance(t.get("description"), str) for t in tasks):
+            raise RequestError("every task needs a string 'description'")
+        scorer = self._scorer(payload)
+
+        start = time.perf_counter()
+        models = self.selector.select_optimal_models(tasks, scorer=scorer)
+        self.decision_latency.record((time.perf_counter() - start) * 1000)
+        self.selection_counts.update(models)
+        return {"models": models, "selection_ids": self.selector.last_selection_ids or None}
+
+    def _outcome(self, body: bytes) -> dict:
+        payload = self._json(body)
+        if not isinstance(payload.get("model"), str) or not isinstance(
+            payload.get("success"), bool
+        ):
+            raise RequestError("'model' (string) and 'success' (boolean) are required")
+        try:
+            self.selector.record_outcome(
+                payload["model"],
+                payload["success"],
+                payload.get("latency_ms"),
+                task_description=payload.get("task_description"),
+                selection_id=payload.get("selection_id"),
+            )
+        except ValueError as e:
+            raise RequestError(str(e)) from e
+        return {"recorded": True}
+
+    def _health(self, body: bytes) -> dict:
+        return {"status": "ok", "policy": self.selector.policy}
+
+    def _metrics(self, body: bytes) -> str:
+        lines = [
+            "# HELP router_requests_total HTTP requests by path and status.",
+            "# TYPE router_requests_total counter",
+        ]
+        for (path, status), count in sorted(self.request_counts.items()):
+            lines.append(f'router_requests_total{{path="{path}",status="{status}"}} {count}')
+
+        lines += [
+            "# HELP router_selections_total Routing decisions by selected model.",
+            "# TYPE router_selections_total counter",
+        ]
+        for model, count in sorted(self.selection_counts.items()):
+            lines.append(f'router_selections_total{{model="{model}"}} {count}')
+
+        lines += [
+            "# HELP router_decision_latency_ms Time to route one request, in milliseconds.",
+            "# TYPE router_decision_latency_ms summary",
+        ]
+        histogram = self.decision_latency
+        percentiles = histogram.percentiles(SUMMARY_PERCENTILES.values())
+        for percentile, value in zip(SUMMARY_PERCENTILES.values(), percentiles, strict=True):
+            if value is not None:
+                lines.append(
+                    f'router_decision_latency_ms{{quantile="{percentile / 100:g}"}} {value:.6g}'
+                )
+        lines += [
+            f"router_decision_latency_ms_sum {histogram.sum:.6g}",
+            f"router_decision_latency_ms_count {histogram.count}",
+            "# HELP router_uptime_seconds Seconds since the service started.",
+            "# TYPE router_uptime_seconds gauge",
+            f"router_uptime_seconds {time.time() - self.started_at:.3f}",
+        ]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,85 @@
+from collections.abc import Callable, Iterable
+from itertools import pairwise
+
+import numpy as np
+
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_RESAMPLES = 2000
+
+# Resampled values held in memory at once; larger sample sets are bootstrapped in blocks
+_BLOCK_SIZE = 2**20
+
+
+def bootstrap_ci(
+    samples: Iterable[float],
+    statistic: Callable[..., np.ndarray] = np.mean,
+    confidence: float = DEFAULT_CONFIDENCE,
+    resamples: int = DEFAULT_RESAMPLES,
+    seed: int | None = None,
+) -> tuple[float, float] | None:
+    """
+    Percentile bootstrap confidence interval of a statistic.
+
+    All resamples are drawn as one index matrix and reduced along its rows,
+    so the cost is a few vectorized NumPy calls rather than a Python loop.
+
+    :param samples: Observed values, e.g. response times or 0/1 success flags
+    :param statistic: Reduction taking an ``axis`` argument, e.g. ``np.mean`` or ``np.median``
+    :param confidence: Coverage of the interval, between 0 and 1
+    :param resamples: Number of bootstrap resamples
+    :param seed: Random seed for reproducible intervals
+    :return: ``(low, high)``, or ``None`` without samples
+    """
+    if not 0 < confidence < 1:
+        raise ValueError(f"confidence must be in (0, 1), got {confidence}")
+    values = np.asarray(list(samples), dtype=float)
+    if values.size == 0:
+        return None
+
+    rng = np.random.default_rng(seed)
+    block = max(1, _BLOCK_SIZE // values.size)
+    estimates = []
+    for remaining in range(resamples, 0, -block):
+        indices = rng.integers(0, values.size, size=(min(block, remaining), values.size))
+        estimates.append(statistic(values[indices], axis=1))
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(np.concatenate(estimates), [alpha, 1 - alpha])
+    return float(low), float(high)
+
+
+def proportion_ci(
+    successes: int,
+    trials: int,
+    confidence: float = DEFAULT_CONFIDENCE,
+    resamples: int = DEFAULT_RESAMPLES,
+    seed: int | None = None,
+) -> tuple[float, float] | None:
+    """
+    Bootstrap confidence interval of a success rate.
+
+    Resampling 0/1 outcomes is a binomial draw, so this samples the
+    binomial directly instead of materializing every outcome.
+
+    :return: ``(low, high)`` as fractions, or ``None`` without trials
+    """
+    if not 0 < confidence < 1:
+        raise ValueError(f"confidence must be in (0, 1), got {confidence}")
+    if trials <= 0:
+        return None
+    rng = np.random.default_rng(seed)
+    estimates = rng.binomial(trials, successes / trials, size=resamples) / trials
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(estimates, [alpha, 1 - alpha])
+    return float(low), float(high)
+
+
+def intervals_separated(intervals: Iterable[tuple[float, float] | None]) -> bool:
+    """
+    Whether no two confidence intervals overlap, i.e. the ranking is settled.
+
+    Missing intervals (no samples yet) never count as separated.
+    """
+    intervals = list(intervals)
+    if any(interval is None for interval in intervals):
+        return False
+    return all(high < next_low for (_, high), (next_low, _) in pairwise(sorted(intervals)))
@@ -0,0 +1,403 @@
+import sqlite3
+import threading
+from collections.abc import Callable, Iterable
+
+DEFAULT_DB_PATH = "reports/model_performance.db"
+# Parquet archive written by ml.archive
+DEFAULT_ARCHIVE_DIR = "reports/archive"
+
+# Seconds a connection waits for another writer's lock before raising "database is locked"
+BUSY_TIMEOUT = 5.0
+
+# Columns added to performance_metrics and model_latest after their first release:
+# streaming metrics, response time percentiles and confidence interval bounds
+_ADDED_METRIC_COLUMNS = [
+    "avg_time_to_first_token",
+    "p50_inter_token_latency",
+    "p90_inter_token_latency",
+    "p99_inter_token_latency",
+    "output_tokens_per_second",
+    "p90_response_time",
+    "p99_response_time",
+    "p999_response_time",
+    "max_response_time",
+    "response_time_ci_low",
+    "response_time_ci_high",
+    "success_rate_ci_low",
+    "success_rate_ci_high",
+]
+
+
+def open_database(
+    path: str = DEFAULT_DB_PATH, check_same_thread: bool = True
+) -> sqlite3.Connection:
+    """
+    Open the performance database in write-ahead-log mode.
+
+    With WAL, readers see the last committed state without taking locks the
+    writer waits on, so the dashboard and router never stall a benchmark, and
+    a commit appends to the log instead of rewriting pages. ``synchronous =
+    NORMAL`` syncs at checkpoints rather than on every commit; a power loss can
+    drop the latest commits but never corrupts the database.
+
+    :param path: SQLite database file
+    :param check_same_thread: Whether only the creating thread may use the connection
+    :return: Open connection
+    """
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=check_same_thread)
+    # The journal mode is stored in the file, so this is a no-op once any connection set it
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+# request_samples columns, in the order SampleWriter rows carry them
+REQUEST_SAMPLE_COLUMNS = [
+    "run_id",
+    "model_name",
+    "scenario",
+    "started_at",
+    "latency_ms",
+    "success",
+    "output_tokens",
+    "time_to_first_token",
+    "error_type",
+]
+
+
+def _add_missing_columns(
+    conn: sqlite3.Connection, table: str, columns: list[str], column_type: str = "REAL"
+):
+    """Add any missing columns to a table created by an older schema."""
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for column in columns:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+
+def _create_performance_tables(conn: sqlite3.Connection):
+    """Benchmark history and its per-model summaries, as of schema versioning."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS performance_metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT,
+        model_name TEXT,
+        total_queries INTEGER,
+        avg_response_time REAL,
+        median_response_time REAL,
+        avg_token_generation_rate REAL,
+        task_success_rate REAL,
+        error_rate REAL,
+        total_execution_time REAL,
+        avg_time_to_first_token REAL,
+        p50_inter_token_latency REAL,
+        p90_inter_token_latency REAL,
+        p99_inter_token_latency REAL,
+        output_tokens_per_second REAL,
+        p90_response_time REAL,
+        p99_response_time REAL,
+        p999_response_time REAL,
+        max_response_time REAL,
+        response_time_ci_low REAL,
+        response_time_ci_high REAL,
+        success_rate_ci_low REAL,
+        success_rate_ci_high REAL
+    )
+    """)
+
+    # Materialized per-model summaries, kept current on every insert so
+    # readers never have to scan the full history
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS model_latest (
+        model_name TEXT PRIMARY KEY,
+        metrics_id INTEGER,
+        timestamp TEXT,
+        total_queries INTEGER,
+        avg_response_time REAL,
+        median_response_time REAL,
+        avg_token_generation_rate REAL,
+        task_success_rate REAL,
+        error_rate REAL,
+        total_execution_time REAL,
+        avg_time_to_first_token REAL,
+        p50_inter_token_latency REAL,
+        p90_inter_token_latency REAL,
+        p99_inter_token_latency REAL,
+        output_tokens_per_second REAL,
+        p90_response_time REAL,
+        p99_response_time REAL,
+        p999_response_time REAL,
+        max_response_time REAL,
+        response_time_ci_low REAL,
+        response_time_ci_high REAL,
+        success_rate_ci_low REAL,
+        success_rate_ci_high REAL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS model_aggregates (
+        model_name TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        sum REAL NOT NULL,
+        sum_sq REAL NOT NULL,
+        min REAL,
+        max REAL,
+        last REAL,
+        PRIMARY KEY (model_name, metric)
+    )
+    """)
+    # Mergeable response time histograms, per run and merged over all runs
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS latency_histograms (
+        metrics_id INTEGER PRIMARY KEY,
+        model_name TEXT NOT NULL,
+        histogram BLOB NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS model_histograms (
+        model_name TEXT PRIMARY KEY,
+        histogram BLOB NOT NULL,
+        count INTEGER,
+        p50 REAL,
+        p90 REAL,
+        p99 REAL,
+        p999 REAL,
+        max REAL
+    )
+    """)
+    # Databases written before versioning may predate some columns
+    for table in ("performance_metrics", "model_latest"):
+        _add_missing_columns(conn, table, _ADDED_METRIC_COLUMNS)
+
+
+def _create_history_indexes(conn: sqlite3.Connection):
+    """Indexes for per-model history and time range queries."""
+    # Entries carry the rowid, so "latest id per model" and "models in a time range"
+    # are answered from the index alone
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_performance_metrics_model_time
+    ON performance_metrics (model_name, timestamp)
+    """)
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_performance_metrics_time
+    ON performance_metrics (timestamp)
+    """)
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_latency_histograms_model
+    ON latency_histograms (model_name, metrics_id)
+    """)
+
+
+def _create_request_samples(conn: sqlite3.Connection):
+    """Raw per-request telemetry, linked to its run's performance_metrics rows by run_id."""
+    _add_missing_columns(conn, "performance_metrics", ["run_id"], "TEXT")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS request_samples (
+        id INTEGER PRIMARY KEY,
+        run_id TEXT NOT NULL,
+        model_name TEXT NOT NULL,
+        scenario TEXT,
+        started_at REAL,
+        latency_ms REAL,
+        success INTEGER NOT NULL,
+        output_tokens INTEGER,
+        time_to_first_token REAL,
+        error_type TEXT
+    )
+    """)
+    # One index keeps bulk inserts cheap while still serving "slowest requests of
+    # a model in a run" as a range scan
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_request_samples_run
+    ON request_samples (run_id, model_name, latency_ms)
+    """)
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_performance_metrics_run
+    ON performance_metrics (run_id)
+    """)
+
+
+def _create_rollup_tables(conn: sqlite3.Connection):
+    """Minute, hour and day summaries of performance_metrics, written by compaction."""
+    # Keyed by time first, so a time range at one resolution is one index range
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS metric_rollups (
+        resolution TEXT NOT NULL,
+        bucket_start TEXT NOT NULL,
+        model_name TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        sum REAL NOT NULL,
+        sum_sq REAL NOT NULL,
+        min REAL,
+        max REAL,
+        PRIMARY KEY (resolution, bucket_start, model_name, metric)
+    ) WITHOUT ROWID
+    """)
+    # Merged response time histograms per bucket, with their percentiles
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS latency_rollups (
+        resolution TEXT NOT NULL,
+        bucket_start TEXT NOT NULL,
+        model_name TEXT NOT NULL,
+        histogram BLOB NOT NULL,
+        count INTEGER,
+        p50 REAL,
+        p90 REAL,
+        p99 REAL,
+        max REAL,
+        PRIMARY KEY (resolution, bucket_start, model_name)
+    ) WITHOUT ROWID
+    """)
+    # Compaction progress: the last rolled-up performance_metrics id and, per
+    # resolution, the time before which rows have been deleted
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_state (
+        name TEXT PRIMARY KEY,
+        value
+    )
+    """)
+
+
+# Schema changes in order; PRAGMA user_version counts how many a database has applied.
+# Append new migrations, never edit or reorder released ones.
+MIGRATIONS: list[Callable[[sqlite3.Connection], None]] = [
+    _create_performance_tables,
+    _create_history_indexes,
+    _create_request_samples,
+    _create_rollup_tables,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Apply the migrations a database has not seen yet.
+
+    Each migration runs in its own immediate transaction together with the
+    version bump, so a failed migration leaves the previous version intact and
+    concurrent processes apply every migration exactly once.
+
+    :param conn: Connection from ``open_database``
+    :return: The database's schema version afterwards
+    """
+    (version,) = conn.execute("PRAGMA user_version").fetchone()
+    while version < SCHEMA_VERSION:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we waited for the lock
+            (version,) = conn.execute("PRAGMA user_version").fetchone()
+            if version < SCHEMA_VERSION:
+                MIGRATIONS[version](conn)
+                version += 1
+                conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return version
+
+
+class SampleWriter:
+    """
+    Buffered bulk writer for ``request_samples``.
+
+    Recording a request appends a tuple to an in-memory buffer; a background
+    thread inserts pending rows with one ``executemany`` per transaction once
+    ``batch_size`` rows are waiting or ``flush_interval`` seconds have passed,
+    so millions of samples cost a few hundred commits rather than one each.
+    """
+
+    def __init__(
+        self, path: str = DEFAULT_DB_PATH, batch_size: int = 10_000, flush_interval: float = 1.0
+    ):
+        """
+        :param path: SQLite database file
+        :param batch_size: Pending rows that trigger an early flush, and rows per transaction
+        :param flush_interval: Maximum seconds a row waits before being written
+        """
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be at least 1, got {batch_size}")
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+
+        # The flush thread and callers of flush() share the connection under _io_lock
+        self._conn = open_database(path, check_same_thread=False)
+        migrate(self._conn)
+        self._insert = (
+            f"INSERT INTO request_samples ({', '.join(REQUEST_SAMPLE_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(REQUEST_SAMPLE_COLUMNS))})"
+        )
+        self._buffer: list[tuple] = []
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="sample-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, rows: Iterable[tuple]):
+        """Queue rows whose values follow ``REQUEST_SAMPLE_COLUMNS``."""
+        with self._lock:
+            if self._closed:
+                raise ValueError(f"sample writer for {self.path} is closed")
+            self._buffer.extend(rows)
+            pending = len(self._buffer)
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Insert every pending row now, from the calling thread."""
+        with self._io_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start : start + self.batch_size]
+                try:
+                    with self._conn:
+                        self._conn.executemany(self._insert, batch)
+                except sqlite3.Error as e:
+                    print(f"Error writing request samples to {self.path}: {e}")
+                    self.dropped += len(batch)
+                    continue
+                self.written += len(batch)
+                self.flushes += 1
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """Write pending rows, stop the background thread and close the connection."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
+        self._conn.close()
+
+    def stats(self) -> dict[str, int]:
+        """Counters for monitoring the writer."""
+        return {
+            "pending": len(self._buffer),
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
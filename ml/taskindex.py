@@ -0,0 +1,417 @@
+import math
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from ml.bandit import PRIOR_LATENCY_MS
+from ml.storage import open_database
+
+# Hashed word unigrams and bigrams; stateless, so nothing needs fitting
+DEFAULT_FEATURES = 2**16
+
+# Newest outcomes kept row by row before they are merged into the postings
+TAIL_ROWS = 1024
+
+# (task, outcome) similarities summed densely per chunk of tasks in a lookup
+CHUNK_CELLS = 2**20
+
+
+class TaskIndex:
+    """
+    Nearest-neighbour index from task descriptions to per-model outcomes.
+
+    Descriptions are hashed into L2-normalized sparse vectors and compared to
+    stored outcomes by cosine similarity. The ``k`` most similar past outcomes
+    vote for their model, weighted by similarity, and each model is scored
+    like the bandit router: the log of its smoothed success rate minus its
+    log latency.
+
+    Stored vectors are kept transposed, as postings from each feature to the
+    outcomes containing it, so a lookup only reads the posting lists of the
+    task's own features. The newest outcomes wait in a tail of up to
+    ``TAIL_ROWS`` rows, compared against a dense copy of the task vector, which
+    is merged into the postings once full; expired outcomes are dropped at the
+    same time.
+
+    Outcomes are stored in the ``task_outcomes`` table, linked by
+    ``selection_id`` to entries of the model selection log, and written in
+    batches of ``flush_interval``.
+    """
+
+    def __init__(
+        self,
+        models: list[str],
+        db_path: str | None = "reports/model_performance.db",
+        k: int = 20,
+        min_similarity: float = 0.2,
+        max_outcomes: int = 100_000,
+        n_features: int = DEFAULT_FEATURES,
+        flush_interval: int = 100,
+    ):
+        """
+        :param models: Model names, in score column order
+        :param db_path: SQLite database holding ``task_outcomes``; ``None`` keeps
+            outcomes in memory
+        :param k: Neighbouring outcomes consulted per task
+        :param min_similarity: Cosine similarity below which past tasks are ignored
+        :param max_outcomes: Most recent outcomes loaded from the database
+        :param n_features: Hash space size of the task vectors
+        :param flush_interval: Outcomes buffered before they are written to the database
+        """
+        self.models = list(models)
+        self.db_path = db_path
+        self.k = k
+        self.min_similarity = min_similarity
+        self.max_outcomes = max_outcomes
+        self.flush_interval = flush_interval
+        # Rows are L2-normalized by _vectorize, much faster than the vectorizer's own norm
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features, ngram_range=(1, 2), alternate_sign=False, norm=None
+        )
+
+        self._model_index = {model: i for i, model in enumerate(self.models)}
+        # Outcomes are numbered in the order they were added. The postings, of shape
+        # (features, outcomes), cover outcomes from number _postings_start on; the
+        # tail holds the vectors of the newest outcomes, from _tail_start on, as the
+        # indptr, indices and data arrays of CSR rows
+        self._postings = sp.csr_matrix((n_features, 0))
+        self._postings_start = 0
+        self._tail_indptr = np.zeros(1, dtype=np.int64)
+        self._tail_indices = np.zeros(0, dtype=np.int32)
+        self._tail_data = np.zeros(0)
+        self._tail_start = 0
+        self._count = 0
+        # Per-outcome columns, indexed by outcome number minus _base and filled
+        # up to _count; grown by copying, so snapshots taken by lookups stay valid
+        self._base = 0
+        self._outcome_models = np.zeros(0, dtype=np.intp)
+        self._successes = np.zeros(0)
+        self._log_latencies = np.zeros(0)
+        # Outcomes added since the structures above were last rebuilt
+        self._new_rows: list[tuple[str, int, float, float]] = []
+        self._unsaved: list[tuple] = []
+        self._loaded = db_path is None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._load()
+            return min(self._count + len(self._new_rows), self.max_outcomes)
+
+    def _ensure_table(self, conn: sqlite3.Connection):
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS task_outcomes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            selection_id TEXT,
+            task_description TEXT NOT NULL,
+            model_name TEXT NOT NULL,
+            success INTEGER NOT NULL,
+            latency_ms REAL
+        )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_task_outcomes_selection ON task_outcomes (selection_id)"
+        )
+
+    def _load(self):
+        """Read the most recent stored outcomes on first use."""
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            conn = open_database(self.db_path)
+            try:
+                rows = conn.execute(
+                    """
+                    SELECT task_description, model_name, success, latency_ms FROM task_outcomes
+                    ORDER BY id DESC LIMIT ?
+                    """,
+                    (self.max_outcomes,),
+                ).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.OperationalError:
+            return
+        for description, model, success, latency_ms in reversed(rows):
+            i = self._model_index.get(model)
+            if i is not None:
+                self._new_rows.append((description, i, float(success), _log(latency_ms)))
+
+    def _rebuild(self, task_descriptions=()) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Vectorize newly added outcomes, merging a full tail into the postings.
+
+        :param task_descriptions: Descriptions to vectorize in the same call, saving
+            the vectorizer's overhead when a lookup follows new outcomes
+        :return: Vectors of ``task_descriptions``, as from ``_vectorize``
+        """
+        descriptions, models, successes, log_latencies = zip(*self._new_rows, strict=True)
+        self._new_rows = []
+        self._append_columns(models, successes, log_latencies)
+
+        indptr, indices, data = self._vectorize([*descriptions, *task_descriptions])
+        added = len(descriptions)
+        split = indptr[added]
+        # Concatenating makes new arrays, so snapshots taken by lookups stay valid
+        self._tail_indptr = np.concatenate(
+            [self._tail_indptr, indptr[1 : added + 1] + self._tail_indptr[-1]]
+        )
+        self._tail_indices = np.concatenate([self._tail_indices, indices[:split]])
+        self._tail_data = np.concatenate([self._tail_data, data[:split]])
+        if self._tail_indptr.size > TAIL_ROWS:
+            self._merge_tail()
+        return indptr[added:] - split, indices[split:], data[split:]
+
+    def _merge_tail(self):
+        """Move the tail into the postings, dropping expired outcomes."""
+        # Copying the postings once per TAIL_ROWS outcomes keeps the cost per outcome low
+        tail = sp.csr_matrix(
+            (self._tail_data, self._tail_indices, self._tail_indptr),
+            shape=(self._tail_indptr.size - 1, self._postings.shape[0]),
+        )
+        postings = sp.hstack([self._postings, tail.T], "csr")
+        expired = self._count - self.max_outcomes - self._postings_start
+        if expired > 0:
+            postings = postings[:, expired:]
+            self._postings_start += expired
+        self._postings = postings
+        self._tail_indptr = np.zeros(1, dtype=np.int64)
+        self._tail_indices = np.zeros(0, dtype=np.int32)
+        self._tail_data = np.zeros(0)
+        self._tail_start = self._count
+
+    def _vectorize(self, descriptions) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Hash descriptions into L2-normalized vectors.
+
+        :return: indptr, indices and data of the vectors, one CSR row each
+        """
+        vectors = self.vectorizer.transform(descriptions)
+        indptr, indices, data = vectors.indptr, vectors.indices, vectors.data
+        row_of = np.repeat(np.arange(indptr.size - 1), np.diff(indptr))
+        norms = np.sqrt(np.bincount(row_of, data**2, minlength=indptr.size - 1))
+        return indptr, indices, data / norms[row_of]
+
+    def _append_columns(self, models, successes, log_latencies):
+        """Append per-outcome columns, dropping those of expired outcomes when reallocating."""
+        size = self._count - self._base
+        added = len(models)
+        if size + added > self._outcome_models.size:
+            keep_from = max(self._count - self.max_outcomes, self._base)
+            kept = self._count - keep_from
+            capacity = max(2 * (kept + added), TAIL_ROWS)
+            columns = []
+            for column in (self._outcome_models, self._successes, self._log_latencies):
+                grown = np.empty(capacity, dtype=column.dtype)
+                grown[:kept] = column[keep_from - self._base : size]
+                columns.append(grown)
+            self._outcome_models, self._successes, self._log_latencies = columns
+            self._base = keep_from
+            size = kept
+        self._outcome_models[size : size + added] = models
+        self._successes[size : size + added] = successes
+        self._log_latencies[size : size + added] = log_latencies
+        self._count += added
+
+    def add(
+        self,
+        task_description: str,
+        model: str,
+        success: bool,
+        latency_ms: float | None = None,
+        selection_id: str | None = None,
+    ):
+        """
+        Record how a model did on a task.
+
+        :param task_description: Description the task was routed with
+        :param model: Model that served it
+        :param success: Whether the request succeeded
+        :param latency_ms: End-to-end response time, if measured
+        :param selection_id: Id of the selection log entry for this routing decision
+        """
+        i = self._model_index.get(model)
+        if i is None:
+            raise ValueError(f"Unknown model: {model}")
+        row = (
+            datetime.now().isoformat(),
+            selection_id,
+            task_description,
+            model,
+            int(bool(success)),
+            latency_ms,
+        )
+        with self._lock:
+            self._load()
+            self._new_rows.append((task_description, i, float(bool(success)), _log(latency_ms)))
+            if self.db_path is not None:
+                self._unsaved.append(row)
+                flush = len(self._unsaved) >= self.flush_interval
+        if self.db_path is not None and flush:
+            self.flush()
+
+    def flush(self):
+        """Write buffered outcomes to ``task_outcomes`` in one transaction."""
+        with self._lock:
+            rows, self._unsaved = self._unsaved, []
+        if not rows:
+            return
+        try:
+            conn = open_database(self.db_path)
+            try:
+                with conn:
+                    self._ensure_table(conn)
+                    conn.executemany(
+                        """
+                        INSERT INTO task_outcomes
+                        (timestamp, selection_id, task_description, model_name, success, latency_ms)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        """,
+                        rows,
+                    )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Error saving task outcomes: {e}")
+
+    def scores(self, task_descriptions: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Score every model for every task from the outcomes of similar past tasks.
+
+        :param task_descriptions: Descriptions to route
+        :return: ``(scores, known)``: an array of shape (tasks, models), and a
+            boolean array of shape (tasks,) marking tasks with similar history
+        """
+        n, m = len(task_descriptions), len(self.models)
+        queries = None
+        with self._lock:
+            self._load()
+            if self._new_rows:
+                queries = self._rebuild(task_descriptions)
+            postings, start = self._postings, self._postings_start
+            tail = (self._tail_indptr, self._tail_indices, self._tail_data)
+            base = self._base
+            cutoff = self._count - self.max_outcomes
+            size = self._count - base
+            outcome_models = self._outcome_models[:size]
+            successes = self._successes[:size]
+            log_latencies = self._log_latencies[:size]
+
+        success_weight = np.zeros((n, m))
+        total_weight = np.zeros((n, m))
+        latency_weight = np.zeros((n, m))
+        latency_sum = np.zeros((n, m))
+
+        if size and n:
+            if queries is None:
+                queries = self._vectorize(task_descriptions)
+            rows, neighbours, weights = self._nearest(queries, postings, tail, start, cutoff)
+            neighbours -= base
+            cells = (rows, outcome_models[neighbours])
+            np.add.at(total_weight, cells, weights)
+            np.add.at(success_weight, cells, weights * successes[neighbours])
+            timed = ~np.isnan(log_latencies[neighbours])
+            timed_cells = (rows[timed], outcome_models[neighbours[timed]])
+            np.add.at(latency_weight, timed_cells, weights[timed])
+            np.add.at(latency_sum, timed_cells, (weights * log_latencies[neighbours])[timed])
+
+        # Beta(1, 1) success prior and one pseudo-observation at the prior latency,
+        # as in ml.bandit, so models without similar outcomes are neither favoured nor ruled out
+        success_rate = (1 + success_weight) / (2 + total_weight)
+        log_latency = (math.log(PRIOR_LATENCY_MS) + latency_sum) / (1 + latency_weight)
+        return np.log(success_rate) - log_latency, total_weight.sum(axis=1) > 0
+
+    def _nearest(
+        self,
+        queries: tuple[np.ndarray, np.ndarray, np.ndarray],
+        postings: sp.csr_matrix,
+        tail: tuple[np.ndarray, np.ndarray, np.ndarray],
+        start: int,
+        cutoff: int,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (task row, outcome number, similarity) of each task's ``k`` most similar outcomes.
+
+        :param queries: indptr, indices and data of the task vectors, one row each
+        :param postings: Postings of the outcomes numbered from ``start`` on
+        :param tail: indptr, indices and data of the tail rows, which follow the postings
+        :param start: Number of the first outcome in the postings
+        :param cutoff: Outcomes numbered below this have expired
+        """
+        query_indptr, query_indices, query_data = queries
+        tail_indptr, tail_indices, tail_data = tail
+        n = query_indptr.size - 1
+        stored = postings.shape[1]
+        span = stored + tail_indptr.size - 1
+        first = max(cutoff - start, 0)
+        chunk = max(CHUNK_CELLS // span, 1)
+        # reduceat needs offsets inside the data; sums of empty rows are zeroed after
+        tail_offsets = np.minimum(tail_indptr[:-1], max(tail_data.size - 1, 0))
+        tail_empty = np.diff(tail_indptr) == 0
+
+        rows, neighbours, weights = [], [], []
+        for lo in range(0, n, chunk):
+            hi = min(lo + chunk, n)
+            tasks = hi - lo
+            entries = slice(query_indptr[lo], query_indptr[hi])
+            features, values = query_indices[entries], query_data[entries]
+            block_rows = np.repeat(np.arange(tasks), np.diff(query_indptr[lo : hi + 1]))
+
+            # Read the posting list of every (task, feature) pair back to back
+            starts = postings.indptr[features]
+            lengths = postings.indptr[features + 1] - starts
+            offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+            positions = offsets + np.arange(lengths.sum())
+            cells = np.repeat(block_rows * span, lengths) + postings.indices[positions]
+            products = postings.data[positions] * np.repeat(values, lengths)
+            # bincount returns integers when there is nothing to count
+            similarities = np.bincount(cells, products, minlength=tasks * span).astype(
+                float, copy=False
+            )
+            grid = similarities.reshape(tasks, span)
+
+            if tail_data.size:
+                dense = np.zeros((tasks, postings.shape[0]))
+                dense[block_rows, features] = values
+                tail_similarities = np.add.reduceat(
+                    dense[:, tail_indices] * tail_data, tail_offsets, axis=1
+                )
+                tail_similarities[:, tail_empty] = 0
+                grid[:, stored:] = tail_similarities
+            grid[:, :first] = 0
+
+            # Only outcomes reached through a posting list can be similar, besides the tail
+            found = np.unique(cells[similarities[cells] >= self.min_similarity])
+            task, column = np.nonzero(grid[:, stored:] >= self.min_similarity)
+            found = np.concatenate([found, task * span + column + stored])
+            task, column = np.divmod(found, span)
+            rows.append(task + lo)
+            neighbours.append(column + start)
+            weights.append(similarities[found])
+        rows = np.concatenate(rows)
+        neighbours = np.concatenate(neighbours)
+        weights = np.concatenate(weights)
+
+        counts = np.bincount(rows, minlength=n)
+        if counts.max(initial=0) > self.k:
+            # Group by task, most similar first, and keep each task's first k
+            order = np.lexsort((-weights, rows))
+            rows, neighbours, weights = rows[order], neighbours[order], weights[order]
+            rank = np.arange(rows.size) - np.repeat(np.cumsum(counts) - counts, counts)
+            keep = rank < self.k
+            rows, neighbours, weights = rows[keep], neighbours[keep], weights[keep]
+        return rows, neighbours, weights
+
+    def close(self):
+        """Write any buffered outcomes."""
+        if self.db_path is not None:
+            self.flush()
+
+
+def _log(latency_ms: float | None) -> float:
+    return math.log(latency_ms) if latency_ms is not None and latency_ms > 0 else math.nan
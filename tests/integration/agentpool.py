@@ -0,0 +1,92 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from agent.agent import AgentPool
+
+STUB = str(Path(__file__).parent / "agentstub.py")
+
+
+class TestAgentPool:
+    def _pool(self, size=2, delay=0.0, **options):
+        return AgentPool(size, command=[sys.executable, STUB, str(delay)], **options)
+
+    def test_call_reuses_workers(self):
+        with self._pool() as pool:
+            first = pool.call("summarize", {"text": "hi"})
+            assert first["result"] == "Processed summarize"
+            pids = {pool.call(f"task {i}")["pid"] for i in range(20)}
+            # Every call went to one of the two long-lived processes
+            assert first["pid"] in pids and len(pids) <= 2
+
+    def test_call_many_multiplexes_requests(self):
+        with self._pool(size=2, delay=0.2) as pool:
+            pool.health_check()
+            start = time.perf_counter()
+            results = pool.call_many([f"task {i}" for i in range(40)] + [("last", {"x": 1})])
+            elapsed = time.perf_counter() - start
+
+        assert [r["result"] for r in results] == [f"Processed task {i}" for i in range(40)] + [
+            "Processed last"
+        ]
+        assert len({r["pid"] for r in results}) == 2
+        # 41 requests of 200 ms overlap on two workers instead of running in turn
+        assert elapsed < 1.5
+
+    def test_call_many_shares_one_deadline(self):
+        with self._pool(size=2, timeout=0.5) as pool:
+            pool.health_check()
+            start = time.perf_counter()
+            results = pool.call_many(["hang"] * 4 + ["quick"])
+            elapsed = time.perf_counter() - start
+
+            assert results[:4] == [{"error": "agent timed out after 0.5s"}] * 4
+            assert results[4]["result"] == "Processed quick"
+            # Four hung requests wait out one 0.5s deadline, not one each
+            assert elapsed < 1.5
+            assert [worker.in_flight for worker in pool._workers] == [0, 0]
+            assert pool.restarts == 0
+
+            # A third unanswered request in a row restarts each worker
+            pool.call_many(["hang"] * 2)
+            assert pool.restarts == 2
+            assert pool.call("after")["result"] == "Processed after"
+
+    @pytest.mark.benchmark
+    def test_per_call_overhead(self):
+        """Microbenchmark: a warm round trip costs far less than starting a process"""
+        with self._pool(size=1) as pool:
+            pool.call("warm up")
+            start = time.perf_counter()
+            for i in range(500):
+                pool.call(f"task {i}")
+            per_call = (time.perf_counter() - start) / 500
+        assert per_call < 0.005
+
+    def test_restart_after_crash(self):
+        with self._pool(size=1) as pool:
+            pid = pool.call("before")["pid"]
+            assert "exited with code 3" in pool.call("crash")["error"]
+            after = pool.call("after")
+            assert after["result"] == "Processed after" and after["pid"] != pid
+            assert pool.restarts == 1
+
+    def test_timeout_and_health_check(self):
+        with self._pool(size=2, timeout=0.2) as pool:
+            assert pool.call("hang") == {"error": "agent timed out after 0.2s"}
+            assert pool.health_check() == [True, True]
+
+            pool._workers[0]._process.kill()
+            pool._workers[0]._process.wait()
+            assert pool.health_check() == [False, True]
+            assert pool.restarts == 1
+            assert pool.health_check() == [True, True]
+
+    def test_closed_pool(self):
+        pool = self._pool()
+        pool.close()
+        assert "closed" in pool.call("late")["error"]
+        with pytest.raises(ValueError):
+            AgentPool(0)
@@ -0,0 +1,51 @@
+"""
+Stand-in for ``node agent.js --worker`` speaking the same JSON-lines protocol.
+
+Tests run it with ``python agentstub.py [delay]``. Each task is answered
+``delay`` seconds later from its own thread, so responses can come back out
+of order. The task ``crash`` makes the process exit at once and ``hang`` is
+never answered.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+delay = float(sys.argv[1]) if len(sys.argv) > 1 else 0.0
+write_lock = threading.Lock()
+
+
+def send(message):
+    with write_lock:
+        sys.stdout.write(json.dumps(message) + "\n")
+        sys.stdout.flush()
+
+
+def handle(request):
+    if request["task"] == "hang":
+        return
+    time.sleep(delay)
+    send(
+        {
+            "id": request["id"],
+            "result": {
+                "result": f"Processed {request['task']}",
+                "success": True,
+                "pid": os.getpid(),
+            },
+        }
+    )
+
+
+for line in sys.stdin:
+    request = json.loads(line)
+    if request.get("type") == "ping":
+        send({"id": request["id"], "result": "pong"})
+    elif request["task"] == "crash":
+        os._exit(3)
+    elif delay:
+        threading.Thread(target=handle, args=(request,), daemon=True).start()
+    else:
+        handle(request)
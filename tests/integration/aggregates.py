@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+from ml.router import AdaptiveModelSelector
+from tests.integration.benchmark import (
+    AGGREGATED_METRICS,
+    CONFIDENCE_METRICS,
+    RESPONSE_PERCENTILE_METRICS,
+    STREAMING_METRICS,
+    AdvancedModelBenchmark,
+    ModelPerformanceMetrics,
+)
+
+
+class TestModelAggregates:
+    def setup_method(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        self.benchmark = AdvancedModelBenchmark([])
+        self.db_path = os.path.join(self.temp_dir.name, "reports", "model_performance.db")
+
+    def teardown_method(self):
+        self.benchmark.conn.close()
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def _log(self, model_name, response_time, success_rate):
+        self.benchmark._log_performance_to_database(
+            ModelPerformanceMetrics(
+                timestamp="2024-01-01T00:00:00",
+                model_name=model_name,
+                total_queries=4,
+                avg_response_time=response_time,
+                median_response_time=response_time,
+                avg_token_generation_rate=50.0,
+                task_success_rate=success_rate,
+                error_rate=100 - success_rate,
+                total_execution_time=response_time * 4,
+            )
+        )
+
+    def _aggregates(self):
+        rows = self.benchmark.conn.execute("SELECT * FROM model_aggregates").fetchall()
+        return {(r[0], r[1]): r[2:] for r in rows}
+
+    def test_aggregates_updated_on_insert(self):
+        self._log("gpt-4o", 1000.0, 100.0)
+        self._log("gpt-4o", 3000.0, 50.0)
+        self._log("deepseek-r1", 2000.0, 75.0)
+
+        aggregates = self._aggregates()
+        count, total, sum_sq, low, high, last = aggregates[("gpt-4o", "avg_response_time")]
+        assert (count, total, sum_sq, low, high, last) == (2, 4000.0, 1.0e7, 1000.0, 3000.0, 3000.0)
+        assert aggregates[("deepseek-r1", "task_success_rate")] == (1, 75.0, 5625.0, 75, 75, 75)
+        # Streaming, percentile and interval metrics are NULL for these rows and not aggregated
+        assert {metric for _, metric in aggregates} == set(AGGREGATED_METRICS) - set(
+            STREAMING_METRICS + RESPONSE_PERCENTILE_METRICS + CONFIDENCE_METRICS
+        )
+
+        latest = dict(
+            self.benchmark.conn.execute("SELECT model_name, avg_response_time FROM model_latest")
+        )
+        assert latest == {"gpt-4o": 3000.0, "deepseek-r1": 2000.0}
+
+    def test_rebuild_matches_incremental(self):
+        for i in range(5):
+            self._log("gpt-4o", 1000.0 + i, 90.0 - i)
+            self._log("claude-3-5-sonnet-20241022", 1500.0 - i, 80.0 + i)
+        incremental = self._aggregates()
+
+        self.benchmark._rebuild_model_aggregates()
+        rebuilt = self._aggregates()
+        assert rebuilt.keys() == incremental.keys()
+        for key, values in incremental.items():
+            assert rebuilt[key] == pytest.approx(values)
+
+    def test_existing_history_is_backfilled(self):
+        self._log("gpt-4o", 1000.0, 100.0)
+        self.benchmark.conn.execute("DROP TABLE model_latest")
+        self.benchmark.conn.execute("DROP TABLE model_aggregates")
+        # As written by a release before schema versioning
+        self.benchmark.conn.execute("PRAGMA user_version = 0")
+        self.benchmark.conn.close()
+
+        self.benchmark = AdvancedModelBenchmark([])
+        assert self._aggregates()[("gpt-4o", "avg_response_time")][0] == 1
+
+    def test_failed_insert_rolls_back_summaries(self):
+        self._log("gpt-4o", 1000.0, 100.0)
+        self.benchmark.conn.execute(
+            "CREATE TRIGGER fail BEFORE INSERT ON model_latest BEGIN SELECT RAISE(ABORT, 'x'); END"
+        )
+
+        with pytest.raises(sqlite3.IntegrityError):
+            self._log("gpt-4o", 5000.0, 0.0)
+        assert (
+            self.benchmark.conn.execute("SELECT COUNT(*) FROM performance_metrics").fetchone()[0]
+            == 1
+        )
+        assert self._aggregates()[("gpt-4o", "avg_response_time")][0] == 1
+
+    def test_selector_reads_summary_tables(self):
+        self._log("gpt-4o", 1000.0, 100.0)
+        self._log("gpt-4o", 2000.0, 100.0)
+
+        selector = AdaptiveModelSelector(self.db_path)
+        try:
+            snapshot = selector._latest_performance_snapshot()
+            assert snapshot["gpt-4o"]["avg_response_time"] == 2000.0
+            assert selector._load_model_aggregates()["gpt-4o"]["avg_response_time"] == 1500.0
+        finally:
+            selector.close()
@@ -0,0 +1,99 @@
+import glob
+import json
+import os
+import tempfile
+from datetime import datetime
+
+import pyarrow.dataset as ds
+
+from ml.archive import export_history, load_history
+from ml.storage import SampleWriter
+from tests.integration.benchmark import AdvancedModelBenchmark, ModelPerformanceMetrics
+
+
+def _metrics(model_name, day, run_id, response_time=1000.0):
+    return ModelPerformanceMetrics(
+        timestamp=f"{day}T12:00:00",
+        model_name=model_name,
+        total_queries=2,
+        avg_response_time=response_time,
+        median_response_time=response_time,
+        avg_token_generation_rate=50.0,
+        task_success_rate=100.0,
+        error_rate=0.0,
+        total_execution_time=response_time * 2,
+        run_id=run_id,
+    )
+
+
+class TestArchive:
+    def setup_method(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        self.benchmark = AdvancedModelBenchmark([])
+
+    def teardown_method(self):
+        self.benchmark.conn.close()
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def _log_run(self, day, run_id, response_time=1000.0):
+        self.benchmark._log_performances_to_database(
+            [_metrics(m, day, run_id, response_time) for m in ("gpt-4o", "deepseek-r1")]
+        )
+        started_at = datetime.fromisoformat(f"{day}T12:00:00").timestamp()
+        with SampleWriter() as writer:
+            writer.write(
+                (run_id, m, "Code Generation", started_at, response_time, 1, 10, None, None)
+                for m in ("gpt-4o", "deepseek-r1")
+                for _ in range(2)
+            )
+
+    def test_export_partitions_by_day(self):
+        self._log_run("2024-01-01", "run-1")
+        self._log_run("2024-01-02", "run-2", 2000.0)
+
+        assert export_history() == {"performance_metrics": 4, "request_samples": 8}
+        assert sorted(glob.glob("reports/archive/*/date=*/*.parquet")) == [
+            f"reports/archive/{table}/date={day}/data.parquet"
+            for table in ("performance_metrics", "request_samples")
+            for day in ("2024-01-01", "2024-01-02")
+        ]
+
+        table = load_history(columns=["model_name", "avg_response_time"], since="2024-01-02")
+        assert table.column_names == ["model_name", "avg_response_time"]
+        assert sorted(table.column("model_name").to_pylist()) == ["deepseek-r1", "gpt-4o"]
+        assert set(table.column("avg_response_time").to_pylist()) == {2000.0}
+
+        samples = load_history(
+            "request_samples",
+            columns=["run_id", "latency_ms"],
+            until="2024-01-01",
+            filter=ds.field("model_name") == "gpt-4o",
+        ).to_pandas()
+        assert samples.to_dict("list") == {"run_id": ["run-1"] * 2, "latency_ms": [1000.0] * 2}
+
+    def test_export_is_incremental(self):
+        self._log_run("2024-01-01", "run-1")
+        export_history()
+        assert export_history() == {"performance_metrics": 0, "request_samples": 0}
+
+        # New rows for a day already archived are merged into its one file
+        self._log_run("2024-01-01", "run-2")
+        assert export_history() == {"performance_metrics": 2, "request_samples": 4}
+        assert len(glob.glob("reports/archive/performance_metrics/date=*/*.parquet")) == 1
+        assert load_history().num_rows == 4
+
+        with open("reports/archive/_manifest.json") as f:
+            assert json.load(f) == {"performance_metrics": 4, "request_samples": 8}
+
+    def test_export_after_lost_manifest_does_not_duplicate(self):
+        self._log_run("2024-01-01", "run-1")
+        export_history()
+        # As if the last export crashed after writing partitions but before the manifest
+        os.remove("reports/archive/_manifest.json")
+
+        assert export_history() == {"performance_metrics": 2, "request_samples": 4}
+        assert sorted(load_history(columns=["id"]).column("id").to_pylist()) == [1, 2]
+        assert load_history("request_samples").num_rows == 4
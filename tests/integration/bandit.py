@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from ml.bandit import BanditRouter
+from ml.ratelimit import configure_rate_limits, get_rate_limiter
+from ml.router import AdaptiveModelSelector
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestBanditRouter:
+    def setup_method(self):
+        self.rng = np.random.default_rng(1)
+
+    def _serve(self, router, latencies, rounds, failure_rates=None, clock=None):
+        picks = []
+        for _ in range(rounds):
+            model = router.select()
+            picks.append(model)
+            success = self.rng.random() >= (failure_rates or {}).get(model, 0.0)
+            router.record_outcome(model, success, latencies[model] * self.rng.lognormal(0, 0.2))
+            if clock is not None:
+                clock.now += 1
+        return Counter(picks)
+
+    def test_traffic_concentrates_on_fastest_model(self):
+        router = BanditRouter(["a", "b", "c"], db_path=None, seed=0)
+        self._serve(router, {"a": 100, "b": 200, "c": 400}, 300)
+        picks = self._serve(router, {"a": 100, "b": 200, "c": 400}, 200)
+        assert picks["a"] >= 180
+        assert router.stats()["a"]["latency_ms"] == pytest.approx(100, rel=0.1)
+
+    def test_failures_outweigh_speed(self):
+        router = BanditRouter(["flaky", "steady"], db_path=None, seed=0)
+        latencies = {"flaky": 100, "steady": 150}
+        self._serve(router, latencies, 300, failure_rates={"flaky": 0.8})
+        picks = self._serve(router, latencies, 200, failure_rates={"flaky": 0.8})
+        assert picks["steady"] >= 170
+
+    def test_traffic_shifts_when_fastest_model_degrades(self):
+        clock = FakeClock()
+        router = BanditRouter(["a", "b"], db_path=None, half_life=30, seed=0, clock=clock)
+        self._serve(router, {"a": 100, "b": 300}, 300, clock=clock)
+
+        # Model a slows down; old observations fade and traffic moves to b
+        self._serve(router, {"a": 1000, "b": 300}, 300, clock=clock)
+        picks = self._serve(router, {"a": 1000, "b": 300}, 200, clock=clock)
+        assert picks["b"] >= 170
+
+    def test_concurrent_feedback_is_not_lost(self):
+        router = BanditRouter(["a", "b"], db_path=None, half_life=None, seed=0)
+
+        def worker():
+            for _ in range(500):
+                model = router.select()
+                router.record_outcome(model, True, 100.0)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = router.stats()
+        assert stats["a"]["observations"] + stats["b"]["observations"] == 4000
+        assert router.sample_scores(50).shape == (50, 2)
+
+    def test_checkpoint_restores_posteriors(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = os.path.join(temp_dir, "performance.db")
+            clock = FakeClock()
+            router = BanditRouter(
+                ["a", "b"], db_path=db_path, half_life=60, checkpoint_interval=10, clock=clock
+            )
+            for _ in range(25):
+                router.record_outcome("a", True, 120.0)
+            router.record_outcome("b", False)
+
+            # 20 outcomes were checkpointed automatically; the rest on demand
+            conn = sqlite3.connect(db_path)
+            (successes,) = conn.execute(
+                "SELECT successes FROM bandit_state WHERE model_name = 'a'"
+            ).fetchone()
+            conn.close()
+            assert successes == 20
+            router.checkpoint()
+
+            restored = BanditRouter(["a", "b", "c"], db_path=db_path, half_life=60, clock=clock)
+            assert restored.stats()["a"] == pytest.approx(router.stats()["a"])
+            assert restored.stats()["b"]["observations"] == 1
+            assert restored.stats()["c"]["observations"] == 0
+
+            # Checkpoints age like live state
+            clock.now += 60
+            assert BanditRouter(["a"], db_path=db_path, half_life=60, clock=clock).stats()["a"][
+                "observations"
+            ] == pytest.approx(12.5)
+
+    def test_invalid_arguments(self):
+        router = BanditRouter(["a"], db_path=None)
+        with pytest.raises(ValueError):
+            router.record_outcome("z", True)
+        with pytest.raises(ValueError):
+            BanditRouter(["a"], db_path=None, half_life=0)
+
+
+class TestBanditSelection:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.selector = AdaptiveModelSelector(
+            os.path.join(self.temp_dir.name, "performance.db"),
+            selection_log_path=os.path.join(self.temp_dir.name, "selection.jsonl"),
+            policy="bandit",
+        )
+
+    def teardown_method(self):
+        self.selector.selection_log.close()
+        self.selector.close()
+        configure_rate_limits({"openai": {"rate": 10.0}})
+        self.temp_dir.cleanup()
+
+    def test_selector_learns_from_outcomes(self):
+        latencies = {
+            "gpt-4o": 900,
+            "deepseek-r1": 300,
+            "claude-3-5-sonnet-20241022": 1200,
+            "gemini-2.0-flash-exp": 1500,
+        }
+        for _ in range(300):
+            model = self.selector.select_optimal_model("task")
+            self.selector.record_outcome(model, True, latencies[model])
+
+        picks = Counter(self.selector.select_optimal_models([{"description": "task"}] * 200))
+        assert picks["deepseek-r1"] >= 170
+
+        # Throttled providers are still avoided
+        get_rate_limiter("deepseek").on_rate_limited(retry_after=30)
+        assert "deepseek-r1" not in self.selector.select_optimal_models([{"description": "t"}] * 20)
+        configure_rate_limits({"deepseek": {"rate": 5.0}})
+
+    def test_state_survives_restart(self):
+        for _ in range(50):
+            self.selector.record_outcome("gpt-4o", True, 200)
+        self.selector.close()
+
+        selector = AdaptiveModelSelector(self.selector.performance_db_path, policy="bandit")
+        assert selector.bandit.stats()["gpt-4o"]["observations"] == pytest.approx(50, rel=0.01)
+        selector.close()
+
+    def test_invalid_policy(self):
+        with pytest.raises(ValueError):
+            AdaptiveModelSelector(policy="oracle")
@@ -1,22 +1,101 @@
+import asyncio
+import itertools
 import json
+import math
+import multiprocessing
 import os
-import sqlite3
 import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import asdict, dataclass
 from datetime import datetime
+from functools import partial
 from typing import Any
 
-import anthropic  # Added for Claude support
-import google.generativeai as palm  # Added for PaLM support
 import numpy as np
 import plotly.graph_objects as go
 import plotly.io as pio
 from dotenv import load_dotenv
-from openai import OpenAI
+
+from ml.cache import CACHE_MODES, ResponseCache
+from ml.clients import client_options, configure_clients, get_client
+from ml.histogram import LatencyHistogram
+from ml.ratelimit import (
+    call_with_retry,
+    configure_rate_limits,
+    get_rate_limiter,
+    get_retry_policy,
+    rate_limit_options,
+)
+from ml.stats import (
+    DEFAULT_CONFIDENCE,
+    DEFAULT_RESAMPLES,
+    bootstrap_ci,
+    intervals_separated,
+    proportion_ci,
+)
+from ml.storage import DEFAULT_DB_PATH, SampleWriter, migrate, open_database
 
 # Load environment variables
 load_dotenv()
 
+# Environment variable holding the API key for each provider type
+API_KEY_ENV_VARS = {
+    "openai": "OPENAI_API_KEY",
+    "anthropic": "ANTHROPIC_API_KEY",
+    "google": "GOOGLE_API_KEY",
+    "deepseek": "NVIDIA_API_KEY",
+}
+
+# Endpoints used when a model config has no base_url and the SDK default does not apply
+DEFAULT_BASE_URLS = {"deepseek": "https://integrate.api.nvidia.com/v1"}
+
+# Completion settings; together with the model and prompt they key the response cache
+MAX_TOKENS = 1000
+TEMPERATURE = 0.7
+
+# Default max in-flight requests per provider type in concurrent mode
+DEFAULT_CONCURRENCY = {"openai": 4, "anthropic": 4, "google": 2, "deepseek": 4}
+
+# Columns recorded only by streaming runs, added to the original schema
+STREAMING_METRICS = [
+    "avg_time_to_first_token",
+    "p50_inter_token_latency",
+    "p90_inter_token_latency",
+    "p99_inter_token_latency",
+    "output_tokens_per_second",
+]
+
+# Response time tail estimated from each run's latency histogram
+RESPONSE_PERCENTILE_METRICS = [
+    "p90_response_time",
+    "p99_response_time",
+    "p999_response_time",
+    "max_response_time",
+]
+
+# Bootstrap confidence interval bounds for avg_response_time and task_success_rate
+CONFIDENCE_METRICS = [
+    "response_time_ci_low",
+    "response_time_ci_high",
+    "success_rate_ci_low",
+    "success_rate_ci_high",
+]
+
+# Numeric performance_metrics columns summarized in model_latest/model_aggregates
+AGGREGATED_METRICS = [
+    "total_queries",
+    "avg_response_time",
+    "median_response_time",
+    "avg_token_generation_rate",
+    "task_success_rate",
+    "error_rate",
+    "total_execution_time",
+    *STREAMING_METRICS,
+    *RESPONSE_PERCENTILE_METRICS,
+    *CONFIDENCE_METRICS,
+]
+
 
 @dataclass
 class ModelPerformanceMetrics:
@@ -29,12 +108,68 @@ class ModelPerformanceMetrics:
     task_success_rate: float
     error_rate: float
     total_execution_time: float
+    # Streaming-only metrics (milliseconds / tokens per second); None otherwise
+    avg_time_to_first_token: float | None = None
+    p50_inter_token_latency: float | None = None
+    p90_inter_token_latency: float | None = None
+    p99_inter_token_latency: float | None = None
+    output_tokens_per_second: float | None = None
+    # Response time percentiles (milliseconds) from latency_histogram; None without samples
+    p90_response_time: float | None = None
+    p99_response_time: float | None = None
+    p999_response_time: float | None = None
+    max_response_time: float | None = None
+    # Confidence interval bounds (milliseconds / percent); None without requests
+    response_time_ci_low: float | None = None
+    response_time_ci_high: float | None = None
+    success_rate_ci_low: float | None = None
+    success_rate_ci_high: float | None = None
+    latency_histogram: LatencyHistogram | None = None
+    # Shared by the run's rows in performance_metrics and request_samples
+    run_id: str | None = None
 
 
 class AdvancedModelBenchmark:
-    def __init__(self, models: list[dict[str, Any]]):
-        """Initialize benchmark with multiple models and their configurations"""
+    def __init__(
+        self,
+        models: list[dict[str, Any]],
+        concurrency: dict[str, int] | None = None,
+        cache: ResponseCache | None = None,
+        cache_mode: str = "bypass",
+        database: bool = True,
+        repetitions: int = 1,
+        warmup: int = 0,
+        confidence: float = DEFAULT_CONFIDENCE,
+        resamples: int = DEFAULT_RESAMPLES,
+    ):
+        """Initialize benchmark with multiple models and their configurations
+
+        :param cache: Response cache; defaults to one under ``reports/cache``
+            when ``cache_mode`` uses it
+        :param cache_mode: ``replay`` answers repeated requests from the cache and
+            records misses, ``record`` always calls the provider and refreshes the
+            cache, ``bypass`` leaves the cache alone
+        :param database: Open ``reports/model_performance.db``; shard workers
+            leave storing results to the parent process
+        :param repetitions: Measured requests per model and scenario
+        :param warmup: Requests per model sent before measuring, whose results are discarded
+        :param confidence: Coverage of the bootstrap confidence intervals
+        :param resamples: Bootstrap resamples per interval
+        """
+        if cache_mode not in CACHE_MODES:
+            raise ValueError(f"cache_mode must be one of {CACHE_MODES}, got {cache_mode!r}")
+        if repetitions < 1 or warmup < 0:
+            raise ValueError(
+                f"need repetitions >= 1 and warmup >= 0, got {repetitions} and {warmup}"
+            )
         self.models = models
+        self.concurrency = {**DEFAULT_CONCURRENCY, **(concurrency or {})}
+        self.cache_mode = cache_mode
+        self.repetitions = repetitions
+        self.warmup = warmup
+        self.confidence = confidence
+        self.resamples = resamples
+        self.cache = cache if cache is not None or cache_mode == "bypass" else ResponseCache()
         self.clients = self._initialize_clients()
 
         # Expanded real-world use case scenarios
@@ -65,76 +200,164 @@ class AdvancedModelBenchmark:
         os.makedirs("reports", exist_ok=True)
 
         # Initialize SQLite database
-        self._initialize_database()
+        if database:
+            self._initialize_database()
 
     def _initialize_clients(self) -> dict[str, Any]:
-        """Initialize clients for different models"""
+        """Look up the shared, connection-pooled client for each model"""
         clients = {}
         for model_config in self.models:
             model_type = model_config["type"]
-
-            if model_type == "openai":
-                clients[model_config["name"]] = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-            elif model_type == "anthropic":
-                clients[model_config["name"]] = anthropic.Anthropic(
-                    api_key=os.getenv("ANTHROPIC_API_KEY")
-                )
-            elif model_type == "google":
-                palm.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-                clients[model_config["name"]] = palm
-            elif model_type == "deepseek":
-                clients[model_config["name"]] = OpenAI(
-                    base_url="https://integrate.api.nvidia.com/v1",
-                    api_key=os.getenv("NVIDIA_API_KEY"),
-                )
+            if model_type not in API_KEY_ENV_VARS:
+                # Requests to the model fail and are counted as errors
+                print(f"Unsupported model type {model_type!r} for {model_config['name']}")
+                continue
+            base_url = model_config.get("base_url", DEFAULT_BASE_URLS.get(model_type))
+            # Retries go through ml.ratelimit rather than the SDK's own loop
+            clients[model_config["name"]] = get_client(
+                model_type,
+                base_url=base_url,
+                api_key=os.getenv(API_KEY_ENV_VARS[model_type]),
+                max_retries=0,
+            )
 
         return clients
 
     def _initialize_database(self):
-        """Create SQLite database for performance tracking"""
-        self.conn = sqlite3.connect("reports/model_performance.db")
-        cursor = self.conn.cursor()
-
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS performance_metrics (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT,
-            model_name TEXT,
-            total_queries INTEGER,
-            avg_response_time REAL,
-            median_response_time REAL,
-            avg_token_generation_rate REAL,
-            task_success_rate REAL,
-            error_rate REAL,
-            total_execution_time REAL
-        )
-        """)
-        self.conn.commit()
+        """Open the performance database and bring its schema up to date"""
+        self.conn = open_database(DEFAULT_DB_PATH)
+        migrate(self.conn)
+
+        if self.conn.execute("SELECT COUNT(*) FROM model_latest").fetchone()[0] == 0:
+            self._rebuild_model_aggregates()
+
+    def _rebuild_model_aggregates(self):
+        """Recompute model_latest/model_aggregates/model_histograms from the full history"""
+        columns = ", ".join(AGGREGATED_METRICS)
+        with self.conn:
+            self.conn.execute("DELETE FROM model_latest")
+            self.conn.execute("DELETE FROM model_aggregates")
+            self.conn.execute("DELETE FROM model_histograms")
+            for model_name, blob in self.conn.execute(
+                "SELECT model_name, histogram FROM latency_histograms ORDER BY metrics_id"
+            ).fetchall():
+                self._merge_model_histogram(model_name, LatencyHistogram.from_bytes(blob))
+            self.conn.execute(f"""
+            INSERT INTO model_latest (model_name, metrics_id, timestamp, {columns})
+            SELECT model_name, id, timestamp, {columns} FROM performance_metrics
+            WHERE id IN (SELECT MAX(id) FROM performance_metrics GROUP BY model_name)
+            """)
+            for metric in AGGREGATED_METRICS:
+                self.conn.execute(
+                    f"""
+                INSERT INTO model_aggregates
+                SELECT p.model_name, ?, COUNT(p.{metric}), TOTAL(p.{metric}),
+                    TOTAL(p.{metric} * p.{metric}), MIN(p.{metric}), MAX(p.{metric}),
+                    l.{metric}
+                FROM performance_metrics p JOIN model_latest l USING (model_name)
+                WHERE p.{metric} IS NOT NULL
+                GROUP BY p.model_name
+                """,
+                    (metric,),
+                )
 
     def _log_performance_to_database(self, metrics: ModelPerformanceMetrics):
         """Log performance metrics to SQLite database"""
-        cursor = self.conn.cursor()
-        cursor.execute(
+        self._log_performances_to_database([metrics])
+
+    def _log_performances_to_database(self, all_metrics: list[ModelPerformanceMetrics]):
+        """Log every model's metrics of a run in one transaction"""
+        if not all_metrics:
+            return
+        columns = ", ".join(AGGREGATED_METRICS)
+        placeholders = ", ".join("?" * len(AGGREGATED_METRICS))
+        values = [[getattr(m, metric) for metric in AGGREGATED_METRICS] for m in all_metrics]
+
+        # Raw rows and summary updates commit (or roll back) together
+        with self.conn:
+            cursor = self.conn.cursor()
+            # One insert per model, so each id comes from lastrowid within the transaction
+            # rather than from guessing which rows other writers did not add
+            metrics_ids = []
+            for m, row in zip(all_metrics, values, strict=True):
+                cursor.execute(
+                    f"""
+            INSERT INTO performance_metrics (timestamp, model_name, run_id, {columns})
+            VALUES (?, ?, ?, {placeholders})
+            """,
+                    (m.timestamp, m.model_name, m.run_id, *row),
+                )
+                metrics_ids.append(cursor.lastrowid)
+            cursor.executemany(
+                f"""
+            INSERT OR REPLACE INTO model_latest (model_name, metrics_id, timestamp, {columns})
+            VALUES (?, ?, ?, {placeholders})
+            """,
+                [
+                    (m.model_name, metrics_id, m.timestamp, *row)
+                    for m, metrics_id, row in zip(all_metrics, metrics_ids, values, strict=True)
+                ],
+            )
+            cursor.executemany(
+                """
+            INSERT INTO model_aggregates (model_name, metric, count, sum, sum_sq, min, max, last)
+            VALUES (?, ?, 1, ?, ? * ?, ?, ?, ?)
+            ON CONFLICT (model_name, metric) DO UPDATE SET
+                count = count + 1,
+                sum = sum + excluded.sum,
+                sum_sq = sum_sq + excluded.sum_sq,
+                min = MIN(min, excluded.min),
+                max = MAX(max, excluded.max),
+                last = excluded.last
+            """,
+                [
+                    (m.model_name, metric, value, value, value, value, value, value)
+                    for m, row in zip(all_metrics, values, strict=True)
+                    for metric, value in zip(AGGREGATED_METRICS, row, strict=True)
+                    if value is not None
+                ],
+            )
+            histograms = [
+                (metrics_id, m)
+                for m, metrics_id in zip(all_metrics, metrics_ids, strict=True)
+                if m.latency_histogram is not None
+            ]
+            cursor.executemany(
+                "INSERT INTO latency_histograms (metrics_id, model_name, histogram) VALUES (?, ?, ?)",
+                [
+                    (metrics_id, m.model_name, m.latency_histogram.to_bytes())
+                    for metrics_id, m in histograms
+                ],
+            )
+            for _, m in histograms:
+                self._merge_model_histogram(m.model_name, m.latency_histogram)
+
+    def _merge_model_histogram(self, model_name: str, histogram: LatencyHistogram):
+        """Fold a run's histogram into the model's all-time histogram and its percentiles"""
+        row = self.conn.execute(
+            "SELECT histogram FROM model_histograms WHERE model_name = ?", (model_name,)
+        ).fetchone()
+        merged = LatencyHistogram.merged([histogram])
+        if row is not None:
+            merged.merge(LatencyHistogram.from_bytes(row[0]))
+        summary = merged.summary()
+        self.conn.execute(
             """
-        INSERT INTO performance_metrics (
-            timestamp, model_name, total_queries, avg_response_time,
-            median_response_time, avg_token_generation_rate,
-            task_success_rate, error_rate, total_execution_time
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        INSERT OR REPLACE INTO model_histograms
+            (model_name, histogram, count, p50, p90, p99, p999, max)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         """,
             (
-                metrics.timestamp,
-                metrics.model_name,
-                metrics.total_queries,
-                metrics.avg_response_time,
-                metrics.median_response_time,
-                metrics.avg_token_generation_rate,
-                metrics.task_success_rate,
-                metrics.error_rate,
-                metrics.total_execution_time,
+                model_name,
+                merged.to_bytes(),
+                summary["count"],
+                summary["p50"],
+                summary["p90"],
+                summary["p99"],
+                summary["p999"],
+                summary["max"],
             ),
         )
-        self.conn.commit()
 
     def _generate_performance_visualization(self, all_metrics: list[ModelPerformanceMetrics]):
         """Create interactive Plotly visualizations"""
@@ -168,107 +391,453 @@ class AdvancedModelBenchmark:
         )
         pio.write_html(fig_token_rate, file="reports/token_generation_rate.html")
 
-    def run_benchmark(self) -> list[ModelPerformanceMetrics]:
-        """Run comprehensive benchmarking across models and scenarios"""
+    def run_benchmark(
+        self,
+        concurrent: bool = False,
+        stream: bool = False,
+        workers: int = 1,
+        early_stopping: bool = False,
+        min_repetitions: int = 2,
+    ) -> list[ModelPerformanceMetrics]:
+        """Run comprehensive benchmarking across models and scenarios
+
+        Every scenario is sent ``self.repetitions`` times per model, after
+        ``self.warmup`` discarded requests.
+
+        :param concurrent: Issue all model/scenario requests at once, bounded by the
+            per-provider limits in ``self.concurrency``, instead of one after another
+        :param stream: Stream responses to record time to first token, inter-token
+            latency and output token throughput
+        :param workers: Shard the model/scenario matrix across this many processes;
+            their partial results are merged here, and only this process writes
+            to the database
+        :param early_stopping: Run repetitions one round at a time and stop once the
+            models' response time confidence intervals no longer overlap
+        :param min_repetitions: Rounds to run before early stopping may end the run
+
+        Every request is also recorded in ``request_samples`` under the run's
+        ``run_id``; samples are handed to a background writer after each round
+        and are all stored before the run's metrics rows.
+        """
         all_metrics = []
         timestamp = datetime.now().isoformat()
+        run_id = uuid.uuid4().hex
+
+        if self.warmup and workers <= 1:
+            self._warm_up(stream)
+        if early_stopping and self.repetitions <= min_repetitions:
+            print(
+                f"Early stopping needs more than {min_repetitions} repetitions, "
+                f"running all {self.repetitions}"
+            )
+
+        results = {m["name"]: self._fold_outcomes(m["name"], []) for m in self.models}
+        rounds = [1] * self.repetitions if early_stopping else [self.repetitions]
+        with SampleWriter(DEFAULT_DB_PATH) as samples:
+            for completed, repetitions in enumerate(rounds, 1):
+                # Shard workers warm up in their own processes, once per run
+                for model_name, model_results in self._evaluate_round(
+                    repetitions, concurrent, stream, workers, warm_up=completed == 1
+                ).items():
+                    # Samples go to the database rather than piling up across rounds
+                    samples.write(
+                        (run_id, model_name, *sample) for sample in model_results.pop("samples")
+                    )
+                    self._merge_model_results(results[model_name], model_results)
+                if early_stopping and completed >= min_repetitions and completed < len(rounds):
+                    intervals = [
+                        bootstrap_ci(
+                            r["response_times"],
+                            confidence=self.confidence,
+                            resamples=self.resamples,
+                        )
+                        for r in results.values()
+                    ]
+                    if intervals_separated(intervals):
+                        print(f"Confidence intervals separated after {completed} repetitions")
+                        break
 
         for model_config in self.models:
             model_name = model_config["name"]
-            model_results = {
-                "response_times": [],
-                "success_count": 0,
-                "error_count": 0,
-                "total_time": 0,
-            }
-
-            for scenario in self.scenarios:
-                try:
-                    result = self._evaluate_model(model_name, scenario)
-                    model_results["response_times"].extend(result["response_times"])
-                    model_results["success_count"] += result["success_count"]
-                    model_results["error_count"] += result["error_count"]
-                    model_results["total_time"] += result["total_time"]
-                except Exception as e:
-                    print(f"Error evaluating {model_name}: {e}")
-                    model_results["error_count"] += len(self.scenarios)
-
-            metrics = ModelPerformanceMetrics(
-                timestamp=timestamp,
-                model_name=model_name,
-                total_queries=len(self.scenarios),
-                avg_response_time=np.mean(model_results["response_times"])
-                if model_results["response_times"]
-                else 0,
-                median_response_time=np.median(model_results["response_times"])
-                if model_results["response_times"]
-                else 0,
-                avg_token_generation_rate=len(model_results["response_times"])
-                / model_results["total_time"]
-                if model_results["total_time"] > 0
-                else 0,
-                task_success_rate=(model_results["success_count"] / len(self.scenarios)) * 100,
-                error_rate=(model_results["error_count"] / len(self.scenarios)) * 100,
-                total_execution_time=model_results["total_time"],
+            metrics = self._aggregate_model_results(
+                model_name, results[model_name], timestamp, run_id
             )
 
             all_metrics.append(metrics)
-            self._log_performance_to_database(metrics)
+        self._log_performances_to_database(all_metrics)
 
         # Generate visualizations
         self._generate_performance_visualization(all_metrics)
 
         return all_metrics
 
-    def _evaluate_model(self, model_name: str, scenario: dict[str, Any]) -> dict[str, Any]:
-        """Evaluate a specific model's performance on a scenario"""
+    def _evaluate_round(
+        self,
+        repetitions: int,
+        concurrent: bool,
+        stream: bool,
+        workers: int,
+        warm_up: bool = False,
+    ) -> dict[str, dict[str, Any]]:
+        """Send every scenario ``repetitions`` times per model and fold the results
+
+        ``warm_up`` sends the warm-up requests first when the round is sharded;
+        in-process runs warm up once before their first round instead.
+        """
+        work = self._work_items(repetitions)
+        if workers > 1:
+            return self._evaluate_sharded(workers, concurrent, stream, work, warm_up)
+        if concurrent:
+            outcomes = asyncio.run(self._evaluate_all_async(stream, work))
+        else:
+            outcomes = self._evaluate_all(stream, work)
+        return {name: self._fold_outcomes(name, o) for name, o in outcomes.items()}
+
+    def _warm_up(
+        self, stream: bool = False, work: list[tuple[dict[str, Any], dict[str, Any]]] | None = None
+    ):
+        """Send unmeasured requests: ``work``, or ``self._warmup_items()`` by default"""
+        self._evaluate_all(stream, self._warmup_items() if work is None else work)
+
+    def _warmup_items(self) -> list[tuple[dict[str, Any], dict[str, Any]]]:
+        """``self.warmup`` requests per model, cycling through the scenarios"""
+        return [
+            (m, self.scenarios[i % len(self.scenarios)])
+            for m in self.models
+            for i in range(self.warmup)
+        ]
+
+    def _work_items(self, repetitions: int = 1) -> list[tuple[dict[str, Any], dict[str, Any]]]:
+        """The (model config, scenario) matrix, model by model, each scenario repeated"""
+        return [(m, s) for m in self.models for _ in range(repetitions) for s in self.scenarios]
+
+    def _evaluate_all(
+        self, stream: bool = False, work: list[tuple[dict[str, Any], dict[str, Any]]] | None = None
+    ) -> dict[str, list[dict[str, Any] | Exception]]:
+        """Evaluate every model on every scenario (or just ``work``) in series"""
+        outcomes = {m["name"]: [] for m in self.models}
+        for model_config, scenario in self._work_items() if work is None else work:
+            model_name = model_config["name"]
+            try:
+                outcomes[model_name].append(self._evaluate_model(model_name, scenario, stream))
+            except Exception as e:
+                outcomes[model_name].append(e)
+        return outcomes
+
+    async def _evaluate_all_async(
+        self, stream: bool = False, work: list[tuple[dict[str, Any], dict[str, Any]]] | None = None
+    ) -> dict[str, list[dict[str, Any] | Exception]]:
+        """Evaluate every model on every scenario (or just ``work``) at once
+
+        Requests in flight are limited per provider type.
+        """
+        work = self._work_items() if work is None else work
+        semaphores = {
+            model_type: asyncio.Semaphore(self.concurrency.get(model_type, 1))
+            for model_type in {m["type"] for m in self.models}
+        }
+        max_workers = sum(self.concurrency.get(t, 1) for t in semaphores) or 1
+        loop = asyncio.get_running_loop()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+            async def evaluate(model_config, scenario):
+                async with semaphores[model_config["type"]]:
+                    try:
+                        return await loop.run_in_executor(
+                            executor, self._evaluate_model, model_config["name"], scenario, stream
+                        )
+                    except Exception as e:
+                        return e
+
+            # Results come back in submission order, so aggregation matches the serial run
+            results = await asyncio.gather(*(evaluate(m, s) for m, s in work))
+
+        outcomes = {m["name"]: [] for m in self.models}
+        for (model_config, _), result in zip(work, results, strict=True):
+            outcomes[model_config["name"]].append(result)
+        return outcomes
+
+    def _evaluate_sharded(
+        self,
+        workers: int,
+        concurrent: bool = False,
+        stream: bool = False,
+        work: list[tuple[dict[str, Any], dict[str, Any]]] | None = None,
+        warm_up: bool = False,
+    ) -> dict[str, dict[str, Any]]:
+        """Evaluate the work matrix across worker processes and merge their partial results
+
+        Work is dealt round-robin so every shard mixes models and providers.
+        Per-provider concurrency and request rates are split between the
+        workers, so together they stay within the configured limits. With
+        ``warm_up``, each model's ``self.warmup`` requests are dealt among the
+        shards measuring it, so the run sends them once rather than per worker.
+        """
+        work = self._work_items() if work is None else work
+        shards = [work[i::workers] for i in range(workers) if work[i::workers]]
+        options = self._worker_options(len(shards))
+
+        warmups = [[] for _ in shards]
+        if warm_up:
+            holders = {}
+            for index, shard in enumerate(shards):
+                for name in {m["name"] for m, _ in shard}:
+                    holders.setdefault(name, []).append(index)
+            turns = {name: itertools.cycle(indexes) for name, indexes in holders.items()}
+            for model_config, scenario in self._warmup_items():
+                name = model_config["name"]
+                if name in turns:
+                    warmups[next(turns[name])].append((name, scenario))
+
+        # Spawned workers start clean instead of inheriting open connection pools
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=len(shards), mp_context=context) as executor:
+            futures = [
+                executor.submit(
+                    _run_shard,
+                    options,
+                    [(m["name"], scenario) for m, scenario in shard],
+                    stream,
+                    concurrent,
+                    warmup,
+                )
+                for shard, warmup in zip(shards, warmups, strict=True)
+            ]
+            partials = [future.result() for future in futures]
+
+        results = {m["name"]: self._fold_outcomes(m["name"], []) for m in self.models}
+        for shard in partials:
+            for model_name, model_results in shard["results"].items():
+                self._merge_model_results(results[model_name], model_results)
+            if self.cache is not None and shard["cache"] is not None:
+                self.cache.hits += shard["cache"]["hits"]
+                self.cache.misses += shard["cache"]["misses"]
+                self.cache.evictions += shard["cache"]["evictions"]
+        return results
+
+    def _worker_options(self, workers: int) -> dict[str, Any]:
+        """Everything a shard worker needs to rebuild this benchmark's setup"""
+
+        def split(options: dict[str, Any]) -> dict[str, Any]:
+            options = dict(options)
+            for key in ("rate", "max_rate"):
+                if options.get(key) is not None:
+                    options[key] = options[key] / workers
+            return options
+
+        return {
+            "models": self.models,
+            "scenarios": self.scenarios,
+            "concurrency": {
+                model_type: math.ceil(limit / workers)
+                for model_type, limit in self.concurrency.items()
+            },
+            "cache": None
+            if self.cache is None
+            else {
+                "directory": self.cache.directory,
+                "max_bytes": self.cache.max_bytes,
+                "ttl": self.cache.ttl,
+            },
+            "cache_mode": self.cache_mode,
+            "clients": client_options(),
+            "rate_limits": {
+                provider: split(options) for provider, options in rate_limit_options().items()
+            },
+            "retry": asdict(get_retry_policy()),
+        }
+
+    def _fold_outcomes(
+        self, model_name: str, outcomes: list[dict[str, Any] | Exception]
+    ) -> dict[str, Any]:
+        """Fold per-scenario results for one model into mergeable partial results"""
+        model_results = {
+            "query_count": 0,
+            "response_times": [],
+            "success_count": 0,
+            "error_count": 0,
+            "total_time": 0,
+            "output_tokens": 0,
+            "time_to_first_token": [],
+            "inter_token_latencies": [],
+            "generation_time": 0,
+            "samples": [],
+        }
+
+        for result in outcomes:
+            model_results["query_count"] += 1
+            if isinstance(result, Exception):
+                print(f"Error evaluating {model_name}: {result}")
+                model_results["error_count"] += 1
+                model_results["samples"].append(
+                    (None, None, None, 0, 0, None, type(result).__name__)
+                )
+                continue
+            model_results["response_times"].extend(result["response_times"])
+            model_results["success_count"] += result["success_count"]
+            model_results["error_count"] += result["error_count"]
+            model_results["total_time"] += result["total_time"]
+            model_results["output_tokens"] += result.get("output_tokens", 0)
+            model_results["time_to_first_token"].extend(result.get("time_to_first_token", []))
+            model_results["inter_token_latencies"].extend(result.get("inter_token_latencies", []))
+            model_results["generation_time"] += result.get("generation_time", 0)
+            model_results["samples"].extend(result.get("samples", []))
+
+        model_results["histogram"] = LatencyHistogram()
+        model_results["histogram"].record_many(model_results["response_times"])
+        return model_results
+
+    @staticmethod
+    def _merge_model_results(model_results: dict[str, Any], other: dict[str, Any]):
+        """Add another shard's partial results for the same model into ``model_results``"""
+        for key, value in other.items():
+            if key == "histogram":
+                model_results[key].merge(value)
+            else:
+                model_results[key] += value
+
+    def _aggregate_model_results(
+        self,
+        model_name: str,
+        model_results: dict[str, Any],
+        timestamp: str,
+        run_id: str | None = None,
+    ) -> ModelPerformanceMetrics:
+        """Turn one model's folded results into a metrics row"""
+        latency = {}
+        if model_results["histogram"].count:
+            histogram = model_results["histogram"]
+            p90, p99, p999 = histogram.percentiles([90, 99, 99.9])
+            latency = {
+                "p90_response_time": p90,
+                "p99_response_time": p99,
+                "p999_response_time": p999,
+                "max_response_time": histogram.max,
+                "latency_histogram": histogram,
+            }
+
+        # Uncertainty of the mean response time and of the success rate
+        queries = model_results["query_count"]
+        intervals = {}
+        response_ci = bootstrap_ci(
+            model_results["response_times"], confidence=self.confidence, resamples=self.resamples
+        )
+        if response_ci is not None:
+            intervals["response_time_ci_low"], intervals["response_time_ci_high"] = response_ci
+        success_ci = proportion_ci(
+            model_results["success_count"],
+            queries,
+            confidence=self.confidence,
+            resamples=self.resamples,
+        )
+        if success_ci is not None:
+            intervals["success_rate_ci_low"] = success_ci[0] * 100
+            intervals["success_rate_ci_high"] = success_ci[1] * 100
+
+        streaming = {}
+        if model_results["time_to_first_token"]:
+            streaming["avg_time_to_first_token"] = float(
+                np.mean(model_results["time_to_first_token"])
+            )
+        if model_results["inter_token_latencies"]:
+            p50, p90, p99 = np.percentile(model_results["inter_token_latencies"], [50, 90, 99])
+            streaming["p50_inter_token_latency"] = float(p50)
+            streaming["p90_inter_token_latency"] = float(p90)
+            streaming["p99_inter_token_latency"] = float(p99)
+        if model_results["generation_time"] > 0:
+            # Decode throughput: tokens over the time spent after the first token
+            streaming["output_tokens_per_second"] = model_results["output_tokens"] / (
+                model_results["generation_time"] / 1000
+            )
+
+        return ModelPerformanceMetrics(
+            timestamp=timestamp,
+            model_name=model_name,
+            total_queries=queries,
+            avg_response_time=np.mean(model_results["response_times"])
+            if model_results["response_times"]
+            else 0,
+            median_response_time=np.median(model_results["response_times"])
+            if model_results["response_times"]
+            else 0,
+            # Output tokens per second of end-to-end request time
+            avg_token_generation_rate=model_results["output_tokens"]
+            / (model_results["total_time"] / 1000)
+            if model_results["total_time"] > 0
+            else 0,
+            task_success_rate=(model_results["success_count"] / queries) * 100 if queries else 0,
+            error_rate=(model_results["error_count"] / queries) * 100 if queries else 0,
+            total_execution_time=model_results["total_time"],
+            run_id=run_id,
+            **streaming,
+            **latency,
+            **intervals,
+        )
+
+    def _evaluate_model(
+        self, model_name: str, scenario: dict[str, Any], stream: bool = False
+    ) -> dict[str, Any]:
+        """Evaluate a specific model's performance on a scenario
+
+        With ``stream`` the response is consumed chunk by chunk so time to
+        first token and inter-token latency (measured between content chunks)
+        can be recorded alongside the total response time. The result's
+        ``samples`` holds the request as a ``request_samples`` row without its
+        run and model.
+        """
         start_time = time.time()
         success_count = 0
         error_count = 0
+        error_type = None
         response_times = []
+        output_tokens = 0
+        time_to_first_token = []
+        inter_token_latencies = []
+        generation_time = 0
+
+        def attempt(*args):
+            # Each attempt restarts the clock: waits for the rate limiter and retry
+            # backoff before it are not model latency, whether it succeeds or fails
+            nonlocal start_time
+            start_time = time.time()
+            return self._complete(*args)
 
         try:
             client = self.clients[model_name]
             model_config = next(m for m in self.models if m["name"] == model_name)
             model_type = model_config["type"]
 
-            # Call the appropriate API based on model type
-            if model_type == "openai":
-                client.chat.completions.create(
-                    model=model_name,
-                    messages=[{"role": "user", "content": scenario["prompt"]}],
-                    max_tokens=1000,
-                    temperature=0.7,
-                )
-                success_count = 1
-                response_times.append((time.time() - start_time) * 1000)
-
-            elif model_type == "anthropic":
-                client.messages.create(
-                    model=model_name,
-                    max_tokens=1000,
-                    messages=[{"role": "user", "content": scenario["prompt"]}],
-                )
-                success_count = 1
-                response_times.append((time.time() - start_time) * 1000)
-
-            elif model_type == "google":
-                client.generate_content(scenario["prompt"])
-                success_count = 1
-                response_times.append((time.time() - start_time) * 1000)
-
-            elif model_type == "deepseek":
-                client.chat.completions.create(
-                    model=model_name,
-                    messages=[{"role": "user", "content": scenario["prompt"]}],
-                    max_tokens=1000,
-                    temperature=0.7,
+            params = self._request_params(
+                model_type,
+                model_name,
+                scenario["prompt"],
+                stream,
+                model_config.get("base_url", DEFAULT_BASE_URLS.get(model_type)),
+            )
+            cached = self.cache.get(params) if self.cache_mode == "replay" else None
+            if cached is not None:
+                start_time, end_time, output_tokens, chunk_times = self._replay(cached)
+            else:
+                start_time, end_time, output_tokens, chunk_times = call_with_retry(
+                    partial(attempt, client, model_type, model_name, scenario["prompt"], stream),
+                    limiter=get_rate_limiter(model_type),
                 )
-                success_count = 1
-                response_times.append((time.time() - start_time) * 1000)
+                if self.cache_mode != "bypass":
+                    self.cache.put(
+                        params, self._recording(start_time, end_time, output_tokens, chunk_times)
+                    )
+            success_count = 1
+            response_times.append((end_time - start_time) * 1000)
+            if chunk_times:
+                time_to_first_token.append((chunk_times[0] - start_time) * 1000)
+                inter_token_latencies.extend((np.diff(chunk_times) * 1000).tolist())
+                generation_time = (end_time - chunk_times[0]) * 1000
 
-        except Exception:
+        except Exception as e:
             error_count = 1
+            error_type = type(e).__name__
+            # Duration of the last, failed attempt
             response_times.append((time.time() - start_time) * 1000)
 
         return {
@@ -276,8 +845,190 @@ class AdvancedModelBenchmark:
             "success_count": success_count,
             "error_count": error_count,
             "total_time": sum(response_times),
+            "output_tokens": output_tokens,
+            "time_to_first_token": time_to_first_token,
+            "inter_token_latencies": inter_token_latencies,
+            "generation_time": generation_time,
+            "samples": [
+                (
+                    scenario.get("name"),
+                    start_time,
+                    response_times[0],
+                    success_count,
+                    output_tokens,
+                    time_to_first_token[0] if time_to_first_token else None,
+                    error_type,
+                )
+            ],
         }
 
+    @staticmethod
+    def _request_params(
+        model_type: str, model_name: str, prompt: str, stream: bool, base_url: str | None = None
+    ) -> dict[str, Any]:
+        """Parameters that determine a response, used as its cache key
+
+        The provider type and endpoint are part of the key, so one model name
+        served by different endpoints never shares cached responses.
+        """
+        return {
+            "provider": model_type,
+            "base_url": base_url,
+            "model": model_name,
+            "prompt": prompt,
+            "max_tokens": MAX_TOKENS,
+            # Anthropic and Google requests use the provider's default temperature
+            "temperature": TEMPERATURE if model_type in ("openai", "deepseek") else None,
+            "stream": stream,
+        }
+
+    @staticmethod
+    def _recording(
+        start_time: float, end_time: float, output_tokens: int, chunk_times: list[float]
+    ) -> dict[str, Any]:
+        """Cache entry for a response: its timings relative to the request start"""
+        return {
+            "response_time": end_time - start_time,
+            "output_tokens": output_tokens,
+            "chunk_offsets": [t - start_time for t in chunk_times],
+        }
+
+    @staticmethod
+    def _replay(recording: dict[str, Any]) -> tuple[float, float, int, list[float]]:
+        """Rebuild ``_complete``'s result from a cache entry without waiting it out"""
+        start_time = time.time()
+        return (
+            start_time,
+            start_time + recording["response_time"],
+            recording["output_tokens"],
+            [start_time + offset for offset in recording["chunk_offsets"]],
+        )
+
+    def _complete(
+        self, client, model_type: str, model_name: str, prompt: str, stream: bool = False
+    ) -> tuple[float, float, int, list[float]]:
+        """Send one request and return (start, end, output tokens, chunk arrival times)"""
+        start_time = time.time()
+
+        if stream:
+            chunk_times, output_tokens = self._stream_completion(
+                client, model_type, model_name, prompt
+            )
+            return start_time, time.time(), output_tokens, chunk_times
+
+        # Call the appropriate API based on model type
+        if model_type in ("openai", "deepseek"):
+            response = client.chat.completions.create(
+                model=model_name,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=MAX_TOKENS,
+                temperature=TEMPERATURE,
+            )
+            output_tokens = getattr(response.usage, "completion_tokens", 0) or 0
+
+        elif model_type == "anthropic":
+            response = client.messages.create(
+                model=model_name,
+                max_tokens=MAX_TOKENS,
+                messages=[{"role": "user", "content": prompt}],
+            )
+            output_tokens = getattr(response.usage, "output_tokens", 0) or 0
+
+        elif model_type == "google":
+            response = client.GenerativeModel(model_name).generate_content(prompt)
+            output_tokens = getattr(response.usage_metadata, "candidates_token_count", 0) or 0
+
+        else:
+            raise ValueError(f"Unknown model type: {model_type}")
+
+        return start_time, time.time(), output_tokens, []
+
+    def _stream_completion(
+        self, client: Any, model_type: str, model_name: str, prompt: str
+    ) -> tuple[list[float], int]:
+        """Stream a completion, returning content chunk arrival times and output tokens
+
+        Output tokens come from the provider's usage report when it sends one,
+        otherwise each content chunk is counted as one token.
+        """
+        chunk_times = []
+        reported_tokens = None
+
+        if model_type in ("openai", "deepseek"):
+            # Only OpenAI itself is known to accept stream_options
+            extra = {"stream_options": {"include_usage": True}} if model_type == "openai" else {}
+            for chunk in client.chat.completions.create(
+                model=model_name,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=MAX_TOKENS,
+                temperature=TEMPERATURE,
+                stream=True,
+                **extra,
+            ):
+                if chunk.choices and chunk.choices[0].delta.content:
+                    chunk_times.append(time.time())
+                if getattr(chunk, "usage", None):
+                    reported_tokens = chunk.usage.completion_tokens
+
+        elif model_type == "anthropic":
+            for event in client.messages.create(
+                model=model_name,
+                max_tokens=MAX_TOKENS,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+            ):
+                if event.type == "content_block_delta":
+                    chunk_times.append(time.time())
+                elif event.type == "message_delta":
+                    reported_tokens = event.usage.output_tokens
+
+        elif model_type == "google":
+            for chunk in client.GenerativeModel(model_name).generate_content(prompt, stream=True):
+                if chunk.parts:
+                    chunk_times.append(time.time())
+                if chunk.usage_metadata:
+                    reported_tokens = chunk.usage_metadata.candidates_token_count
+
+        return chunk_times, reported_tokens if reported_tokens is not None else len(chunk_times)
+
+
+def _run_shard(
+    options: dict[str, Any],
+    work: list[tuple[str, dict[str, Any]]],
+    stream: bool,
+    concurrent: bool,
+    warmup: list[tuple[str, dict[str, Any]]] = (),
+) -> dict[str, Any]:
+    """Worker process entry point: evaluate one shard and return partial results per model
+
+    ``warmup`` requests are sent first and their results discarded.
+    """
+    configure_clients(**options["clients"])
+    configure_rate_limits(options["rate_limits"], options["retry"])
+    cache = ResponseCache(**options["cache"]) if options["cache"] is not None else None
+    benchmark = AdvancedModelBenchmark(
+        options["models"],
+        concurrency=options["concurrency"],
+        cache=cache,
+        cache_mode=options["cache_mode"],
+        database=False,
+    )
+    benchmark.scenarios = options["scenarios"]
+
+    model_configs = {m["name"]: m for m in benchmark.models}
+    if warmup:
+        benchmark._warm_up(stream, [(model_configs[name], scenario) for name, scenario in warmup])
+    work_items = [(model_configs[name], scenario) for name, scenario in work]
+    if concurrent:
+        outcomes = asyncio.run(benchmark._evaluate_all_async(stream, work_items))
+    else:
+        outcomes = benchmark._evaluate_all(stream, work_items)
+
+    return {
+        "results": {name: benchmark._fold_outcomes(name, o) for name, o in outcomes.items()},
+        "cache": cache.stats() if cache is not None else None,
+    }
+
 
 def main():
     models = [
@@ -292,7 +1043,9 @@ def main():
 
     # Generate comprehensive JSON report
     with open("reports/comprehensive_benchmark_report.json", "w") as f:
-        json.dump([asdict(result) for result in results], f, indent=2)
+        json.dump(
+            [asdict(result) for result in results], f, indent=2, default=LatencyHistogram.summary
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,143 @@
+import os
+import tempfile
+import time
+
+import pytest
+
+from ml.cache import ResponseCache
+from tests.integration.benchmark import AdvancedModelBenchmark
+from tests.integration.stub import StubOpenAIServer
+
+
+class TestResponseCache:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.temp_dir.name, "cache")
+
+    def teardown_method(self):
+        self.temp_dir.cleanup()
+
+    def _params(self, prompt="hi", **overrides):
+        return {
+            "model": "gpt-4o",
+            "prompt": prompt,
+            "max_tokens": 1000,
+            "temperature": 0.7,
+            **overrides,
+        }
+
+    def test_round_trip_and_key(self):
+        cache = ResponseCache(self.directory)
+        assert cache.get(self._params()) is None
+
+        cache.put(self._params(), {"response_time": 1.5})
+        assert cache.get(self._params()) == {"response_time": 1.5}
+        # Any parameter change is a different entry; key order is not
+        assert cache.get(self._params(temperature=0.0)) is None
+        assert cache.key(self._params()) == cache.key(dict(reversed(self._params().items())))
+        assert cache.stats() == {"hits": 1, "misses": 2, "evictions": 0}
+
+        # Entries persist across instances
+        assert ResponseCache(self.directory).get(self._params()) == {"response_time": 1.5}
+
+    def test_expired_entries_miss(self):
+        cache = ResponseCache(self.directory, ttl=0.05)
+        cache.put(self._params(), {"response_time": 1.0})
+        assert cache.get(self._params()) is not None
+        time.sleep(0.1)
+        assert cache.get(self._params()) is None
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = ResponseCache(self.directory)
+        for i in range(3):
+            cache.put(self._params(f"prompt {i}"), {"text": "x" * 100})
+            time.sleep(0.02)
+        # Room for exactly the three entries written so far
+        cache.max_bytes = sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, files in os.walk(self.directory)
+            for name in files
+        )
+        # Reading the oldest entry makes prompt 1 the least recently used
+        assert cache.get(self._params("prompt 0")) is not None
+        time.sleep(0.02)
+
+        cache.put(self._params("prompt 3"), {"text": "x" * 100})
+        assert cache.evictions >= 1
+        assert cache.get(self._params("prompt 1")) is None
+        assert cache.get(self._params("prompt 0")) is not None
+        assert cache.get(self._params("prompt 3")) is not None
+
+
+class TestCachedBenchmark:
+    def setup_method(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+
+        self.server = StubOpenAIServer(
+            delay=0.1, content="one two three four five six", token_delay=0.02
+        ).start()
+        self.models = [{"name": "stub-openai", "type": "openai", "base_url": self.server.base_url}]
+        self.cache = ResponseCache("cache")
+
+    def teardown_method(self):
+        self.server.stop()
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def test_replay_reproduces_metrics_without_requests(self):
+        (recorded,) = AdvancedModelBenchmark(
+            self.models, cache=self.cache, cache_mode="record"
+        ).run_benchmark(stream=True)
+        requests = self.server.request_count
+        assert requests == 4
+
+        start = time.perf_counter()
+        (replayed,) = AdvancedModelBenchmark(
+            self.models, cache=self.cache, cache_mode="replay"
+        ).run_benchmark(stream=True)
+
+        assert self.server.request_count == requests
+        assert time.perf_counter() - start < recorded.avg_response_time * 4 / 1000
+        assert replayed.avg_response_time == pytest.approx(recorded.avg_response_time)
+        assert replayed.avg_time_to_first_token == pytest.approx(recorded.avg_time_to_first_token)
+        assert replayed.p50_inter_token_latency == pytest.approx(
+            recorded.p50_inter_token_latency, abs=0.01
+        )
+
+    def test_replay_records_misses(self):
+        benchmark = AdvancedModelBenchmark(self.models, cache=self.cache, cache_mode="replay")
+        benchmark.run_benchmark()
+        assert self.server.request_count == 4
+        # Streaming is keyed separately from plain completions
+        benchmark.run_benchmark(stream=True)
+        assert self.server.request_count == 8
+        benchmark.run_benchmark()
+        benchmark.run_benchmark(stream=True)
+        assert self.server.request_count == 8
+        assert self.cache.stats()["hits"] == 8
+
+    def test_endpoints_are_cached_separately(self):
+        AdvancedModelBenchmark(self.models, cache=self.cache, cache_mode="record").run_benchmark()
+
+        other = StubOpenAIServer(content="another endpoint").start()
+        try:
+            models = [{**self.models[0], "base_url": other.base_url}]
+            AdvancedModelBenchmark(models, cache=self.cache, cache_mode="replay").run_benchmark()
+            assert other.request_count == 4
+        finally:
+            other.stop()
+        assert self.cache.stats()["hits"] == 0
+
+    def test_record_and_bypass_always_call_provider(self):
+        AdvancedModelBenchmark(self.models, cache=self.cache, cache_mode="record").run_benchmark()
+        AdvancedModelBenchmark(self.models, cache=self.cache, cache_mode="record").run_benchmark()
+        AdvancedModelBenchmark(self.models, cache=self.cache).run_benchmark()
+        assert self.server.request_count == 12
+        assert self.cache.stats()["hits"] == 0
+
+    def test_invalid_mode(self):
+        with pytest.raises(ValueError):
+            AdvancedModelBenchmark(self.models, cache_mode="sometimes")
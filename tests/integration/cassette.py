@@ -0,0 +1,99 @@
+import os
+import tempfile
+import time
+
+import openai
+import pytest
+
+from ml.cassette import Cassette, ReplayTransport, eject_cassette, use_cassette
+from ml.clients import get_client
+from tests.integration.benchmark import AdvancedModelBenchmark
+from tests.integration.stub import StubOpenAIServer
+
+
+class TestCassetteReplay:
+    def setup_method(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+        os.environ.setdefault("NVIDIA_API_KEY", "stub-key")
+
+        # 100ms to first token, then 5 more tokens 20ms apart
+        self.server = StubOpenAIServer(
+            delay=0.1, content="one two three four five six", token_delay=0.02
+        ).start()
+        self.models = [
+            {"name": "stub-openai", "type": "openai", "base_url": self.server.base_url},
+            {"name": "stub-deepseek", "type": "deepseek", "base_url": self.server.base_url},
+        ]
+
+    def teardown_method(self):
+        eject_cassette()
+        self.server.stop()
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def _record(self, path: str, **run_options):
+        cassette = Cassette(path)
+        use_cassette(cassette, "record")
+        recorded = AdvancedModelBenchmark(self.models).run_benchmark(**run_options)
+        cassette.save()
+        self.server.stop()
+        return recorded
+
+    def _replay(self, path: str, latency_scale: float = 1.0, **run_options):
+        use_cassette(Cassette.load(path), "replay", latency_scale=latency_scale)
+        return AdvancedModelBenchmark(self.models).run_benchmark(**run_options)
+
+    def test_streaming_replays_offline_with_recorded_timings(self):
+        recorded = self._record("run.jsonl.gz", stream=True)
+        assert len(Cassette.load("run.jsonl.gz").interactions) == 8
+
+        replayed = self._replay("run.jsonl.gz", stream=True)
+        for before, after in zip(recorded, replayed, strict=True):
+            assert after.task_success_rate == 100.0
+            assert after.avg_response_time == pytest.approx(before.avg_response_time, rel=0.2)
+            assert after.avg_time_to_first_token == pytest.approx(
+                before.avg_time_to_first_token, rel=0.2
+            )
+            assert after.p50_inter_token_latency == pytest.approx(20, abs=15)
+            assert after.avg_token_generation_rate == pytest.approx(
+                before.avg_token_generation_rate, rel=0.2
+            )
+
+    def test_latency_scale(self):
+        self.models = self.models[:1]
+        (recorded,) = self._record("run.jsonl")
+
+        (fast,) = self._replay("run.jsonl", latency_scale=0.5)
+        assert fast.avg_response_time == pytest.approx(recorded.avg_response_time / 2, rel=0.3)
+        (instant,) = self._replay("run.jsonl", latency_scale=0)
+        assert instant.task_success_rate == 100.0
+        assert instant.avg_response_time < 20
+
+    def test_concurrent_replay_overlaps_requests(self):
+        self._record("run.jsonl", concurrent=True)
+
+        start = time.perf_counter()
+        replayed = self._replay("run.jsonl", concurrent=True)
+        elapsed = time.perf_counter() - start
+
+        # 8 requests of ~100ms each, replayed side by side rather than in series
+        assert all(m.task_success_rate == 100.0 for m in replayed)
+        assert elapsed < 0.6
+
+    def test_unrecorded_request_fails_without_retrying(self):
+        use_cassette(Cassette(), "replay")
+        client = get_client("openai", self.server.base_url, "stub-key")
+        with pytest.raises(openai.NotFoundError, match="No recorded interaction"):
+            client.chat.completions.create(
+                model="stub", messages=[{"role": "user", "content": "hi"}]
+            )
+        assert self.server.request_count == 0
+
+    def test_invalid_options(self):
+        with pytest.raises(ValueError):
+            use_cassette(Cassette(), "rewind")
+        with pytest.raises(ValueError):
+            ReplayTransport(Cassette(), latency_scale=-1)
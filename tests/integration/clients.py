@@ -0,0 +1,102 @@
+import os
+import tempfile
+
+import pytest
+
+from ml.clients import ClientRegistry
+from tests.integration.benchmark import AdvancedModelBenchmark
+from tests.integration.stub import StubOpenAIServer
+
+
+class TestClientRegistry:
+    def setup_method(self):
+        self.server = StubOpenAIServer().start()
+        self.registry = ClientRegistry()
+
+    def teardown_method(self):
+        self.registry.close()
+        self.server.stop()
+
+    def _complete(self, client, model="stub"):
+        return client.chat.completions.create(
+            model=model, messages=[{"role": "user", "content": "hi"}]
+        )
+
+    def test_clients_are_shared_per_endpoint(self):
+        client = self.registry.get("openai", self.server.base_url, "key")
+        assert self.registry.get("openai", self.server.base_url, "key") is client
+        # DeepSeek goes through the same OpenAI-compatible SDK
+        assert self.registry.get("deepseek", self.server.base_url, "key") is client
+        assert self.registry.get("openai", self.server.base_url, "other-key") is not client
+
+    def test_google_client_holds_one_key(self):
+        client = self.registry.get("google", api_key="key")
+        assert self.registry.get("google", api_key="key", max_retries=0) is client
+        # The SDK is configured process-wide, so a second key cannot get its own client
+        with pytest.raises(ValueError):
+            self.registry.get("google", api_key="other-key")
+        with pytest.raises(ValueError):
+            self.registry.get("google", "https://example.com", "key")
+
+        self.registry.close()
+        assert self.registry.get("google", api_key="other-key") is client
+
+    def test_connections_are_kept_alive(self):
+        client = self.registry.get("openai", self.server.base_url, "key")
+        for _ in range(5):
+            self._complete(client)
+
+        assert self.server.request_count == 5
+        assert self.server.connection_count == 1
+
+    def test_warmup_opens_connections(self):
+        self.registry.configure(warmup=1)
+        client = self.registry.get("openai", self.server.base_url, "key")
+        assert self.server.connection_count == 1
+
+        self._complete(client)
+        assert self.server.connection_count == 1
+
+    def test_pool_options(self):
+        registry = ClientRegistry(max_keepalive_connections=2, keepalive_expiry=5)
+        client = registry.get("openai", self.server.base_url, "key")
+        pool = client._client._transport._pool
+        assert pool._max_keepalive_connections == 2
+        assert pool._keepalive_expiry == 5
+        registry.close()
+
+        with pytest.raises(ValueError):
+            ClientRegistry(pool_size=4)
+        with pytest.raises(ValueError):
+            self.registry.get("mistral")
+
+    def test_close_forgets_clients(self):
+        client = self.registry.get("openai", self.server.base_url, "key")
+        self.registry.close()
+        assert self.registry.get("openai", self.server.base_url, "key") is not client
+
+
+class TestBenchmarkClientReuse:
+    def setup_method(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+        os.environ.setdefault("NVIDIA_API_KEY", "stub-key")
+        self.server = StubOpenAIServer().start()
+
+    def teardown_method(self):
+        self.server.stop()
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def test_repeated_runs_reuse_connections(self):
+        models = [{"name": "stub-openai", "type": "openai", "base_url": self.server.base_url}]
+        first = AdvancedModelBenchmark(models)
+        first.run_benchmark()
+        second = AdvancedModelBenchmark(models)
+        second.run_benchmark()
+
+        assert second.clients["stub-openai"] is first.clients["stub-openai"]
+        assert self.server.request_count == 2 * len(first.scenarios)
+        assert self.server.connection_count == 1
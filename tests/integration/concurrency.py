@@ -0,0 +1,73 @@
+import os
+import tempfile
+import time
+
+from tests.integration.benchmark import AdvancedModelBenchmark
+from tests.integration.stub import StubOpenAIServer
+
+
+class TestConcurrentBenchmark:
+    def setup_method(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+
+        self.server = StubOpenAIServer(delay=0.2).start()
+        self.models = [
+            {"name": "stub-a", "type": "openai", "base_url": self.server.base_url},
+            {"name": "stub-b", "type": "openai", "base_url": self.server.base_url},
+        ]
+
+    def teardown_method(self):
+        self.server.stop()
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def test_concurrent_matches_serial_results(self):
+        benchmark = AdvancedModelBenchmark(self.models)
+        serial = benchmark.run_benchmark()
+        concurrent = benchmark.run_benchmark(concurrent=True)
+
+        assert [m.model_name for m in concurrent] == [m.model_name for m in serial]
+        for s, c in zip(serial, concurrent, strict=True):
+            assert c.total_queries == s.total_queries
+            assert c.task_success_rate == s.task_success_rate == 100.0
+            assert c.error_rate == s.error_rate == 0.0
+
+    def test_concurrent_is_faster_than_serial(self):
+        benchmark = AdvancedModelBenchmark(self.models, concurrency={"openai": 8})
+
+        start = time.perf_counter()
+        benchmark.run_benchmark()
+        serial_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        benchmark.run_benchmark(concurrent=True)
+        concurrent_time = time.perf_counter() - start
+
+        # 8 requests at 0.2s each: ~1.6s in series, ~0.2s all at once
+        assert concurrent_time < serial_time / 2
+
+    def test_concurrency_limit_per_provider(self):
+        benchmark = AdvancedModelBenchmark(self.models, concurrency={"openai": 2})
+        benchmark.run_benchmark(concurrent=True)
+
+        assert self.server.request_count == 8
+        assert self.server.max_in_flight <= 2
+
+    def test_failed_requests_are_counted(self):
+        models = [{"name": "unreachable", "type": "openai", "base_url": "http://127.0.0.1:9/v1"}]
+        benchmark = AdvancedModelBenchmark(models)
+
+        (metrics,) = benchmark.run_benchmark(concurrent=True)
+        assert metrics.error_rate == 100.0
+        assert metrics.task_success_rate == 0.0
+
+    def test_unsupported_model_type_is_counted_as_failed(self):
+        models = [*self.models, {"name": "local", "type": "ollama"}]
+        benchmark = AdvancedModelBenchmark(models)
+        assert "local" not in benchmark.clients
+
+        results = benchmark.run_benchmark(concurrent=True)
+        assert [m.error_rate for m in results] == [0.0, 0.0, 100.0]
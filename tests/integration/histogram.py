@@ -0,0 +1,128 @@
+import os
+import tempfile
+
+import numpy as np
+import pytest
+
+from ml.histogram import LatencyHistogram
+from ml.router import AdaptiveModelSelector
+from tests.integration.benchmark import RESPONSE_PERCENTILE_METRICS, AdvancedModelBenchmark
+from tests.integration.stub import StubOpenAIServer
+
+
+class TestLatencyHistogram:
+    def setup_method(self):
+        self.samples = np.random.default_rng(0).lognormal(mean=6, sigma=1, size=50_000)
+
+    def test_percentiles_within_relative_accuracy(self):
+        histogram = LatencyHistogram(relative_accuracy=0.01)
+        histogram.record_many(self.samples)
+
+        percentiles = [50, 90, 99, 99.9]
+        expected = np.percentile(self.samples, percentiles, method="inverted_cdf")
+        for estimate, actual in zip(histogram.percentiles(percentiles), expected, strict=True):
+            assert estimate == pytest.approx(actual, rel=0.01)
+        assert histogram.percentile(100) == self.samples.max()
+        assert histogram.count == len(self.samples)
+
+    def test_merge_matches_single_histogram(self):
+        whole = LatencyHistogram()
+        whole.record_many(self.samples)
+
+        parts = []
+        for chunk in np.array_split(self.samples, 7):
+            part = LatencyHistogram()
+            part.record_many(chunk)
+            parts.append(part)
+
+        assert LatencyHistogram.merged(parts) == whole
+
+    def test_record_matches_record_many(self):
+        single = LatencyHistogram()
+        for value in self.samples[:1000]:
+            single.record(value)
+        batch = LatencyHistogram()
+        batch.record_many(self.samples[:1000])
+        assert single == batch
+
+    def test_serialization_round_trip(self):
+        histogram = LatencyHistogram()
+        histogram.record_many(self.samples)
+        blob = histogram.to_bytes()
+
+        assert LatencyHistogram.from_bytes(blob) == histogram
+        # Far smaller than the raw samples
+        assert len(blob) < 2048
+
+    def test_empty_and_mismatched(self):
+        empty = LatencyHistogram()
+        assert empty.summary() == {
+            "count": 0,
+            "mean": None,
+            "p50": None,
+            "p90": None,
+            "p99": None,
+            "p999": None,
+            "max": None,
+        }
+        assert LatencyHistogram.from_bytes(empty.to_bytes()) == empty
+        assert LatencyHistogram.merged([]) is None
+        with pytest.raises(ValueError):
+            empty.merge(LatencyHistogram(relative_accuracy=0.02))
+
+
+class TestBenchmarkLatencyHistograms:
+    def setup_method(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+        self.server = StubOpenAIServer(delay=0.05).start()
+        self.models = [{"name": "stub-openai", "type": "openai", "base_url": self.server.base_url}]
+
+    def teardown_method(self):
+        self.server.stop()
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def test_runs_record_and_merge_histograms(self):
+        benchmark = AdvancedModelBenchmark(self.models)
+        (first,) = benchmark.run_benchmark()
+        (second,) = benchmark.run_benchmark()
+
+        assert first.latency_histogram.count == len(benchmark.scenarios)
+        assert 50 <= first.p90_response_time <= first.p99_response_time <= first.max_response_time
+        row = benchmark.conn.execute(
+            f"SELECT {', '.join(RESPONSE_PERCENTILE_METRICS)} FROM model_latest"
+        ).fetchone()
+        assert row == (
+            second.p90_response_time,
+            second.p99_response_time,
+            second.p999_response_time,
+            second.max_response_time,
+        )
+
+        count, p99, high = benchmark.conn.execute(
+            "SELECT count, p99, max FROM model_histograms WHERE model_name = 'stub-openai'"
+        ).fetchone()
+        assert count == 2 * len(benchmark.scenarios)
+        assert high == max(first.max_response_time, second.max_response_time)
+
+        selector = AdaptiveModelSelector("reports/model_performance.db")
+        try:
+            merged = selector._load_latency_histograms()["stub-openai"]
+        finally:
+            selector.close()
+        assert merged == LatencyHistogram.merged(
+            [first.latency_histogram, second.latency_histogram]
+        )
+        assert merged.percentile(99) == p99
+
+    def test_rebuild_merges_stored_histograms(self):
+        benchmark = AdvancedModelBenchmark(self.models)
+        benchmark.run_benchmark()
+        benchmark.run_benchmark()
+        before = benchmark.conn.execute("SELECT * FROM model_histograms").fetchall()
+
+        benchmark._rebuild_model_aggregates()
+        assert benchmark.conn.execute("SELECT * FROM model_histograms").fetchall() == before
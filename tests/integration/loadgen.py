@@ -0,0 +1,307 @@
+import math
+import os
+import random
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+from ml.clients import get_client
+from ml.histogram import LatencyHistogram
+from ml.ratelimit import call_with_retry, get_rate_limiter, is_rate_limited
+from tests.integration.benchmark import API_KEY_ENV_VARS, DEFAULT_BASE_URLS
+
+ARRIVAL_PROCESSES = ("poisson", "constant")
+
+
+@dataclass
+class Stage:
+    """A stretch of the load schedule; the rate ramps linearly from start to end."""
+
+    duration: float
+    rate: float
+    end_rate: float | None = None
+
+    def rate_at(self, elapsed: float) -> float:
+        if self.end_rate is None or self.duration <= 0:
+            return self.rate
+        return self.rate + (self.end_rate - self.rate) * elapsed / self.duration
+
+    @property
+    def peak_rate(self) -> float:
+        return max(self.rate, self.end_rate if self.end_rate is not None else self.rate)
+
+
+@dataclass
+class LoadWindow:
+    """Outcomes of requests that completed within one reporting window."""
+
+    start: float
+    completed: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    def summary(self, length: float) -> dict[str, float | None]:
+        p50, p90, p99 = self.latency.percentiles([50, 90, 99])
+        return {
+            "start": self.start,
+            "throughput": self.completed / length,
+            "completed": self.completed,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "p50_latency": p50,
+            "p90_latency": p90,
+            "p99_latency": p99,
+        }
+
+
+@dataclass
+class LoadReport:
+    duration: float
+    window: float
+    sent: int
+    completed: int
+    errors: int
+    rate_limited: int
+    max_in_flight: int
+    latency: LatencyHistogram
+    service_time: LatencyHistogram
+    windows: list[LoadWindow]
+
+    @property
+    def throughput(self) -> float:
+        """Successful requests per second over the whole run."""
+        return self.completed / self.duration if self.duration else 0.0
+
+    @property
+    def offered_rate(self) -> float:
+        """Requests per second the schedule actually issued."""
+        return self.sent / self.duration if self.duration else 0.0
+
+    def timeline(self) -> list[dict[str, float | None]]:
+        """Throughput, failures and latency percentiles per reporting window."""
+        return [window.summary(self.window) for window in self.windows]
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "duration": self.duration,
+            "sent": self.sent,
+            "completed": self.completed,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "offered_rate": self.offered_rate,
+            "throughput": self.throughput,
+            "max_in_flight": self.max_in_flight,
+            "latency": self.latency.summary(),
+            "service_time": self.service_time.summary(),
+        }
+
+
+def chat_request(
+    model_config: dict[str, Any],
+    prompt: str = "Short test prompt",
+    max_tokens: int = 200,
+    adaptive: bool = False,
+) -> Callable[[], Any]:
+    """
+    Build a callable that sends one chat request to a configured model.
+
+    SDK retries are disabled so every 429 reaches the load generator, unless
+    ``adaptive`` routes requests through the provider's shared rate limiter
+    and retry policy, as the benchmark does.
+
+    :param model_config: Model entry as in ``config/benchmark.yaml``
+    :param prompt: User message sent on every request
+    :param max_tokens: Completion token limit
+    :param adaptive: Pace and retry requests with ``ml.ratelimit``
+    """
+    model_type = model_config["type"]
+    model_name = model_config["name"]
+    if model_type not in API_KEY_ENV_VARS:
+        raise ValueError(f"Unsupported model type {model_type!r} for {model_name}")
+    client = get_client(
+        model_type,
+        base_url=model_config.get("base_url", DEFAULT_BASE_URLS.get(model_type)),
+        api_key=os.getenv(API_KEY_ENV_VARS[model_type]),
+        max_retries=0,
+    )
+    messages = [{"role": "user", "content": prompt}]
+
+    if model_type in ("openai", "deepseek"):
+
+        def send():
+            return client.chat.completions.create(
+                model=model_name, messages=messages, max_tokens=max_tokens
+            )
+
+    elif model_type == "anthropic":
+
+        def send():
+            return client.messages.create(
+                model=model_name, messages=messages, max_tokens=max_tokens
+            )
+
+    else:
+        model = client.GenerativeModel(model_name)
+
+        def send():
+            return model.generate_content(prompt)
+
+    if adaptive:
+        limiter = get_rate_limiter(model_type)
+        return lambda: call_with_retry(send, limiter=limiter)
+    return send
+
+
+class LoadGenerator:
+    """
+    Open-loop load generator: requests are issued on an arrival schedule,
+    independent of how quickly earlier ones complete.
+
+    At most ``max_concurrency`` requests are in flight; arrivals beyond that
+    wait for a free slot. Latency is measured from the scheduled arrival, so
+    queueing under overload shows up in the percentiles rather than being
+    hidden by a slowed-down sender. Service time excludes that wait.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[], Any],
+        schedule: list[Stage],
+        arrival: str = "poisson",
+        max_concurrency: int = 32,
+        window: float = 1.0,
+        seed: int | None = None,
+    ):
+        """
+        :param send: Issues one request; raising marks it failed
+        :param schedule: Stages run back to back, e.g. a ramp then a plateau
+        :param arrival: ``poisson`` for exponential inter-arrival times or
+            ``constant`` for evenly spaced requests
+        :param max_concurrency: Maximum requests in flight at once
+        :param window: Reporting window length in seconds
+        :param seed: Random seed for reproducible Poisson arrivals
+        """
+        if arrival not in ARRIVAL_PROCESSES:
+            raise ValueError(f"arrival must be one of {ARRIVAL_PROCESSES}, got {arrival!r}")
+        self.send = send
+        self.schedule = schedule
+        self.arrival = arrival
+        self.max_concurrency = max_concurrency
+        self.window = window
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._max_in_flight = 0
+
+    @property
+    def duration(self) -> float:
+        return sum(stage.duration for stage in self.schedule)
+
+    def arrival_times(self) -> list[float]:
+        """Offsets in seconds from the start of the run at which requests are issued."""
+        times = []
+        offset = 0.0
+        for stage in self.schedule:
+            if self.arrival == "constant":
+                times.extend(offset + t for t in self._constant_arrivals(stage))
+            else:
+                times.extend(offset + t for t in self._poisson_arrivals(stage))
+            offset += stage.duration
+        return times
+
+    def _constant_arrivals(self, stage: Stage) -> list[float]:
+        # Request k goes out once the integral of the rate over the stage reaches k
+        slope = stage.rate_at(stage.duration) - stage.rate
+        slope = slope / stage.duration if stage.duration > 0 else 0.0
+        expected = stage.rate * stage.duration + slope * stage.duration**2 / 2
+        times = []
+        for k in range(math.ceil(expected - 1e-9)):
+            if slope:
+                times.append((math.sqrt(stage.rate**2 + 2 * slope * k) - stage.rate) / slope)
+            else:
+                times.append(k / stage.rate)
+        return times
+
+    def _poisson_arrivals(self, stage: Stage) -> list[float]:
+        # Thinning: candidates at the peak rate, kept with probability rate(t) / peak
+        peak = stage.peak_rate
+        times = []
+        if peak <= 0:
+            return times
+        t = self._random.expovariate(peak)
+        while t < stage.duration:
+            if self._random.random() * peak <= stage.rate_at(t):
+                times.append(t)
+            t += self._random.expovariate(peak)
+        return times
+
+    def _issue(self, start: float, scheduled: float):
+        with self._lock:
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+        began = time.perf_counter()
+        try:
+            self.send()
+            outcome = "ok"
+        except Exception as e:
+            outcome = "rate_limited" if is_rate_limited(e) else "error"
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        finished = time.perf_counter()
+        return (
+            finished - start,
+            (finished - scheduled) * 1000,
+            (finished - began) * 1000,
+            outcome,
+        )
+
+    def run(self) -> LoadReport:
+        """Drive the schedule to completion and collect the results."""
+        arrivals = self.arrival_times()
+        self._max_in_flight = 0
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            start = time.perf_counter()
+            for offset in arrivals:
+                delay = start + offset - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(self._issue, start, start + offset))
+        duration = max(time.perf_counter() - start, self.duration)
+
+        latency = LatencyHistogram()
+        service_time = LatencyHistogram()
+        windows: dict[int, LoadWindow] = {}
+        counts = {"ok": 0, "error": 0, "rate_limited": 0}
+        for future in futures:
+            completed_at, latency_ms, service_ms, outcome = future.result()
+            counts[outcome] += 1
+            index = int(completed_at // self.window)
+            bucket = windows.setdefault(index, LoadWindow(start=index * self.window))
+            if outcome == "ok":
+                latency.record(latency_ms)
+                service_time.record(service_ms)
+                bucket.completed += 1
+                bucket.latency.record(latency_ms)
+            elif outcome == "rate_limited":
+                bucket.rate_limited += 1
+            else:
+                bucket.errors += 1
+
+        return LoadReport(
+            duration=duration,
+            window=self.window,
+            sent=len(arrivals),
+            completed=counts["ok"],
+            errors=counts["error"],
+            rate_limited=counts["rate_limited"],
+            max_in_flight=self._max_in_flight,
+            latency=latency,
+            service_time=service_time,
+            windows=[windows[index] for index in sorted(windows)],
+        )
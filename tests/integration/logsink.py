@@ -0,0 +1,125 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+from ml.logsink import BufferedLogSink, get_log_sink
+
+
+class TestBufferedLogSink:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "logs", "events.jsonl")
+        self.sinks = []
+
+    def teardown_method(self):
+        for sink in self.sinks:
+            sink.close()
+        self.temp_dir.cleanup()
+
+    def _sink(self, **options):
+        sink = BufferedLogSink(self.path, **options)
+        self.sinks.append(sink)
+        return sink
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def _wait_for(self, condition, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_writes_are_buffered_until_flush(self):
+        sink = self._sink(flush_interval=60)
+        sink.write({"n": 1})
+        sink.write({"n": 2})
+        assert self._read() == []
+
+        sink.flush()
+        assert self._read() == [{"n": 1}, {"n": 2}]
+        assert sink.stats() == {"pending": 0, "written": 2, "dropped": 0, "flushes": 1}
+
+    def test_flush_on_size(self):
+        sink = self._sink(flush_size=10, flush_interval=60)
+        for n in range(10):
+            sink.write({"n": n})
+        assert self._wait_for(lambda: len(self._read()) == 10)
+
+    def test_flush_on_interval(self):
+        sink = self._sink(flush_interval=0.05)
+        sink.write({"n": 1})
+        assert self._wait_for(lambda: self._read() == [{"n": 1}])
+
+    def test_overflow_drops_oldest_and_counts(self):
+        sink = self._sink(capacity=3, flush_interval=60)
+        for n in range(5):
+            sink.write({"n": n})
+        sink.flush()
+
+        assert self._read() == [{"n": 2}, {"n": 3}, {"n": 4}]
+        assert sink.dropped == 2
+
+    def test_batch_entries(self):
+        sink = self._sink(flush_interval=60)
+        sink.write({"n": 0})
+        sink.write_batch(lambda: '{"n": 1}\n{"n": 2}\n', 2)
+        sink.flush()
+
+        assert self._read() == [{"n": 0}, {"n": 1}, {"n": 2}]
+        assert sink.written == 3
+
+    def test_failing_render_is_dropped_and_sink_keeps_running(self):
+        sink = self._sink(flush_size=1, flush_interval=60)
+        sink.write_batch(lambda: {}["missing"], 2)
+        sink.write({"n": 1})
+        assert self._wait_for(lambda: self._read() == [{"n": 1}])
+        assert sink._thread.is_alive()
+
+        sink.write({"n": 2})
+        assert self._wait_for(lambda: self._read() == [{"n": 1}, {"n": 2}])
+        assert sink.stats() == {"pending": 0, "written": 2, "dropped": 2, "flushes": 2}
+
+    def test_fsync_always_writes_synchronously(self):
+        sink = self._sink(fsync="always", flush_interval=60)
+        sink.write({"n": 1})
+        assert self._read() == [{"n": 1}]
+
+    def test_invalid_fsync_policy(self):
+        with pytest.raises(ValueError):
+            BufferedLogSink(self.path, fsync="sometimes")
+
+    def test_close_flushes_and_rejects_writes(self):
+        sink = self._sink(flush_interval=60)
+        sink.write({"n": 1})
+        sink.close()
+
+        assert self._read() == [{"n": 1}]
+        with pytest.raises(ValueError):
+            sink.write({"n": 2})
+
+    def test_shared_sink_per_path(self):
+        sink = get_log_sink(self.path)
+        self.sinks.append(sink)
+        assert get_log_sink(self.path) is sink
+
+        sink.close()
+        assert get_log_sink(self.path) is not sink
+
+    def test_flush_on_process_exit(self):
+        root = Path(__file__).parent.parent.parent
+        script = (
+            "from ml.logsink import get_log_sink\n"
+            f"get_log_sink({self.path!r}, flush_interval=60).write({{'n': 1}})\n"
+        )
+        subprocess.run([sys.executable, "-c", script], cwd=root, check=True)
+        assert self._read() == [{"n": 1}]
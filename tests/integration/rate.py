@@ -5,7 +5,11 @@ import time
 
 import pytest
 from dotenv import load_dotenv
-from openai import OpenAI
+
+from ml.clients import get_client
+from ml.ratelimit import call_with_retry, get_rate_limiter
+from tests.integration.loadgen import LoadGenerator, Stage, chat_request
+from tests.integration.stub import StubOpenAIServer
 
 # Load environment variables
 load_dotenv()
@@ -13,11 +17,16 @@ load_dotenv()
 
 class TestDeepSeekPerformanceAndRateLimiting:
     def setup_method(self):
-        """Initialize OpenAI client with NVIDIA endpoint"""
+        """Reuse the shared client for the NVIDIA endpoint"""
         api_key = os.getenv("NVIDIA_API_KEY")
         if not api_key:
             pytest.skip("NVIDIA_API_KEY not set")
-        self.client = OpenAI(api_key=api_key, base_url="https://integrate.api.nvidia.com/v1")
+        self.client = get_client(
+            "deepseek",
+            base_url="https://integrate.api.nvidia.com/v1",
+            api_key=api_key,
+            max_retries=0,
+        )
 
         # Performance thresholds
         self.PERFORMANCE_THRESHOLDS = {
@@ -29,12 +38,20 @@ class TestDeepSeekPerformanceAndRateLimiting:
 
     def generate_response(self, prompt):
         """Generate response and measure performance"""
-        start_time = time.time()
-        response = self.client.chat.completions.create(
-            model="deepseek-ai/deepseek-r1",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=200,
-        )
+        start_time = None
+
+        def attempt():
+            # Each attempt restarts the clock, so pacing and retry backoff are left out
+            nonlocal start_time
+            start_time = time.time()
+            return self.client.chat.completions.create(
+                model="deepseek-ai/deepseek-r1",
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=200,
+            )
+
+        # Paced and retried by the limiter shared with the benchmark
+        response = call_with_retry(attempt, limiter=get_rate_limiter("deepseek"))
         end_time = time.time()
 
         return {
@@ -138,5 +155,79 @@ class TestDeepSeekPerformanceAndRateLimiting:
         ), f"Token generation rate too high: {tokens_per_second} tokens/second"
 
 
+class TestOpenLoopLoadGenerator:
+    """Capacity tests against the local stub server; no API key needed"""
+
+    def setup_method(self):
+        os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+        self.servers = []
+
+    def teardown_method(self):
+        for server in self.servers:
+            server.stop()
+
+    def _model(self, **stub_options):
+        server = StubOpenAIServer(**stub_options).start()
+        self.servers.append(server)
+        return server, {"name": "stub", "type": "openai", "base_url": server.base_url}
+
+    def test_constant_arrivals_follow_ramp(self):
+        generator = LoadGenerator(
+            lambda: None, [Stage(1.0, rate=10), Stage(1.0, rate=10, end_rate=30)], "constant"
+        )
+        arrivals = generator.arrival_times()
+        assert sum(t < 1 for t in arrivals) == 10
+        # Mean rate of 20/s over the ramp, denser at the end
+        assert 18 <= sum(t >= 1 for t in arrivals) <= 22
+        gaps = [b - a for a, b in zip(arrivals, arrivals[1:], strict=False)]
+        assert gaps[-1] < gaps[10]
+
+    def test_poisson_arrivals_match_rate(self):
+        generator = LoadGenerator(lambda: None, [Stage(100.0, rate=50)], "poisson", seed=1)
+        arrivals = generator.arrival_times()
+        assert 4700 < len(arrivals) < 5300
+        assert (
+            arrivals == LoadGenerator(lambda: None, [Stage(100.0, rate=50)], seed=1).arrival_times()
+        )
+
+    def test_achieves_target_rate(self):
+        server, model = self._model(delay=0.01)
+        report = LoadGenerator(chat_request(model), [Stage(1.0, rate=40)], "constant").run()
+
+        assert report.sent == 40
+        assert report.completed == 40
+        assert report.errors == report.rate_limited == 0
+        assert report.throughput == pytest.approx(40, rel=0.2)
+        assert report.service_time.percentile(50) >= 10
+        assert server.request_count == 40
+
+    def test_concurrency_cap_queues_arrivals(self):
+        server, model = self._model(delay=0.1)
+        report = LoadGenerator(
+            chat_request(model), [Stage(0.5, rate=40)], "constant", max_concurrency=2
+        ).run()
+
+        assert report.completed == 20
+        assert server.max_in_flight <= 2
+        assert report.max_in_flight <= 2
+        # Open loop: queueing behind the cap counts towards latency
+        assert report.latency.percentile(99) > 3 * report.service_time.percentile(99)
+
+    def test_rate_limits_are_counted(self):
+        server, model = self._model(rate_limit=10)
+        report = LoadGenerator(
+            chat_request(model), [Stage(1.0, rate=40)], "constant", window=0.5
+        ).run()
+
+        assert report.rate_limited == server.rate_limited_count > 0
+        assert report.completed == server.request_count
+        assert report.completed + report.rate_limited == report.sent
+        assert report.throughput < 25
+        timeline = report.timeline()
+        assert len(timeline) >= 2
+        assert sum(w["rate_limited"] for w in timeline) == report.rate_limited
+        assert timeline[0]["p50_latency"] is not None
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
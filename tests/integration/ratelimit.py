@@ -0,0 +1,230 @@
+import os
+import sqlite3
+import tempfile
+import time
+
+import openai
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from ml.clients import get_client
+from ml.ratelimit import (
+    AdaptiveRateLimiter,
+    RetryPolicy,
+    call_with_retry,
+    configure_rate_limits,
+    get_rate_limiter,
+    is_rate_limited,
+    is_retryable,
+    retry_after,
+)
+from ml.router import AdaptiveModelSelector
+from tests.integration.benchmark import AdvancedModelBenchmark
+from tests.integration.stub import StubOpenAIServer
+
+
+class TestAdaptiveRateLimiter:
+    def test_bucket_paces_requests(self):
+        limiter = AdaptiveRateLimiter(rate=20, burst=1, increase=0)
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+        # One token up front, then 5 more at 20/s
+        assert 0.2 <= time.monotonic() - start < 0.5
+
+    def test_additive_increase_multiplicative_decrease(self):
+        limiter = AdaptiveRateLimiter(rate=10, min_rate=4, max_rate=12, increase=1, cooldown=60)
+        for _ in range(10):
+            limiter.on_success()
+        assert limiter.rate == pytest.approx(10.95, abs=0.01)
+
+        limiter.on_rate_limited()
+        assert limiter.rate == pytest.approx(5.48, abs=0.01)
+        # Further 429s within the cooldown answer the old rate
+        limiter.on_rate_limited()
+        assert limiter.rate == pytest.approx(5.48, abs=0.01)
+        assert limiter.rate_limited == 2
+
+        limiter.cooldown = 0
+        limiter.on_rate_limited()
+        assert limiter.rate == 4
+        for _ in range(1000):
+            limiter.on_success()
+        assert limiter.rate == 12
+
+    def test_retry_after_pauses_bucket(self):
+        limiter = AdaptiveRateLimiter(rate=100)
+        limiter.on_rate_limited(retry_after=0.2)
+        assert limiter.throttled
+        assert limiter.acquire() >= 0.15
+        assert not limiter.throttled
+
+    def test_retry_policy_backoff(self):
+        policy = RetryPolicy(base_delay=0.1, max_delay=1.0)
+        for attempt in range(8):
+            assert 0 <= policy.delay(attempt) <= min(1.0, 0.1 * 2**attempt)
+        assert policy.delay(0, retry_after=2.0) == 2.0
+
+    def test_invalid_options(self):
+        with pytest.raises(ValueError):
+            AdaptiveRateLimiter(rate=0)
+        with pytest.raises(ValueError):
+            AdaptiveRateLimiter(decrease=1.5)
+
+
+class TestRetryScheduling:
+    def setup_method(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+        # Fresh shared limiters for every test
+        configure_rate_limits({"openai": {"rate": 10.0}})
+        self.server = StubOpenAIServer(rate_limit=2).start()
+        self.client = get_client("openai", self.server.base_url, "stub-key", max_retries=0)
+
+    def teardown_method(self):
+        configure_rate_limits({"openai": {"rate": 10.0}})
+        self.server.stop()
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def _complete(self):
+        return self.client.chat.completions.create(
+            model="stub", messages=[{"role": "user", "content": "hi"}]
+        )
+
+    def test_rate_limit_errors_carry_retry_after(self):
+        self._complete()
+        self._complete()
+        with pytest.raises(openai.RateLimitError) as e:
+            self._complete()
+        assert is_retryable(e.value)
+        assert 0 < retry_after(e.value) <= 0.5
+        assert not is_retryable(ValueError("bad request"))
+
+    def test_google_errors_are_classified_by_code(self):
+        assert is_rate_limited(google_exceptions.ResourceExhausted("quota exceeded"))
+        assert is_retryable(google_exceptions.ResourceExhausted("quota exceeded"))
+        assert is_retryable(google_exceptions.ServiceUnavailable("unavailable"))
+        assert not is_rate_limited(google_exceptions.ServiceUnavailable("unavailable"))
+        assert not is_retryable(google_exceptions.InvalidArgument("bad request"))
+
+        responses = iter([google_exceptions.ResourceExhausted("quota exceeded"), "ok"])
+
+        def complete():
+            response = next(responses)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        limiter = AdaptiveRateLimiter(rate=10)
+        result = call_with_retry(complete, limiter=limiter, policy=RetryPolicy(base_delay=0.01))
+        assert result == "ok"
+        assert limiter.rate_limited == 1
+        assert limiter.rate < 10
+
+    def test_retries_through_rate_limits(self):
+        limiter = AdaptiveRateLimiter(rate=10)
+        results = [call_with_retry(self._complete, limiter=limiter) for _ in range(6)]
+
+        assert len(results) == 6
+        assert self.server.request_count == 6
+        assert self.server.rate_limited_count >= 1
+        assert limiter.rate_limited == self.server.rate_limited_count
+        assert limiter.rate < 10
+
+    def test_non_retryable_errors_raise_immediately(self):
+        calls = []
+
+        def fail():
+            calls.append(1)
+            raise ValueError("bad request")
+
+        with pytest.raises(ValueError):
+            call_with_retry(fail, policy=RetryPolicy(max_retries=3))
+        assert len(calls) == 1
+
+    def test_retries_are_bounded(self):
+        calls = []
+
+        def fail():
+            calls.append(1)
+            raise openai.APIConnectionError(request=None)
+
+        with pytest.raises(openai.APIConnectionError):
+            call_with_retry(fail, policy=RetryPolicy(max_retries=2, base_delay=0.01))
+        assert len(calls) == 3
+
+    def test_benchmark_survives_provider_rate_limit(self):
+        models = [{"name": "stub-openai", "type": "openai", "base_url": self.server.base_url}]
+        benchmark = AdvancedModelBenchmark(models)
+        (metrics,) = benchmark.run_benchmark()
+
+        assert metrics.error_rate == 0.0
+        assert self.server.rate_limited_count >= 1
+        assert get_rate_limiter("openai").rate_limited == self.server.rate_limited_count
+        # Waiting out the 429 is not counted as response time
+        assert metrics.max_response_time < 250
+
+    def test_failed_request_latency_excludes_backoff(self, monkeypatch):
+        monkeypatch.setattr(RetryPolicy, "delay", lambda self, attempt, retry_after=None: 0.2)
+        configure_rate_limits(retry={"max_retries": 2})
+        try:
+            models = [{"name": "down", "type": "openai", "base_url": "http://127.0.0.1:9/v1"}]
+            benchmark = AdvancedModelBenchmark(models, database=False)
+            start = time.time()
+            result = benchmark._evaluate_model("down", {"name": "s", "prompt": "hi"})
+            elapsed_ms = (time.time() - start) * 1000
+        finally:
+            configure_rate_limits(retry={})
+
+        assert result["error_count"] == 1
+        (response_time,) = result["response_times"]
+        # Two backoff sleeps of 0.2s each are left out
+        assert response_time < elapsed_ms - 300
+        assert result["samples"][0][2] == response_time
+
+
+class TestRateLimitAwareRouting:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(self.temp_dir.name, "performance.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("""
+            CREATE TABLE performance_metrics (
+                timestamp TEXT, model_name TEXT, avg_response_time REAL,
+                avg_token_generation_rate REAL, task_success_rate REAL, error_rate REAL
+            )
+        """)
+        conn.executemany(
+            "INSERT INTO performance_metrics VALUES ('2024-01-01', ?, ?, ?, ?, ?)",
+            [
+                ("gpt-4o", 1000, 90, 99, 1),
+                ("deepseek-r1", 1500, 40, 85, 15),
+                ("claude-3-5-sonnet-20241022", 1100, 70, 92, 8),
+                ("gemini-2.0-flash-exp", 1300, 45, 88, 12),
+            ],
+        )
+        conn.commit()
+        conn.close()
+        self.selector = AdaptiveModelSelector(
+            db_path, selection_log_path=os.path.join(self.temp_dir.name, "selection.jsonl")
+        )
+
+    def teardown_method(self):
+        self.selector.selection_log.close()
+        self.selector.close()
+        configure_rate_limits({"openai": {"rate": 10.0}})
+        self.temp_dir.cleanup()
+
+    def test_routes_around_throttled_provider(self):
+        configure_rate_limits({"openai": {"rate": 10.0}})
+        assert self.selector.select_optimal_model("task") == "gpt-4o"
+
+        get_rate_limiter("openai").on_rate_limited(retry_after=30)
+        assert self.selector.select_optimal_model("task") == "claude-3-5-sonnet-20241022"
+        assert (
+            self.selector.select_optimal_models([{"description": "task"}] * 2)
+            == ["claude-3-5-sonnet-20241022"] * 2
+        )
@@ -0,0 +1,189 @@
+import os
+import sqlite3
+import tempfile
+from datetime import datetime
+
+import pytest
+
+from ml.archive import export_history
+from ml.histogram import LatencyHistogram
+from ml.rollups import RetentionPolicy, compact_history, load_trends
+from ml.router import AdaptiveModelSelector
+from tests.integration.benchmark import AdvancedModelBenchmark, ModelPerformanceMetrics
+
+
+class TestRollups:
+    def setup_method(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        self.benchmark = AdvancedModelBenchmark([])
+        self.db_path = os.path.join(self.temp_dir.name, "reports", "model_performance.db")
+
+    def teardown_method(self):
+        self.benchmark.conn.close()
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def _log(self, timestamp, response_time, model_name="gpt-4o"):
+        histogram = LatencyHistogram()
+        histogram.record_many([response_time] * 4)
+        self.benchmark._log_performance_to_database(
+            ModelPerformanceMetrics(
+                timestamp=timestamp,
+                model_name=model_name,
+                total_queries=4,
+                avg_response_time=response_time,
+                median_response_time=response_time,
+                avg_token_generation_rate=50.0,
+                task_success_rate=100.0,
+                error_rate=0.0,
+                total_execution_time=response_time * 4,
+                latency_histogram=histogram,
+            )
+        )
+
+    def _rollup(self, resolution, bucket_start, metric="avg_response_time"):
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute(
+            "SELECT count, sum / count, min, max FROM metric_rollups "
+            "WHERE resolution = ? AND bucket_start = ? AND model_name = 'gpt-4o' AND metric = ?",
+            (resolution, bucket_start, metric),
+        ).fetchone()
+        conn.close()
+        return row
+
+    def test_rows_roll_up_into_every_resolution(self):
+        self._log("2024-01-01T12:00:05", 1000.0)
+        self._log("2024-01-01T12:00:40", 2000.0)
+        self._log("2024-01-01T12:30:00", 3000.0)
+        self._log("2024-01-02T08:00:00", 4000.0)
+
+        result = compact_history(
+            self.db_path, RetentionPolicy(raw_days=None), now=datetime(2024, 1, 3)
+        )
+        assert result == {"rolled_up": 4, "minute": 0, "hour": 0}
+        assert self._rollup("minute", "2024-01-01T12:00") == (2, 1500.0, 1000.0, 2000.0)
+        assert self._rollup("hour", "2024-01-01T12:00") == (3, 2000.0, 1000.0, 3000.0)
+        assert self._rollup("day", "2024-01-01T00:00") == (3, 2000.0, 1000.0, 3000.0)
+        assert self._rollup("day", "2024-01-02T00:00") == (1, 4000.0, 4000.0, 4000.0)
+
+        conn = sqlite3.connect(self.db_path)
+        (blob,) = conn.execute(
+            "SELECT histogram FROM latency_rollups "
+            "WHERE resolution = 'hour' AND bucket_start = '2024-01-01T12:00'"
+        ).fetchone()
+        conn.close()
+        histogram = LatencyHistogram.from_bytes(blob)
+        assert histogram.count == 12
+        assert histogram.max == pytest.approx(3000.0, rel=0.01)
+
+        # Compaction is incremental: a second run adds nothing twice
+        self._log("2024-01-01T12:00:50", 3000.0)
+        result = compact_history(
+            self.db_path, RetentionPolicy(raw_days=None), now=datetime(2024, 1, 3)
+        )
+        assert result["rolled_up"] == 1
+        assert self._rollup("minute", "2024-01-01T12:00") == (3, 2000.0, 1000.0, 3000.0)
+
+    def test_retention_deletes_only_rolled_up_history(self):
+        self._log("2024-01-01T12:00:00", 1000.0)
+        self._log("2024-01-19T12:00:00", 2000.0)
+        export_history(self.db_path)
+
+        policy = RetentionPolicy(raw_days=7, minute_days=10, hour_days=None)
+        result = compact_history(self.db_path, policy, now=datetime(2024, 1, 20))
+        assert result == {"rolled_up": 2, "raw": 1, "unarchived": 0, "minute": 7}
+
+        conn = sqlite3.connect(self.db_path)
+        assert conn.execute("SELECT timestamp FROM performance_metrics").fetchall() == [
+            ("2024-01-19T12:00:00",)
+        ]
+        assert conn.execute("SELECT COUNT(*) FROM latency_histograms").fetchone() == (1,)
+        conn.close()
+        assert self._rollup("minute", "2024-01-01T12:00") is None
+        assert self._rollup("hour", "2024-01-01T12:00") == (1, 1000.0, 1000.0, 1000.0)
+        # Latest-per-model summaries are untouched
+        assert self.benchmark.conn.execute(
+            "SELECT avg_response_time FROM model_latest WHERE model_name = 'gpt-4o'"
+        ).fetchone() == (2000.0,)
+
+    def test_retention_keeps_rows_not_yet_archived(self):
+        policy = RetentionPolicy(raw_days=7)
+        now = datetime(2024, 1, 20)
+        self._log("2024-01-01T12:00:00", 1000.0)
+        export_history(self.db_path)
+        self._log("2024-01-02T12:00:00", 2000.0)
+
+        result = compact_history(self.db_path, policy, now=now)
+        assert (result["raw"], result["unarchived"]) == (1, 1)
+        assert self.benchmark.conn.execute(
+            "SELECT timestamp FROM performance_metrics"
+        ).fetchall() == [("2024-01-02T12:00:00",)]
+
+        export_history(self.db_path)
+        result = compact_history(self.db_path, policy, now=now)
+        assert (result["raw"], result["unarchived"]) == (1, 0)
+
+        # Without an archive to check, expired rows go once rolled up
+        self._log("2024-01-03T12:00:00", 3000.0)
+        result = compact_history(self.db_path, policy, now=now, archive_dir=None)
+        assert (result["raw"], result["unarchived"]) == (1, 0)
+
+    def test_trends_read_the_coarsest_level_that_fits(self):
+        conn = self.benchmark.conn
+        self._log("2024-01-01T12:00:00", 1000.0)
+        self._log("2024-01-01T12:10:00", 2000.0)
+        self._log("2024-01-03T12:00:00", 3000.0)
+
+        # Until compaction there is only raw data
+        level, rows = load_trends(conn, ["avg_response_time"])
+        assert level == "raw"
+        assert [row["avg_response_time"] for row in rows] == [1000.0, 2000.0, 3000.0]
+        # Too many rows for the points asked: days are averaged from the raw rows
+        level, rows = load_trends(conn, ["avg_response_time"], max_points=2)
+        assert level == "day"
+        assert [(r["bucket_start"], r["avg_response_time"]) for r in rows] == [
+            ("2024-01-01T00:00", 1500.0),
+            ("2024-01-03T00:00", 3000.0),
+        ]
+
+        compact_history(self.db_path, RetentionPolicy(raw_days=None))
+        assert load_trends(conn, ["avg_response_time"])[0] == "raw"
+        # More rows than points: two days in at most two points needs day buckets
+        level, rows = load_trends(conn, ["avg_response_time"], max_points=2)
+        assert level == "day"
+        assert [(r["bucket_start"], r["avg_response_time"]) for r in rows] == [
+            ("2024-01-01T00:00", 1500.0),
+            ("2024-01-03T00:00", 3000.0),
+        ]
+
+        # Rows written after the last compaction are merged into their bucket
+        self._log("2024-01-03T13:00:00", 5000.0)
+        level, rows = AdaptiveModelSelector(self.db_path).performance_trends(
+            ["avg_response_time", "task_success_rate"], max_points=2
+        )
+        assert level == "day"
+        assert rows[-1] == {
+            "bucket_start": "2024-01-03T00:00",
+            "model_name": "gpt-4o",
+            "avg_response_time": 4000.0,
+            "task_success_rate": 100.0,
+        }
+
+    def test_trends_skip_levels_deleted_by_retention(self):
+        self._log("2024-01-01T12:00:00", 1000.0)
+        self._log("2024-01-19T12:00:00", 2000.0)
+        compact_history(
+            self.db_path,
+            RetentionPolicy(raw_days=7, minute_days=10, hour_days=None),
+            now=datetime(2024, 1, 20),
+            archive_dir=None,
+        )
+
+        conn = self.benchmark.conn
+        level, rows = load_trends(conn, ["avg_response_time"], start="2024-01-01T00:00:00")
+        assert level == "hour"
+        assert [row["avg_response_time"] for row in rows] == [1000.0, 2000.0]
+        # Recent ranges are still read from raw rows
+        assert load_trends(conn, ["avg_response_time"], start="2024-01-19T00:00:00")[0] == "raw"
@@ -1,9 +1,8 @@
+import json
 import os
 import sqlite3
 import tempfile
-from unittest.mock import MagicMock, patch
-
-import pandas as pd
+from unittest.mock import patch
 
 from ml.router import AdaptiveModelSelector
 
@@ -15,8 +14,31 @@ class TestAdaptiveModelSelector:
         self.selector = AdaptiveModelSelector(self.temp_db.name)
 
     def teardown_method(self):
+        self.selector.close()
         os.unlink(self.temp_db.name)
 
+    def _insert_metrics(self, rows):
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS performance_metrics (
+                timestamp TEXT, model_name TEXT, total_queries INTEGER,
+                avg_response_time REAL, median_response_time REAL,
+                avg_token_generation_rate REAL, task_success_rate REAL,
+                error_rate REAL, total_execution_time REAL
+            )
+        """)
+        conn.executemany(
+            """
+            INSERT INTO performance_metrics (
+                timestamp, model_name, avg_response_time, avg_token_generation_rate,
+                task_success_rate, error_rate
+            ) VALUES ('2024-01-01', ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+        conn.commit()
+        conn.close()
+
     def test_init(self):
         assert len(self.selector.models) == 4
         assert "gpt-4o" in self.selector.models
@@ -68,40 +90,84 @@ class TestAdaptiveModelSelector:
             assert model == "gpt-4o"
 
     def test_select_optimal_model_with_data(self):
-        # Create mock historical data
-        mock_df = pd.DataFrame(
-            {
-                "model_name": [
-                    "gpt-4o",
-                    "deepseek-r1",
-                    "gpt-4o",
-                    "claude-3-5-sonnet-20241022",
-                    "gemini-2.0-flash-exp",
-                ],
-                "avg_response_time": [1000, 1500, 1200, 1100, 1300],
-                "avg_token_generation_rate": [60, 40, 55, 50, 45],
-                "task_success_rate": [95, 85, 90, 92, 88],
-                "error_rate": [5, 15, 10, 8, 12],
-            }
+        self._insert_metrics(
+            [
+                ("gpt-4o", 1000, 60, 95, 5),
+                ("deepseek-r1", 1500, 40, 85, 15),
+                ("gpt-4o", 1200, 55, 90, 10),
+                ("claude-3-5-sonnet-20241022", 1100, 50, 92, 8),
+                ("gemini-2.0-flash-exp", 1300, 45, 88, 12),
+            ]
         )
 
-        with patch.object(self.selector, "_load_historical_performance", return_value=mock_df):
+        with patch.object(self.selector, "_log_model_selection"):
             model = self.selector.select_optimal_model("test task", "medium")
-            assert model in self.selector.models
-
-    @patch("builtins.open")
-    @patch("os.makedirs")
-    def test_log_model_selection(self, mock_makedirs, mock_open):
-        mock_file = MagicMock()
-        mock_open.return_value.__enter__.return_value = mock_file
-
-        self.selector._log_model_selection("gpt-4o", "test task", "medium")
+        assert model in self.selector.models
+
+    def test_latest_performance_snapshot_uses_last_row_per_model(self):
+        self._insert_metrics(
+            [
+                ("gpt-4o", 1000, 60, 95, 5),
+                ("deepseek-r1", 1500, 40, 85, 15),
+                ("gpt-4o", 1200, 55, 90, 10),
+            ]
+        )
 
-        mock_open.assert_called_once()
-        mock_file.write.assert_called_once()
-        written_data = mock_file.write.call_args[0][0]
-        assert "gpt-4o" in written_data
-        assert "test task" in written_data
+        snapshot = self.selector._latest_performance_snapshot()
+        assert set(snapshot) == {"gpt-4o", "deepseek-r1"}
+        assert snapshot["gpt-4o"]["avg_response_time"] == 1200
+
+    def test_latest_performance_snapshot_is_cached(self):
+        self._insert_metrics([("gpt-4o", 1000, 60, 95, 5)])
+        self.selector.snapshot_ttl = 60
+
+        first = self.selector._latest_performance_snapshot()
+        with patch.object(self.selector, "_load_latest_performance") as mock_load:
+            second = self.selector._latest_performance_snapshot()
+            mock_load.assert_not_called()
+        assert second is first
+
+    def test_latest_performance_snapshot_reloads_on_change(self):
+        self._insert_metrics([("gpt-4o", 1000, 60, 95, 5)])
+        self.selector.snapshot_ttl = 0
+
+        first = self.selector._latest_performance_snapshot()
+        # Unchanged database: the data version matches, so nothing is reloaded
+        with patch.object(self.selector, "_load_latest_performance") as mock_load:
+            self.selector._latest_performance_snapshot()
+            mock_load.assert_not_called()
+
+        self._insert_metrics([("gpt-4o", 800, 70, 99, 1)])
+        second = self.selector._latest_performance_snapshot()
+        assert first["gpt-4o"]["avg_response_time"] == 1000
+        assert second["gpt-4o"]["avg_response_time"] == 800
+
+    def test_invalidate_snapshot(self):
+        self._insert_metrics([("gpt-4o", 1000, 60, 95, 5)])
+        self.selector.snapshot_ttl = 60
+        self.selector._latest_performance_snapshot()
+
+        self._insert_metrics([("gpt-4o", 800, 70, 99, 1)])
+        self.selector.invalidate_snapshot()
+        snapshot = self.selector._latest_performance_snapshot()
+        assert snapshot["gpt-4o"]["avg_response_time"] == 800
+
+    def test_log_model_selection(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            self.selector.selection_log_path = os.path.join(log_dir, "model_selection.jsonl")
+            self.selector._log_model_selection("gpt-4o", "test task", "medium")
+
+            # Entries are buffered until the sink flushes
+            assert not os.path.exists(self.selector.selection_log_path)
+            self.selector.flush_selection_log()
+
+            with open(self.selector.selection_log_path) as f:
+                lines = f.readlines()
+            assert len(lines) == 1
+            written_data = json.loads(lines[0])
+            assert written_data["selected_model"] == "gpt-4o"
+            assert written_data["task_description"] == "test task"
+            assert written_data["task_complexity"] == "medium"
 
     def test_task_complexity_weights(self):
         assert self.selector.task_complexity_weights["low"] == 0.2
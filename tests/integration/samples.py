@@ -0,0 +1,82 @@
+import os
+import sqlite3
+import tempfile
+
+from ml.ratelimit import configure_rate_limits
+from ml.storage import SampleWriter
+from tests.integration.benchmark import AdvancedModelBenchmark
+from tests.integration.stub import StubOpenAIServer
+
+
+class TestRequestSamples:
+    def setup_method(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+        os.environ.setdefault("NVIDIA_API_KEY", "stub-key")
+        configure_rate_limits({"openai": {"rate": 100.0}, "deepseek": {"rate": 100.0}})
+
+        self.server = StubOpenAIServer(delay=0.01, content="one two three").start()
+        self.models = [
+            {"name": "stub-openai", "type": "openai", "base_url": self.server.base_url},
+            {"name": "stub-deepseek", "type": "deepseek", "base_url": self.server.base_url},
+        ]
+
+    def teardown_method(self):
+        configure_rate_limits({"openai": {"rate": 10.0}, "deepseek": {"rate": 5.0}})
+        self.server.stop()
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def test_samples_link_to_run_rows(self):
+        benchmark = AdvancedModelBenchmark(self.models, repetitions=2)
+        complete = benchmark._complete
+
+        def flaky(client, model_type, model_name, prompt, stream=False):
+            if model_name == "stub-deepseek" and "Python class" in prompt:
+                raise ValueError("bad request")
+            return complete(client, model_type, model_name, prompt, stream)
+
+        benchmark._complete = flaky
+        results = benchmark.run_benchmark(stream=True)
+        run_id = results[0].run_id
+        assert run_id is not None and {m.run_id for m in results} == {run_id}
+
+        conn = sqlite3.connect("reports/model_performance.db")
+        rows = conn.execute(
+            "SELECT s.model_name, COUNT(*), SUM(s.success), COUNT(s.time_to_first_token),"
+            " p.total_queries, MAX(s.latency_ms) <= p.max_response_time"
+            " FROM request_samples s JOIN performance_metrics p USING (run_id, model_name)"
+            " WHERE s.run_id = ? GROUP BY s.model_name ORDER BY s.model_name",
+            (run_id,),
+        ).fetchall()
+        errors = conn.execute(
+            "SELECT scenario, error_type, output_tokens FROM request_samples WHERE success = 0"
+        ).fetchall()
+        conn.close()
+
+        assert rows == [("stub-deepseek", 8, 6, 6, 8, 1), ("stub-openai", 8, 8, 8, 8, 1)]
+        assert errors == [("Code Generation", "ValueError", 0)] * 2
+
+    def test_writer_commits_per_batch(self):
+        AdvancedModelBenchmark([])
+        rows = [
+            ("run", "gpt-4o", "scenario", 0.0, float(i), 1, 10, None, None) for i in range(2500)
+        ]
+
+        writer = SampleWriter(batch_size=1000, flush_interval=60)
+        statements = []
+        writer._conn.set_trace_callback(statements.append)
+        writer.write(rows[:500])
+        writer.write(rows[500:])
+        writer.close()
+
+        assert sum(s.startswith("COMMIT") for s in statements) == 3
+        assert writer.stats() == {"pending": 0, "written": 2500, "dropped": 0, "flushes": 3}
+        conn = sqlite3.connect("reports/model_performance.db")
+        assert conn.execute("SELECT COUNT(*), MAX(latency_ms) FROM request_samples").fetchone() == (
+            2500,
+            2499.0,
+        )
+        conn.close()
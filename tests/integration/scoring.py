@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import tempfile
+
+import numpy as np
+import pytest
+
+from ml.router import AdaptiveModelSelector
+from ml.scoring import CompositeScorer, LatencySLOScorer
+
+
+class TestLatencySLOScoring:
+    def setup_method(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        self.db_path = os.path.join(self.temp_dir.name, "performance.db")
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            CREATE TABLE performance_metrics (
+                timestamp TEXT, model_name TEXT, avg_response_time REAL,
+                avg_token_generation_rate REAL, task_success_rate REAL, error_rate REAL,
+                p99_response_time REAL
+            )
+        """)
+        # Claude has the best averages but the worst tail over all runs, although
+        # its latest run, of a handful of requests, happened to stay fast
+        conn.executemany(
+            "INSERT INTO performance_metrics VALUES ('2024-01-01', ?, ?, ?, ?, ?, ?)",
+            [
+                ("gpt-4o", 1000, 60, 95, 5, 1800),
+                ("deepseek-r1", 1500, 40, 85, 15, 2500),
+                ("claude-3-5-sonnet-20241022", 1100, 70, 92, 8, 1500),
+                ("gemini-2.0-flash-exp", 1300, 45, 88, 12, 1900),
+            ],
+        )
+        conn.execute("""
+            CREATE TABLE model_histograms (
+                model_name TEXT PRIMARY KEY, histogram BLOB, count INTEGER,
+                p50 REAL, p90 REAL, p99 REAL, p999 REAL, max REAL
+            )
+        """)
+        conn.executemany(
+            "INSERT INTO model_histograms VALUES (?, x'', 400, NULL, NULL, ?, NULL, NULL)",
+            [
+                ("gpt-4o", 1800),
+                ("deepseek-r1", 2500),
+                ("claude-3-5-sonnet-20241022", 3500),
+                ("gemini-2.0-flash-exp", 1900),
+            ],
+        )
+        conn.commit()
+        conn.close()
+        self.selector = AdaptiveModelSelector(self.db_path)
+
+    def teardown_method(self):
+        self.selector.close()
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def test_default_scoring_ignores_tail(self):
+        assert self.selector.select_optimal_model("task", "high") == "claude-3-5-sonnet-20241022"
+
+    def test_slo_penalizes_or_excludes_slow_tail(self):
+        for mode in ("penalize", "exclude"):
+            scorer = LatencySLOScorer(2000, percentile=99, mode=mode)
+            assert self.selector.select_optimal_model("task", "high", scorer=scorer) == "gpt-4o"
+
+    def test_without_histograms_latest_run_percentiles_are_used(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("DROP TABLE model_histograms")
+        conn.commit()
+        conn.close()
+        self.selector.invalidate_snapshot()
+
+        scorer = LatencySLOScorer(2000, percentile=99, mode="exclude")
+        choice = self.selector.select_optimal_model("task", "high", scorer=scorer)
+        assert choice == "claude-3-5-sonnet-20241022"
+
+    def test_selector_default_scorer(self):
+        selector = AdaptiveModelSelector(self.db_path, scorer=LatencySLOScorer(2000))
+        try:
+            assert selector.select_optimal_models([{"description": "task"}] * 3) == ["gpt-4o"] * 3
+        finally:
+            selector.close()
+
+    def test_batch_matches_single_selection(self):
+        scorer = LatencySLOScorer(2600, mode="exclude")
+        tasks = [
+            {"description": f"task {i}", "complexity": c}
+            for i, c in enumerate(["low", "medium", "high", "extreme"])
+        ]
+        batch = self.selector.select_optimal_models(tasks, scorer=scorer)
+        single = [
+            self.selector.select_optimal_model(t["description"], t["complexity"], scorer=scorer)
+            for t in tasks
+        ]
+        assert batch == single
+
+    def test_exclusion_and_penalty(self):
+        scorer = LatencySLOScorer(2000, mode="exclude")
+        matrix = np.array([[1000, 60, 95, 5, 1500], [1000, 60, 95, 5, 2500]], dtype=float)
+        scores = scorer.scores(matrix, np.array([0.5, 1.0]))
+        assert scores.shape == (2, 2)
+        assert np.isneginf(scores[:, 1]).all()
+
+        penalized = LatencySLOScorer(2000, sharpness=2).scores(matrix, np.array([1.0]))[0]
+        within = CompositeScorer().base_scores(matrix)[1] - 0.3 / 1000
+        assert penalized[1] == pytest.approx(within * (2000 / 2500) ** 2)
+        # Headroom counts: 25% of the deadline left is worth 0.3 * 0.25
+        assert penalized[0] == pytest.approx(within + 0.3 * 0.25)
+
+    def test_all_models_over_deadline_prefers_lowest_tail(self):
+        scorer = LatencySLOScorer(1000, mode="exclude")
+        assert self.selector.select_optimal_model("task", scorer=scorer) == "gpt-4o"
+
+    def test_missing_percentiles_meet_slo_without_headroom(self):
+        scorer = LatencySLOScorer(2000, percentile=99.9)
+        matrix = self.selector._metrics_matrix(
+            self.selector._latest_performance_snapshot(), scorer.metrics
+        )
+        assert np.isnan(matrix[:, -1]).all()
+        assert np.isfinite(scorer.scores(matrix, np.array([1.0]))).all()
+        assert scorer.latency_scores(matrix).tolist() == [0.0] * 4
+
+    def test_invalid_arguments(self):
+        with pytest.raises(ValueError):
+            LatencySLOScorer(2000, percentile=95)
+        with pytest.raises(ValueError):
+            LatencySLOScorer(2000, mode="drop")
+        with pytest.raises(ValueError):
+            LatencySLOScorer(0)
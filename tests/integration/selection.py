@@ -0,0 +1,149 @@
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+import pytest
+
+from ml.router import AdaptiveModelSelector
+
+
+class TestBatchModelSelection:
+    def setup_method(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        self.db_path = os.path.join(self.temp_dir.name, "performance.db")
+        self.selector = AdaptiveModelSelector(self.db_path, snapshot_ttl=60)
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            CREATE TABLE performance_metrics (
+                timestamp TEXT, model_name TEXT, avg_response_time REAL,
+                avg_token_generation_rate REAL, task_success_rate REAL, error_rate REAL
+            )
+        """)
+        conn.executemany(
+            "INSERT INTO performance_metrics VALUES ('2024-01-01', ?, ?, ?, ?, ?)",
+            [
+                ("gpt-4o", 1000, 60, 95, 5),
+                ("deepseek-r1", 1500, 40, 85, 15),
+                ("claude-3-5-sonnet-20241022", 1100, 70, 92, 8),
+                ("gemini-2.0-flash-exp", 1300, 45, 88, 12),
+            ],
+        )
+        conn.commit()
+        conn.close()
+
+        complexities = ["low", "medium", "high", "extreme"]
+        self.tasks = [
+            {
+                "description": f'task {i} with "quotes" and ünïcode',
+                "complexity": complexities[i % 4],
+            }
+            for i in range(10_000)
+        ]
+
+    def teardown_method(self):
+        self.selector.close()
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def _read_log(self):
+        self.selector.flush_selection_log()
+        with open("logs/model_selection.jsonl") as f:
+            return [json.loads(line) for line in f]
+
+    def test_batch_scores_match_scalar_scores(self):
+        snapshot = self.selector._latest_performance_snapshot()
+        complexities = ["low", "medium", "high", "extreme", "unknown"]
+        weights = np.array(
+            [self.selector.task_complexity_weights.get(c, 0.5) for c in complexities]
+        )
+
+        scores = self.selector.scorer.scores(self.selector._metrics_matrix(snapshot), weights)
+        for i, complexity in enumerate(complexities):
+            for j, model in enumerate(self.selector.models):
+                expected = self.selector._calculate_model_score(snapshot[model], complexity)
+                assert np.isclose(scores[i, j], expected)
+
+    def test_batch_matches_scalar_selection(self):
+        tasks = self.tasks[:8]
+        batch = self.selector.select_optimal_models(tasks)
+        scalar = [
+            self.selector.select_optimal_model(t["description"], t["complexity"]) for t in tasks
+        ]
+        assert batch == scalar
+
+    def test_batch_log_matches_scalar_log(self):
+        task = self.tasks[0]
+        self.selector.select_optimal_models([task])
+        (batch_id,) = self.selector.last_selection_ids
+        self.selector.select_optimal_model(task["description"], task["complexity"])
+        (scalar_id,) = self.selector.last_selection_ids
+
+        batch_entry, scalar_entry = self._read_log()
+        assert batch_entry.keys() == scalar_entry.keys()
+        assert (batch_entry.pop("selection_id"), scalar_entry.pop("selection_id")) == (
+            batch_id,
+            scalar_id,
+        )
+        batch_entry.pop("timestamp")
+        scalar_entry.pop("timestamp")
+        assert batch_entry == scalar_entry
+
+    def test_batch_logs_every_decision(self):
+        selected = self.selector.select_optimal_models(self.tasks[:100])
+        entries = self._read_log()
+        assert [e["selected_model"] for e in entries] == selected
+        assert [e["task_description"] for e in entries] == [
+            t["description"] for t in self.tasks[:100]
+        ]
+        assert [e["selection_id"] for e in entries] == self.selector.last_selection_ids
+        assert len(set(self.selector.last_selection_ids)) == 100
+
+    def test_batch_reads_descriptions_when_called(self):
+        with pytest.raises(KeyError):
+            self.selector.select_optimal_models([{"complexity": "low"}])
+
+        tasks = [dict(task) for task in self.tasks[:2]]
+        self.selector.select_optimal_models(tasks)
+        tasks[0]["description"] = "changed"
+        assert [e["task_description"] for e in self._read_log()] == [
+            t["description"] for t in self.tasks[:2]
+        ]
+
+    def test_batch_without_history_falls_back_to_random(self):
+        selector = AdaptiveModelSelector(os.path.join(self.temp_dir.name, "empty.db"))
+        try:
+            selected = selector.select_optimal_models(self.tasks[:10])
+            assert len(selected) == 10
+            assert all(isinstance(m, str) and m in selector.models for m in selected)
+        finally:
+            selector.close()
+
+    @pytest.mark.benchmark
+    def test_batch_throughput(self):
+        """Microbenchmark: batch routing of 10k tasks vs looping the scalar API"""
+        start = time.perf_counter()
+        for task in self.tasks:
+            self.selector.select_optimal_model(task["description"], task["complexity"])
+        scalar_time = time.perf_counter() - start
+
+        # Log writes for a batch happen in the background; let each finish
+        # before timing the next routing call
+        batch_times = []
+        for _ in range(3):
+            batch_times.append(self._time(lambda: self.selector.select_optimal_models(self.tasks)))
+            self.selector.flush_selection_log()
+        batch_time = min(batch_times)
+
+        assert scalar_time / batch_time >= 50
+
+    @staticmethod
+    def _time(fn):
+        start = time.perf_counter()
+        fn()
+        return time.perf_counter() - start
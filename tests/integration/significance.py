@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import tempfile
+
+import numpy as np
+import pytest
+
+from ml.stats import bootstrap_ci, intervals_separated, proportion_ci
+from tests.integration.benchmark import CONFIDENCE_METRICS, AdvancedModelBenchmark
+from tests.integration.stub import StubOpenAIServer
+
+
+class TestBootstrap:
+    def test_interval_covers_mean_and_narrows(self):
+        rng = np.random.default_rng(0)
+        small = rng.normal(100, 20, 20)
+        large = rng.normal(100, 20, 2000)
+
+        low, high = bootstrap_ci(small, seed=1)
+        assert low < np.mean(small) < high
+        wide = high - low
+        low, high = bootstrap_ci(large, seed=1)
+        assert low < 100 < high
+        assert high - low < wide / 5
+        assert bootstrap_ci(large, seed=1) == (low, high)
+
+    def test_other_statistics_and_blocks(self):
+        samples = np.concatenate([np.full(99, 10.0), [1000.0]])
+        low, high = bootstrap_ci(samples, statistic=np.median, resamples=500, seed=1)
+        assert low == high == 10.0
+        # Large inputs are resampled in blocks with the same result shape
+        low, high = bootstrap_ci(np.arange(300_000.0), resamples=20, seed=1)
+        assert low < 150_000 < high
+
+    def test_proportion(self):
+        low, high = proportion_ci(45, 50, seed=1)
+        assert low < 0.9 < high <= 1.0
+        assert proportion_ci(10, 10) == (1.0, 1.0)
+        assert proportion_ci(0, 0) is None
+
+    def test_edge_cases(self):
+        assert bootstrap_ci([]) is None
+        assert bootstrap_ci([5.0]) == (5.0, 5.0)
+        with pytest.raises(ValueError):
+            bootstrap_ci([1.0, 2.0], confidence=1.5)
+
+    def test_separation(self):
+        assert intervals_separated([(1, 2), (5, 6), (3, 4)])
+        assert not intervals_separated([(1, 3), (2, 4)])
+        assert not intervals_separated([(1, 2), None])
+        assert intervals_separated([(1, 2)])
+
+
+class TestRepeatedBenchmark:
+    def setup_method(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+
+        self.server = StubOpenAIServer(delay={"stub-fast": 0.01, "stub-slow": 0.08}).start()
+        self.models = [
+            {"name": "stub-fast", "type": "openai", "base_url": self.server.base_url},
+            {"name": "stub-slow", "type": "openai", "base_url": self.server.base_url},
+        ]
+
+    def teardown_method(self):
+        self.server.stop()
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def test_repetitions_and_warmup(self):
+        benchmark = AdvancedModelBenchmark(self.models[:1], repetitions=3, warmup=2)
+        (metrics,) = benchmark.run_benchmark()
+
+        # Warm-up requests are sent but not measured
+        assert self.server.request_count == 14
+        assert metrics.total_queries == 12
+        assert metrics.latency_histogram.count == 12
+        assert metrics.task_success_rate == 100.0
+        assert metrics.response_time_ci_low <= metrics.avg_response_time
+        assert metrics.avg_response_time <= metrics.response_time_ci_high
+        assert metrics.success_rate_ci_low == metrics.success_rate_ci_high == 100.0
+
+        conn = sqlite3.connect("reports/model_performance.db")
+        row = conn.execute(
+            f"SELECT {', '.join(CONFIDENCE_METRICS)} FROM model_latest WHERE model_name = 'stub-fast'"
+        ).fetchone()
+        conn.close()
+        assert row == pytest.approx(tuple(getattr(metrics, m) for m in CONFIDENCE_METRICS))
+
+    def test_early_stopping_once_models_separate(self):
+        benchmark = AdvancedModelBenchmark(self.models, repetitions=10)
+        fast, slow = benchmark.run_benchmark(concurrent=True, early_stopping=True)
+
+        # 10 ms and 80 ms models separate well before the 10 round budget
+        assert fast.total_queries == slow.total_queries == 8
+        assert self.server.request_count == 16
+        assert fast.response_time_ci_high < slow.response_time_ci_low
+
+    def test_early_stopping_warns_without_spare_repetitions(self, capsys):
+        benchmark = AdvancedModelBenchmark(self.models[:1], repetitions=1)
+        (metrics,) = benchmark.run_benchmark(early_stopping=True, min_repetitions=3)
+
+        assert "Early stopping needs more than 3 repetitions" in capsys.readouterr().out
+        assert metrics.total_queries == 4
+
+    def test_invalid_repetitions(self):
+        with pytest.raises(ValueError):
+            AdvancedModelBenchmark(self.models, repetitions=0)
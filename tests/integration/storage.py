@@ -0,0 +1,161 @@
+import os
+import sqlite3
+import tempfile
+import time
+
+import pytest
+
+from ml.storage import SCHEMA_VERSION, migrate, open_database
+from tests.integration.benchmark import AdvancedModelBenchmark, ModelPerformanceMetrics
+
+
+def _metrics(model_name, response_time=1000.0):
+    return ModelPerformanceMetrics(
+        timestamp="2024-01-01T00:00:00",
+        model_name=model_name,
+        total_queries=4,
+        avg_response_time=response_time,
+        median_response_time=response_time,
+        avg_token_generation_rate=50.0,
+        task_success_rate=100.0,
+        error_rate=0.0,
+        total_execution_time=response_time * 4,
+    )
+
+
+class TestStorage:
+    def setup_method(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        self.db_path = os.path.join(self.temp_dir.name, "reports", "model_performance.db")
+
+    def teardown_method(self):
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def test_schema_is_versioned_and_indexed(self):
+        benchmark = AdvancedModelBenchmark([])
+        conn = benchmark.conn
+        assert conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+        assert conn.execute("PRAGMA user_version").fetchone() == (SCHEMA_VERSION,)
+        assert migrate(conn) == SCHEMA_VERSION
+
+        plan = " ".join(
+            row[3]
+            for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT id, timestamp FROM performance_metrics "
+                "WHERE model_name = ? ORDER BY timestamp",
+                ("gpt-4o",),
+            )
+        )
+        assert "COVERING INDEX idx_performance_metrics_model_time" in plan
+        benchmark.conn.close()
+
+    def test_legacy_database_is_migrated(self):
+        os.makedirs("reports")
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            CREATE TABLE performance_metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, model_name TEXT,
+                total_queries INTEGER, avg_response_time REAL, median_response_time REAL,
+                avg_token_generation_rate REAL, task_success_rate REAL, error_rate REAL,
+                total_execution_time REAL
+            )
+        """)
+        conn.execute(
+            "INSERT INTO performance_metrics VALUES (NULL, '2024-01-01', 'gpt-4o', 4, 900, 900,"
+            " 50, 100, 0, 3600)"
+        )
+        conn.commit()
+        conn.close()
+
+        conn = open_database(self.db_path)
+        assert migrate(conn) == SCHEMA_VERSION
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(performance_metrics)")}
+        assert "response_time_ci_low" in columns
+        indexes = {row[1] for row in conn.execute("PRAGMA index_list(performance_metrics)")}
+        assert "idx_performance_metrics_model_time" in indexes
+        assert conn.execute("SELECT avg_response_time FROM performance_metrics").fetchone() == (
+            900,
+        )
+        conn.close()
+
+    def test_run_is_written_in_one_transaction(self):
+        benchmark = AdvancedModelBenchmark([])
+        statements = []
+        benchmark.conn.set_trace_callback(statements.append)
+        benchmark._log_performances_to_database(
+            [_metrics(f"model-{i}", 1000.0 + i) for i in range(20)]
+        )
+        benchmark.conn.set_trace_callback(None)
+
+        assert sum(s.startswith("COMMIT") for s in statements) == 1
+        rows = benchmark.conn.execute(
+            "SELECT l.model_name, l.metrics_id, p.avg_response_time FROM model_latest l "
+            "JOIN performance_metrics p ON p.id = l.metrics_id ORDER BY l.metrics_id"
+        ).fetchall()
+        assert rows == [(f"model-{i}", i + 1, 1000.0 + i) for i in range(20)]
+        benchmark.conn.close()
+
+    def test_concurrent_writer_does_not_shift_ids(self):
+        benchmark = AdvancedModelBenchmark([])
+        other = open_database(self.db_path)
+
+        def insert_elsewhere(statement):
+            # Another process logs a row just as this run's transaction begins
+            if statement.startswith("BEGIN"):
+                benchmark.conn.set_trace_callback(None)
+                with other:
+                    other.execute(
+                        "INSERT INTO performance_metrics (timestamp, model_name) "
+                        "VALUES ('2024-01-01', 'other')"
+                    )
+
+        benchmark.conn.set_trace_callback(insert_elsewhere)
+        benchmark._log_performances_to_database([_metrics("gpt-4o"), _metrics("deepseek-r1")])
+        rows = benchmark.conn.execute(
+            "SELECT l.model_name, p.model_name FROM model_latest l "
+            "JOIN performance_metrics p ON p.id = l.metrics_id"
+        ).fetchall()
+        assert sorted(rows) == [("deepseek-r1", "deepseek-r1"), ("gpt-4o", "gpt-4o")]
+        other.close()
+        benchmark.conn.close()
+
+    def test_readers_do_not_block_writer(self):
+        benchmark = AdvancedModelBenchmark([])
+        benchmark._log_performance_to_database(_metrics("gpt-4o"))
+
+        # A reader holding an open read transaction, as the dashboard does mid-query
+        reader = open_database(self.db_path)
+        reader.execute("BEGIN")
+        assert reader.execute("SELECT COUNT(*) FROM performance_metrics").fetchone() == (1,)
+
+        # Under a rollback journal this commit would wait for the reader's lock
+        start = time.perf_counter()
+        benchmark._log_performance_to_database(_metrics("gpt-4o", 2000.0))
+        assert time.perf_counter() - start < 1
+
+        # The reader keeps its snapshot until its transaction ends
+        assert reader.execute("SELECT COUNT(*) FROM performance_metrics").fetchone() == (1,)
+        reader.rollback()
+        assert reader.execute("SELECT COUNT(*) FROM performance_metrics").fetchone() == (2,)
+        reader.close()
+
+    def test_failed_migration_keeps_version(self, monkeypatch):
+        conn = open_database(os.path.join(self.temp_dir.name, "new.db"))
+
+        def broken(conn):
+            conn.execute("CREATE TABLE half_done (x)")
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr("ml.storage.MIGRATIONS", [broken])
+        monkeypatch.setattr("ml.storage.SCHEMA_VERSION", 1)
+        with pytest.raises(RuntimeError):
+            migrate(conn)
+        assert conn.execute("PRAGMA user_version").fetchone() == (0,)
+        assert (
+            conn.execute("SELECT name FROM sqlite_master WHERE name = 'half_done'").fetchone()
+            is None
+        )
+        conn.close()
@@ -0,0 +1,89 @@
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+from tests.integration.benchmark import STREAMING_METRICS, AdvancedModelBenchmark
+from tests.integration.stub import StubOpenAIServer
+
+
+class TestStreamingBenchmark:
+    def setup_method(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+        os.environ.setdefault("NVIDIA_API_KEY", "stub-key")
+
+        # 100ms to first token, then 5 more tokens 20ms apart
+        self.server = StubOpenAIServer(
+            delay=0.1, content="one two three four five six", token_delay=0.02
+        ).start()
+        self.models = [
+            {"name": "stub-openai", "type": "openai", "base_url": self.server.base_url},
+            {"name": "stub-deepseek", "type": "deepseek", "base_url": self.server.base_url},
+        ]
+
+    def teardown_method(self):
+        self.server.stop()
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def test_streaming_records_token_timings(self):
+        benchmark = AdvancedModelBenchmark(self.models)
+        for metrics in benchmark.run_benchmark(stream=True):
+            assert metrics.task_success_rate == 100.0
+            assert metrics.avg_time_to_first_token >= 100
+            assert metrics.avg_time_to_first_token < metrics.avg_response_time
+            assert metrics.p50_inter_token_latency == pytest.approx(20, abs=15)
+            assert (
+                metrics.p50_inter_token_latency
+                <= metrics.p90_inter_token_latency
+                <= metrics.p99_inter_token_latency
+            )
+            # 6 tokens over ~100ms of generation, and over ~200ms end to end
+            assert 20 < metrics.output_tokens_per_second < 150
+            assert 10 < metrics.avg_token_generation_rate < 35
+
+    def test_non_streaming_uses_reported_token_counts(self):
+        benchmark = AdvancedModelBenchmark(self.models[:1])
+        (metrics,) = benchmark.run_benchmark()
+
+        # 6 completion tokens per ~100ms request
+        assert 20 < metrics.avg_token_generation_rate < 65
+        for column in STREAMING_METRICS:
+            assert getattr(metrics, column) is None
+
+    def test_streaming_metrics_are_stored(self):
+        benchmark = AdvancedModelBenchmark(self.models[:1])
+        benchmark.run_benchmark(stream=True)
+
+        row = benchmark.conn.execute(
+            f"SELECT {', '.join(STREAMING_METRICS)} FROM performance_metrics"
+        ).fetchone()
+        assert all(value is not None for value in row)
+        latest = benchmark.conn.execute(
+            "SELECT avg_time_to_first_token FROM model_latest WHERE model_name = 'stub-openai'"
+        ).fetchone()
+        assert latest[0] == row[0]
+
+    def test_existing_database_gains_streaming_columns(self):
+        os.makedirs("reports")
+        conn = sqlite3.connect("reports/model_performance.db")
+        conn.execute("""
+            CREATE TABLE performance_metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, model_name TEXT,
+                total_queries INTEGER, avg_response_time REAL, median_response_time REAL,
+                avg_token_generation_rate REAL, task_success_rate REAL, error_rate REAL,
+                total_execution_time REAL
+            )
+        """)
+        conn.commit()
+        conn.close()
+
+        benchmark = AdvancedModelBenchmark([])
+        columns = {
+            row[1] for row in benchmark.conn.execute("PRAGMA table_info(performance_metrics)")
+        }
+        assert set(STREAMING_METRICS) <= columns
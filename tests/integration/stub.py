@@ -0,0 +1,210 @@
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubOpenAIServer:
+    """
+    Local OpenAI-compatible chat completions server for offline tests.
+
+    Runs in a background thread on an ephemeral port. Each request sleeps
+    for ``delay`` seconds (or ``delay[model]`` when a dict is given) before
+    answering, and the server tracks how many requests were in flight at once
+    and how many client connections it accepted. Streaming requests get one
+    server-sent event per word of ``content``, ``token_delay`` seconds apart,
+    after the initial delay. With ``rate_limit`` set, requests beyond that many
+    per second (bursts up to ``rate_limit``) are rejected with a 429 and a
+    Retry-After header, like a provider at its ceiling.
+    """
+
+    def __init__(
+        self,
+        delay: float | dict[str, float] = 0.0,
+        content: str = "stub response",
+        token_delay: float = 0.0,
+        rate_limit: float | None = None,
+    ):
+        self.delay = delay
+        self.content = content
+        self.token_delay = token_delay
+        self.rate_limit = rate_limit
+        self.request_count = 0
+        self.rate_limited_count = 0
+        self.connection_count = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._tokens = rate_limit or 0.0
+        self._refilled_at = time.monotonic()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _delay_for(self, model: str) -> float:
+        if isinstance(self.delay, dict):
+            return self.delay.get(model, 0.0)
+        return self.delay
+
+    def _acquire(self) -> float:
+        """Take a rate limit token; returns 0 on success, else seconds until one is free."""
+        if self.rate_limit is None:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.rate_limit, self._tokens + (now - self._refilled_at) * self.rate_limit
+            )
+            self._refilled_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            self.rate_limited_count += 1
+            return (1 - self._tokens) / self.rate_limit
+
+    def _completion(self, model: str) -> dict:
+        return {
+            "id": f"chatcmpl-stub-{self.request_count}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": self.content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": 10,
+                "completion_tokens": len(self.content.split()),
+                "total_tokens": 10 + len(self.content.split()),
+            },
+        }
+
+    def _chunk(self, model: str, delta: dict, usage: dict | None = None) -> dict:
+        return {
+            "id": f"chatcmpl-stub-{self.request_count}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": None}] if delta else [],
+            "usage": usage,
+        }
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connection_count += 1
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                model = body.get("model", "")
+
+                retry_after = stub._acquire()
+                if retry_after:
+                    self._rate_limited(retry_after)
+                    return
+
+                with stub._lock:
+                    stub.request_count += 1
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    time.sleep(stub._delay_for(model))
+                    if body.get("stream"):
+                        self._stream(model, body)
+                        return
+                    payload = json.dumps(stub._completion(model)).encode()
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _rate_limited(self, retry_after):
+                payload = json.dumps(
+                    {
+                        "error": {
+                            "message": "Rate limit exceeded",
+                            "type": "rate_limit_error",
+                            "code": "rate_limit_exceeded",
+                        }
+                    }
+                ).encode()
+                self.send_response(429)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.send_header("Retry-After", str(math.ceil(retry_after)))
+                self.send_header("retry-after-ms", str(math.ceil(retry_after * 1000)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, model, body):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                words = stub.content.split()
+                for i, word in enumerate(words):
+                    if i:
+                        time.sleep(stub.token_delay)
+                    text = word if i == 0 else " " + word
+                    self._send_event(stub._chunk(model, {"role": "assistant", "content": text}))
+                if body.get("stream_options", {}).get("include_usage"):
+                    usage = {
+                        "prompt_tokens": 10,
+                        "completion_tokens": len(words),
+                        "total_tokens": 10 + len(words),
+                    }
+                    self._send_event(stub._chunk(model, {}, usage))
+                self._send_data(b"data: [DONE]\n\n")
+                self._send_data(b"")
+
+            def _send_event(self, event):
+                self._send_data(f"data: {json.dumps(event)}\n\n".encode())
+
+            def _send_data(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
@@ -0,0 +1,171 @@
+import os
+import sqlite3
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from ml.router import AdaptiveModelSelector
+from ml.taskindex import TaskIndex
+
+TRANSLATION = "translate this short paragraph from english into french"
+CODING = "write a python function that parses dates from log lines"
+
+
+def _feed(index_or_selector, outcomes, repeats=20):
+    """Record ``repeats`` outcomes of (description, model, success, latency_ms) tuples."""
+    for _ in range(repeats):
+        for description, model, success, latency_ms in outcomes:
+            if isinstance(index_or_selector, TaskIndex):
+                index_or_selector.add(description, model, success, latency_ms)
+            else:
+                index_or_selector.record_outcome(
+                    model, success, latency_ms, task_description=description
+                )
+
+
+class TestTaskIndex:
+    def setup_method(self):
+        self.index = TaskIndex(["a", "b"], db_path=None)
+        _feed(
+            self.index,
+            [
+                (TRANSLATION, "a", True, 200),
+                (TRANSLATION, "b", True, 900),
+                (CODING, "a", False, 200),
+                (CODING, "b", True, 900),
+            ],
+        )
+
+    def test_similar_tasks_prefer_their_best_model(self):
+        scores, known = self.index.scores(
+            [
+                "please translate this paragraph into french",
+                "write a python function that parses log lines",
+                "compose a haiku about autumn leaves",
+            ]
+        )
+        assert scores.shape == (3, 2)
+        assert known.tolist() == [True, True, False]
+        assert scores[0].argmax() == 0
+        assert scores[1].argmax() == 1
+        # Without similar history every model scores the prior
+        assert scores[2, 0] == scores[2, 1]
+
+    def test_only_nearest_outcomes_count(self):
+        index = TaskIndex(["a", "b"], db_path=None, k=5)
+        _feed(index, [(TRANSLATION, "b", False, 100)], repeats=50)
+        _feed(index, [(TRANSLATION + " please", "a", True, 100)], repeats=5)
+        scores, _ = index.scores([TRANSLATION + " please"])
+        assert scores[0].argmax() == 0
+
+    def test_outcomes_persist_in_batches(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = os.path.join(temp_dir, "performance.db")
+            index = TaskIndex(["a", "b"], db_path=db_path, flush_interval=10)
+            for i in range(25):
+                index.add(TRANSLATION, "a", True, 150.0, selection_id=f"sel-{i}")
+
+            conn = sqlite3.connect(db_path)
+            assert conn.execute("SELECT COUNT(*) FROM task_outcomes").fetchone() == (20,)
+            index.close()
+            assert conn.execute(
+                "SELECT model_name, success, latency_ms FROM task_outcomes WHERE selection_id = ?",
+                ("sel-24",),
+            ).fetchone() == ("a", 1, 150.0)
+            conn.close()
+
+            # Outcomes of models no longer routed to are skipped on load
+            restored = TaskIndex(["a"], db_path=db_path, max_outcomes=10)
+            assert len(restored) == 10
+            assert restored.scores([TRANSLATION])[1].tolist() == [True]
+
+    def test_expired_outcomes_are_ignored(self):
+        index = TaskIndex(["a", "b"], db_path=None, max_outcomes=1500)
+        # Enough outcomes to merge the tail into the postings a few times
+        _feed(index, [(TRANSLATION, "b", True, 100)], repeats=1500)
+        assert index.scores([TRANSLATION])[1].tolist() == [True]
+        for _ in range(4):
+            _feed(index, [(CODING, "a", True, 100)], repeats=400)
+            index.scores([CODING])
+        assert len(index) == 1500
+        assert index.scores([TRANSLATION, CODING])[1].tolist() == [False, True]
+
+    @pytest.mark.benchmark
+    def test_lookup_latency(self):
+        """Microbenchmark: a single routing decision stays under a millisecond while outcomes stream in"""
+        rng = np.random.default_rng(0)
+        words = [f"word{i}" for i in range(2000)]
+        index = TaskIndex(["a", "b", "c", "d"], db_path=None)
+        for i in range(index.max_outcomes):
+            description = " ".join(rng.choice(words, 12))
+            index.add(description, "abcd"[i % 4], bool(i % 3), float(100 + i % 500))
+        tasks = [" ".join(rng.choice(words, 12)) for _ in range(2000)]
+        index.scores(tasks[:1])
+
+        durations = []
+        for i, task in enumerate(tasks):
+            start = time.perf_counter()
+            index.add(task, "abcd"[i % 4], True, 200.0)
+            scores, known = index.scores([tasks[-i - 1]])
+            durations.append(time.perf_counter() - start)
+        assert scores.shape == (1, 4)
+        assert np.median(durations) < 1e-3
+
+    def test_invalid_model(self):
+        with pytest.raises(ValueError):
+            self.index.add(TRANSLATION, "z", True)
+
+
+class TestTaskSelection:
+    def setup_method(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.selector = AdaptiveModelSelector(
+            os.path.join(self.temp_dir.name, "performance.db"),
+            selection_log_path=os.path.join(self.temp_dir.name, "selection.jsonl"),
+            policy="task",
+        )
+
+    def teardown_method(self):
+        self.selector.selection_log.close()
+        self.selector.close()
+        self.temp_dir.cleanup()
+
+    def test_routes_by_task_history(self):
+        _feed(
+            self.selector,
+            [
+                (TRANSLATION, "gemini-2.0-flash-exp", True, 300),
+                (TRANSLATION, "gpt-4o", True, 1200),
+                (CODING, "gemini-2.0-flash-exp", False, 300),
+                (CODING, "claude-3-5-sonnet-20241022", True, 800),
+            ],
+        )
+        assert (
+            self.selector.select_optimal_model("translate a paragraph into french")
+            == "gemini-2.0-flash-exp"
+        )
+        picks = self.selector.select_optimal_models(
+            [{"description": "write a python function that parses log lines"}] * 20
+        )
+        assert Counter(picks) == {"claude-3-5-sonnet-20241022": 20}
+
+        # Unfamiliar tasks still get a model without benchmark history
+        assert self.selector.select_optimal_model("compose a haiku") in self.selector.models
+
+    def test_outcomes_link_to_selection_log(self):
+        model = self.selector.select_optimal_model(TRANSLATION)
+        (selection_id,) = self.selector.last_selection_ids
+        self.selector.record_outcome(
+            model, True, 250.0, task_description=TRANSLATION, selection_id=selection_id
+        )
+        self.selector.close()
+
+        conn = sqlite3.connect(self.selector.performance_db_path)
+        row = conn.execute(
+            "SELECT selection_id, model_name, task_description FROM task_outcomes"
+        ).fetchone()
+        conn.close()
+        assert row == (selection_id, model, TRANSLATION)
@@ -0,0 +1,133 @@
+import os
+import tempfile
+
+import numpy as np
+
+from dashboard.dashboard import AIModelPerformanceDashboard, lttb_indices
+from ml.rollups import RetentionPolicy, compact_history, load_trends
+from tests.integration.benchmark import AdvancedModelBenchmark, ModelPerformanceMetrics
+
+
+class TestDashboardTrends:
+    def setup_method(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        self.benchmark = AdvancedModelBenchmark([])
+        self.db_path = os.path.join(self.temp_dir.name, "reports", "model_performance.db")
+
+    def teardown_method(self):
+        self.benchmark.conn.close()
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def _log(self, timestamp, response_time, model_name="gpt-4o"):
+        self.benchmark._log_performance_to_database(
+            ModelPerformanceMetrics(
+                timestamp=timestamp,
+                model_name=model_name,
+                total_queries=4,
+                avg_response_time=response_time,
+                median_response_time=response_time,
+                avg_token_generation_rate=50.0,
+                task_success_rate=100.0,
+                error_rate=0.0,
+                total_execution_time=response_time * 4,
+            )
+        )
+
+    def test_lttb_keeps_endpoints_and_spikes(self):
+        x = np.arange(10_000, dtype=float)
+        y = np.sin(x / 500)
+        y[5_000] = 10.0
+        kept = lttb_indices(x, y, 100)
+
+        assert len(kept) == 100
+        assert kept[0] == 0 and kept[-1] == 9_999
+        assert 5_000 in kept
+        assert np.all(np.diff(kept) > 0)
+        assert list(lttb_indices(x[:50], y[:50], 100)) == list(range(50))
+
+    def test_refresh_fetches_only_new_rows(self):
+        self._log("2024-01-01T12:00:00", 1000.0)
+        self._log("2024-01-01T12:05:00", 2000.0, "deepseek-r1")
+        dashboard = AIModelPerformanceDashboard(self.db_path)
+        dashboard.load_historical_trends()
+        assert len(dashboard.history) == 2
+
+        statements = []
+        dashboard.conn.set_trace_callback(statements.append)
+        dashboard.load_performance_data()
+        dashboard.load_historical_trends()
+        # Nothing changed: one rowid lookup per call, nothing reloaded
+        assert not any("model_aggregates" in s or "id >" in s for s in statements)
+
+        self._log("2024-01-01T12:10:00", 3000.0)
+        statements.clear()
+        dashboard.load_performance_data()
+        dashboard.load_historical_trends()
+        assert any(s.endswith("WHERE id > 2 ORDER BY id") for s in statements)
+        assert dashboard.history["avg_response_time"].tolist() == [1000.0, 2000.0, 3000.0]
+        assert dashboard.summary.set_index("model_name")["avg_response_time"].to_dict() == {
+            "deepseek-r1": 2000.0,
+            "gpt-4o": 2000.0,
+        }
+        series = {model: times for model, times, _ in dashboard.trend_series["avg_response_time"]}
+        assert len(series["gpt-4o"]) == 2
+        dashboard.conn.close()
+
+    def test_rollup_trends_match_the_router(self, monkeypatch):
+        for day in range(1, 4):
+            self._log(f"2024-01-0{day}T12:00:00", 1000.0 * day)
+            self._log(f"2024-01-0{day}T13:00:00", 3000.0 * day)
+        compact_history(self.db_path, RetentionPolicy(raw_days=None))
+
+        dashboard = AIModelPerformanceDashboard(self.db_path)
+        dashboard.load_historical_trends()
+        assert dashboard.trend_level == "raw"
+
+        dashboard.conn.close()
+
+        # With fewer points allowed than raw rows, both read day buckets
+        monkeypatch.setattr("dashboard.dashboard.DEFAULT_MAX_POINTS", 4)
+        dashboard = AIModelPerformanceDashboard(self.db_path)
+        dashboard.load_historical_trends()
+        level, rows = load_trends(self.benchmark.conn, ["avg_response_time"], max_points=4)
+        assert dashboard.trend_level == level == "day"
+        assert (
+            dashboard.trends["avg_response_time"].tolist()
+            == [row["avg_response_time"] for row in rows]
+            == [2000.0, 4000.0, 6000.0]
+        )
+        dashboard.conn.close()
+
+    def test_uncompacted_history_is_bucketed_in_sql(self, monkeypatch):
+        for day in range(1, 4):
+            self._log(f"2024-01-0{day}T12:00:00", 1000.0 * day)
+            self._log(f"2024-01-0{day}T13:00:00", 3000.0 * day)
+
+        # Never compacted, yet too many raw rows: days are averaged in SQL instead
+        monkeypatch.setattr("dashboard.dashboard.DEFAULT_MAX_POINTS", 4)
+        dashboard = AIModelPerformanceDashboard(self.db_path)
+        dashboard.load_historical_trends()
+        assert dashboard.trend_level == "day"
+        assert dashboard.trends["avg_response_time"].tolist() == [2000.0, 4000.0, 6000.0]
+        assert dashboard.history.empty
+        dashboard.conn.close()
+
+    def test_raw_history_is_read_for_the_requested_range(self):
+        for day in range(1, 4):
+            self._log(f"2024-01-0{day}T12:00:00", 1000.0 * day)
+        dashboard = AIModelPerformanceDashboard(self.db_path)
+
+        dashboard.load_historical_trends(start="2024-01-03T00:00:00")
+        assert dashboard.trends["avg_response_time"].tolist() == [3000.0]
+        assert len(dashboard.history) == 1
+
+        # Narrower ranges reuse the rows read; wider ones read the rest of the range
+        dashboard.load_historical_trends(start="2024-01-03T06:00:00")
+        assert len(dashboard.history) == 1
+        dashboard.load_historical_trends(start="2024-01-02T00:00:00")
+        assert dashboard.trends["avg_response_time"].tolist() == [2000.0, 3000.0]
+        assert len(dashboard.history) == 2
+        dashboard.conn.close()
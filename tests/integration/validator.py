@@ -2,7 +2,8 @@ import os
 
 import pytest
 from dotenv import load_dotenv
-from openai import OpenAI
+
+from ml.clients import get_client
 
 # Load environment variables
 load_dotenv()
@@ -10,11 +11,13 @@ load_dotenv()
 
 class TestDeepSeekAPIResponses:
     def setup_method(self):
-        """Initialize OpenAI client with NVIDIA endpoint"""
+        """Reuse the shared client for the NVIDIA endpoint"""
         api_key = os.getenv("NVIDIA_API_KEY")
         if not api_key:
             pytest.skip("NVIDIA_API_KEY not set")
-        self.client = OpenAI(api_key=api_key, base_url="https://integrate.api.nvidia.com/v1")
+        self.client = get_client(
+            "deepseek", base_url="https://integrate.api.nvidia.com/v1", api_key=api_key
+        )
 
     def validate_response(self, response):
         """Common response validation checks"""
@@ -0,0 +1,89 @@
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+from ml.cache import ResponseCache
+from ml.histogram import LatencyHistogram
+from ml.ratelimit import configure_rate_limits
+from tests.integration.benchmark import AdvancedModelBenchmark
+from tests.integration.stub import StubOpenAIServer
+
+
+class TestShardedBenchmark:
+    def setup_method(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+        os.environ.setdefault("NVIDIA_API_KEY", "stub-key")
+        configure_rate_limits({"openai": {"rate": 10.0}, "deepseek": {"rate": 5.0}})
+
+        self.server = StubOpenAIServer(
+            delay=0.05, content="one two three four five six", token_delay=0.01
+        ).start()
+        self.models = [
+            {"name": "stub-openai", "type": "openai", "base_url": self.server.base_url},
+            {"name": "stub-deepseek", "type": "deepseek", "base_url": self.server.base_url},
+        ]
+
+    def teardown_method(self):
+        configure_rate_limits({"openai": {"rate": 10.0}, "deepseek": {"rate": 5.0}})
+        self.server.stop()
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def test_workers_merge_into_one_row_per_model(self):
+        benchmark = AdvancedModelBenchmark(self.models)
+        results = benchmark.run_benchmark(stream=True, workers=3)
+
+        assert self.server.request_count == 8
+        assert [m.model_name for m in results] == ["stub-openai", "stub-deepseek"]
+        for metrics in results:
+            assert metrics.total_queries == 4
+            assert metrics.task_success_rate == 100.0
+            assert metrics.latency_histogram.count == 4
+            assert metrics.avg_time_to_first_token >= 50
+            assert metrics.p50_inter_token_latency is not None
+
+        conn = sqlite3.connect("reports/model_performance.db")
+        rows = conn.execute(
+            "SELECT model_name, total_queries FROM performance_metrics ORDER BY id"
+        ).fetchall()
+        (blob,) = conn.execute(
+            "SELECT histogram FROM model_histograms WHERE model_name = 'stub-openai'"
+        ).fetchone()
+        conn.close()
+        assert rows == [("stub-openai", 4), ("stub-deepseek", 4)]
+        assert LatencyHistogram.from_bytes(blob).count == 4
+
+    def test_workers_warm_up_once_per_run(self):
+        benchmark = AdvancedModelBenchmark(self.models, repetitions=2, warmup=1)
+        results = benchmark.run_benchmark(workers=2, early_stopping=True, min_repetitions=1)
+
+        # One warm-up request per model, then 4 scenarios twice per model
+        assert self.server.request_count == 2 + 16
+        assert [m.total_queries for m in results] == [8, 8]
+
+    def test_concurrent_workers_share_cache(self):
+        cache = ResponseCache("cache")
+        benchmark = AdvancedModelBenchmark(self.models, cache=cache, cache_mode="replay")
+        benchmark.run_benchmark(concurrent=True, workers=2)
+        assert self.server.request_count == 8
+        assert cache.stats()["misses"] == 8
+
+        (metrics, _) = benchmark.run_benchmark(concurrent=True, workers=2)
+        assert self.server.request_count == 8
+        assert cache.stats()["hits"] == 8
+        assert metrics.task_success_rate == 100.0
+
+    def test_worker_limits_are_split(self):
+        benchmark = AdvancedModelBenchmark(self.models, concurrency={"openai": 4})
+        options = benchmark._worker_options(2)
+
+        assert options["concurrency"]["openai"] == 2
+        assert options["concurrency"]["google"] == 1
+        assert options["rate_limits"]["openai"]["rate"] == pytest.approx(5.0)
+        assert options["rate_limits"]["deepseek"]["rate"] == pytest.approx(2.5)
+        assert options["scenarios"] == benchmark.scenarios